@@ -0,0 +1,142 @@
+import argparse
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.fft
+from scipy.io import wavfile
+
+import RIRReader
+
+PROG_ITEM_DIRECTORY = "/Users/willcassidy/Development/GitHub/AAUnpleasantnessModel/Audio/Programme Item Snippets"
+
+PROG_ITEM_FILENAMES = {
+    1: "ClapShort.wav",
+    2: "SaxShort.wav",
+}
+
+
+# Returns sample_rate, the (mono) programme item snippet, with integer PCM scaled to [-1, 1). Loaded once per process
+# and directory.
+@functools.lru_cache(maxsize=None)
+def loadProgItem(prog_item_id, prog_item_directory=PROG_ITEM_DIRECTORY):
+    if prog_item_id not in PROG_ITEM_FILENAMES:
+        raise ValueError(f"Unknown programme item {prog_item_id}; expected one of {sorted(PROG_ITEM_FILENAMES)}")
+
+    prog_item_reader = RIRReader.RIRReader(os.path.join(prog_item_directory, PROG_ITEM_FILENAMES[prog_item_id]))
+    prog_item_snippet = prog_item_reader.read(0, should_normalise=True).astype(np.float64)
+    prog_item_snippet.flags.writeable = False
+
+    return prog_item_reader.sample_rate, prog_item_snippet
+
+
+# Spectrum of the programme item zero-padded to fft_size, transformed once per size
+@functools.lru_cache(maxsize=None)
+def getProgItemSpectrum(prog_item_id, fft_size, prog_item_directory=PROG_ITEM_DIRECTORY):
+    _, prog_item_snippet = loadProgItem(prog_item_id, prog_item_directory)
+    prog_item_spectrum = scipy.fft.rfft(prog_item_snippet, fft_size)
+    prog_item_spectrum.flags.writeable = False
+    return prog_item_spectrum
+
+
+# FFT size for overlap-add blocks of (at least) block_length samples against a kernel of kernel_length samples.
+# By default blocks are as long as the kernel, which keeps the FFT size to about twice the kernel length.
+def getOverlapAddFFTSize(kernel_length, block_length=None):
+    if block_length is None:
+        block_length = kernel_length
+    return scipy.fft.next_fast_len(block_length + kernel_length - 1, real=True)
+
+
+# Overlap-add convolution of every channel of signals (samples x channels) with a kernel, given its spectrum at fft_size
+# Returns (samples + kernel_length - 1) x channels
+def convolveOverlapAdd(signals, kernel_spectrum, kernel_length, fft_size):
+    num_samples, num_channels = signals.shape
+    block_length = fft_size - kernel_length + 1
+    convolved = np.zeros([num_samples + kernel_length - 1, num_channels])
+
+    for block_start in range(0, num_samples, block_length):
+        block = signals[block_start:block_start + block_length]
+        block_spectra = scipy.fft.rfft(block, fft_size, axis=0)
+        block_convolved = scipy.fft.irfft(block_spectra * kernel_spectrum[:, np.newaxis], fft_size, axis=0)
+
+        num_output_samples = len(block) + kernel_length - 1
+        convolved[block_start:block_start + num_output_samples] += block_convolved[:num_output_samples]
+
+    return convolved
+
+
+# Convolves a (spatial) RIR with a programme item: 1 = clap, 2 = saxophone
+# spatial_rir: (samples) or (samples x channels), e.g. all 25 channels of a 4th-order ambisonics RIR
+# sample_rate: if given, checked against the programme item's sample rate
+# Returns the auralisation, with the same number of dimensions as spatial_rir
+def auralise(spatial_rir, prog_item_id, sample_rate=None, prog_item_directory=PROG_ITEM_DIRECTORY):
+    prog_item_sample_rate, prog_item_snippet = loadProgItem(prog_item_id, prog_item_directory)
+
+    if sample_rate is not None and sample_rate != prog_item_sample_rate:
+        raise ValueError(f"RIR sample rate ({sample_rate} Hz) does not match programme item {prog_item_id} ({prog_item_sample_rate} Hz)")
+
+    spatial_rir = np.asarray(spatial_rir, dtype=np.float64)
+    prog_item_length = len(prog_item_snippet)
+    fft_size = getOverlapAddFFTSize(prog_item_length)
+    prog_item_spectrum = getProgItemSpectrum(prog_item_id, fft_size, prog_item_directory)
+
+    auralisation = convolveOverlapAdd(spatial_rir.reshape(len(spatial_rir), -1), prog_item_spectrum, prog_item_length, fft_size)
+
+    return auralisation if spatial_rir.ndim > 1 else auralisation[:, 0]
+
+
+def getAuralisationFilename(stimulus_id, prog_item_id):
+    return f"stimulus_{stimulus_id}_prog_item_{prog_item_id}.wav"
+
+
+# Renders one RIR against each programme item, writing 32-bit float WAVs to output_directory
+# Returns the written filepaths
+def renderStimulus(rir_filepath, stimulus_id, prog_item_ids, output_directory, prog_item_directory=PROG_ITEM_DIRECTORY):
+    rir_reader = RIRReader.RIRReader(rir_filepath)
+    spatial_rir = rir_reader.read(should_normalise=True)
+    output_filepaths = []
+
+    for prog_item_id in prog_item_ids:
+        auralisation = auralise(spatial_rir, prog_item_id, rir_reader.sample_rate, prog_item_directory)
+        output_filepath = os.path.join(output_directory, getAuralisationFilename(stimulus_id, prog_item_id))
+        wavfile.write(output_filepath, rir_reader.sample_rate, auralisation.astype(np.float32))
+        output_filepaths.append(output_filepath)
+
+    return output_filepaths
+
+
+# Renders every stimulus x programme item pair across a process pool, with stimulus IDs numbered from 1 in input order.
+# Each worker loads and transforms the programme items once.
+def renderStimuli(rir_filepaths, prog_item_ids, output_directory, num_workers=None, prog_item_directory=PROG_ITEM_DIRECTORY):
+    os.makedirs(output_directory, exist_ok=True)
+    render = functools.partial(renderStimulus,
+                               prog_item_ids=prog_item_ids,
+                               output_directory=output_directory,
+                               prog_item_directory=prog_item_directory)
+    stimulus_ids = range(1, len(rir_filepaths) + 1)
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return [filepath for filepaths in executor.map(render, rir_filepaths, stimulus_ids) for filepath in filepaths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auralise a corpus of 25-channel RIRs with the listening test programme items.")
+    parser.add_argument("input", help="Directory of RIR WAV files, or a manifest listing one RIR filename per line")
+    parser.add_argument("output", help="Output directory for the rendered WAV files")
+    parser.add_argument("--rir-dir", default=None, help="Directory that manifest entries are relative to")
+    parser.add_argument("--prog-items", type=int, nargs="+", default=sorted(PROG_ITEM_FILENAMES), help="Programme items to render (1 = clap, 2 = saxophone)")
+    parser.add_argument("--prog-item-dir", default=PROG_ITEM_DIRECTORY, help="Directory containing the programme item snippets")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    # Imported here rather than at the top, as Utils imports this module and ExtractFeatures imports every feature
+    import ExtractFeatures
+    rir_filepaths = ExtractFeatures.getRIRFilepaths(args.input, args.rir_dir)
+    output_filepaths = renderStimuli(rir_filepaths, args.prog_items, args.output, args.workers, args.prog_item_dir)
+
+    print(f"Rendered {len(output_filepaths)} stimuli to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules a worker might start from: the feature modules, batch scoring and serving, and training
+DEFAULT_MODULES = ["Colouration", "FlutterEcho", "SDM", "DSE", "HFDamping", "NumpyMLP", "PredictUnpleasantness",
+                   "ExtractFeatures", "InferenceService", "MLP"]
+
+# Dependencies that scoring doesn't need, reported when an import pulls them in
+HEAVY_MODULES = ["matplotlib", "seaborn", "librosa", "torch", "pandas", "sklearn"]
+
+# Run in a fresh interpreter, so nothing is already imported
+IMPORT_TIMER = """
+import json, sys, time
+start_time = time.perf_counter()
+import {module_name}
+import_time_s = time.perf_counter() - start_time
+print(json.dumps([import_time_s, [name for name in {heavy_modules!r} if name in sys.modules]]))
+"""
+
+
+# Returns the fastest of num_repeats cold import times (s) and the heavy modules it loaded, or raises RuntimeError if
+# the module can't be imported (e.g. torch isn't installed)
+def timeImport(module_name, num_repeats=5, source_directory=os.path.dirname(os.path.abspath(__file__))):
+    import_times_s = []
+
+    for _ in range(num_repeats):
+        result = subprocess.run([sys.executable, "-c", IMPORT_TIMER.format(module_name=module_name, heavy_modules=HEAVY_MODULES)],
+                                cwd=source_directory, capture_output=True, text=True)
+
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+        import_time_s, loaded_heavy_modules = json.loads(result.stdout.strip().splitlines()[-1])
+        import_times_s.append(import_time_s)
+
+    return min(import_times_s), loaded_heavy_modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time cold imports of the modules a worker starts from, in fresh interpreters.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--repeats", type=int, default=5, help="Imports per module (the fastest is reported)")
+    args = parser.parse_args()
+
+    for module_name in args.modules:
+        try:
+            import_time_s, loaded_heavy_modules = timeImport(module_name, args.repeats)
+        except RuntimeError as error:
+            print(f"{module_name:<24} unavailable ({error})")
+            continue
+
+        print(f"{module_name:<24} {import_time_s * 1000:8.1f} ms   loads: {', '.join(loaded_heavy_modules) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
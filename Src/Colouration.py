@@ -1,12 +1,14 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import RT
 import Utils
 import Energy
-from scipy.signal import savgol_filter
+import RIRAnalysis
+import Smoothing
+import scipy.fft
 
 
 def showPlots(rir, colouration_score, mag_spectrum_log_trunc, mag_spectrum_smoothed, mag_over_means, mag_spectrum_freqs):
+    import matplotlib.pyplot as plt
     plt.figure()
     fig, axes = plt.subplots(2)
     fig.set_layout_engine("tight")
@@ -25,29 +27,80 @@ def showPlots(rir, colouration_score, mag_spectrum_log_trunc, mag_spectrum_smoot
     plt.show()
 
 
-def getColouration(rir, sample_rate, should_show_plots=False):
-    rir_num_samples = len(rir)
+# rir: omni RIR array or RIRAnalysis
+# fft_size: None to fit the FFT to the windowed RIR length (scores are then only comparable at the same length)
+def getColouration(rir, sample_rate, should_show_plots=False, fft_size=2 ** 17):
+    analysis = RIRAnalysis.asAnalysis(rir, sample_rate)
+    sample_rate = analysis.sample_rate
+    rir = analysis.getSignal()
+    edc_dB, _ = analysis.getEDC()
 
     # Estimate T30 from -5 dB to -35 dB
-    rt = RT.estimateRT(rir, sample_rate, start_dB=-5, end_dB=-35)
+    rt = RT.estimateRT(analysis, sample_rate, start_dB=-5, end_dB=-35)
 
-    # Window the RIR between the 0 dB and -40 dB times
-    edc_dB, time_values = Energy.getEDC(rir, sample_rate)
-    trunc_start_samples = Utils.findIndexOfClosest(edc_dB, 0)
-    trunc_end_samples = Utils.findIndexOfClosest(edc_dB, -40)
+    # Get magnitude spectrum of the windowed, decay-compensated RIR
+    rir_windowed_compensated = getDecayCompensatedWindow(rir, edc_dB, rt, sample_rate)
+    fft_size = getFFTSize(fft_size, len(rir_windowed_compensated))
+    mag_spectrum = np.abs(np.fft.rfft(rir_windowed_compensated, fft_size))
+
+    colouration_score, plot_data = getColourationFromSpectrum(mag_spectrum, rt, sample_rate)
+
+    if should_show_plots:
+        showPlots(rir, colouration_score, *plot_data)
+
+    return colouration_score
+
+
+# Scores a batch of omni RIRs (samples x N), e.g. every receiver of a room, with one batched FFT per FFT size
+# Returns colouration_scores (N), as from getColouration for each RIR
+def getColourations(rirs, sample_rate, fft_size=2 ** 17):
+    rirs = np.asarray(rirs)
+    num_rirs = rirs.shape[1]
+
+    edcs_dB, _ = Energy.getEDCs(rirs, sample_rate)
+    rts = RT.getRTFromEDC(edcs_dB, sample_rate, start_dB=-5, end_dB=-35)
+
+    windows_compensated = [getDecayCompensatedWindow(rirs[:, rir_index], edcs_dB[:, rir_index], rts[rir_index], sample_rate)
+                           for rir_index in range(num_rirs)]
+    fft_sizes = np.array([getFFTSize(fft_size, len(window)) for window in windows_compensated])
+    colouration_scores = np.zeros(num_rirs)
+
+    for group_fft_size in np.unique(fft_sizes):
+        rir_indices = np.flatnonzero(fft_sizes == group_fft_size)
+
+        # Zero-pad (or truncate) every window to the FFT size, as rfft would individually
+        windows_padded = np.zeros([group_fft_size, len(rir_indices)])
 
-    rir_sample_indices = range(rir_num_samples)
-    rir_sample_indices_windowed = rir_sample_indices[trunc_start_samples:trunc_end_samples]
+        for column_index, rir_index in enumerate(rir_indices):
+            num_window_samples = min(len(windows_compensated[rir_index]), group_fft_size)
+            windows_padded[:num_window_samples, column_index] = windows_compensated[rir_index][:num_window_samples]
+
+        mag_spectra = np.abs(np.fft.rfft(windows_padded, axis=0))
+
+        for column_index, rir_index in enumerate(rir_indices):
+            colouration_scores[rir_index] = getColourationFromSpectrum(mag_spectra[:, column_index], rts[rir_index], sample_rate)[0]
+
+    return colouration_scores
+
+
+def getFFTSize(fft_size, num_samples):
+    if fft_size is None:
+        return scipy.fft.next_fast_len(num_samples, real=True)
+    return fft_size
+
+
+# Window the RIR between the 0 dB and -40 dB times of its EDC and compensate for its decay shape
+def getDecayCompensatedWindow(rir, edc_dB, rt, sample_rate):
+    trunc_start_samples, trunc_end_samples = Utils.findIndicesOfDecayLevels(edc_dB, [0, -40])
+    rir_sample_indices_windowed = np.arange(trunc_start_samples, trunc_end_samples)
 
     # Compensate for IR decay shape (multiply IR by exp(6.91 * t / RT))
     sampling_period = 1.0 / sample_rate
-    rir_windowed_compensated = [rir[sample_index] * np.exp(6.91 * sample_index * sampling_period / rt)
-                                for sample_index in rir_sample_indices_windowed]
+    return rir[trunc_start_samples:trunc_end_samples] * np.exp(6.91 * rir_sample_indices_windowed * sampling_period / rt)
 
-    # Get magnitude spectrum
-    fft_size = 2 ** 17
-    mag_spectrum = np.abs(np.fft.rfft(rir_windowed_compensated, fft_size))
 
+# Returns colouration_score, plot_data (the remaining arguments of showPlots)
+def getColourationFromSpectrum(mag_spectrum, rt, sample_rate):
     # Truncate result (Schroeder frequency lower, 2 kHz upper) and convert spectrum to log frequency
     room_volume = 5000 # assumed
     schroeder_frequency = 2000.0 * np.sqrt(rt / room_volume)
@@ -60,14 +113,7 @@ def getColouration(rir, sample_rate, should_show_plots=False):
     mag_spectrum_log_trunc_dB = 20 * np.log10(mag_spectrum_log_trunc_linear)
 
     # Get smoothed spectrum, mirroring start and ends for one window length to avoid edge effects
-    num_octaves = np.log10(mag_spectrum_freqs[-1] / mag_spectrum_freqs[0]) / np.log10(2)
-    window_size = int((len(mag_spectrum_log_trunc_dB) / num_octaves) * 0.15) # Smooth in 0.15 * octave bands
-    mirrored_bins_start = mag_spectrum_log_trunc_dB[window_size:0:-1]
-    mirrored_bins_end = mag_spectrum_log_trunc_dB[:-window_size - 1:-1]
-
-    mag_spectrum_to_smooth = np.concat([mirrored_bins_start, mag_spectrum_log_trunc_dB, mirrored_bins_end])
-    mag_spectrum_smoothed = savgol_filter(mag_spectrum_to_smooth, window_size, 1)
-    mag_spectrum_smoothed = mag_spectrum_smoothed[window_size:-window_size]
+    mag_spectrum_smoothed = Smoothing.smoothFractionalOctave(mag_spectrum_log_trunc_dB, mag_spectrum_freqs, 0.15) # Smooth in 0.15 * octave bands
 
     # Subtract smoothed magnitude from raw (modification; use divide for standard)
     mag_minus_mean_dB = mag_spectrum_log_trunc_dB - mag_spectrum_smoothed
@@ -88,12 +134,9 @@ def getColouration(rir, sample_rate, should_show_plots=False):
     # Scale to approximately 0-1 (modification)
     colouration_score = (colouration_score - 0.3) / 0.55
 
-    if should_show_plots:
-        showPlots(rir,
-                  colouration_score,
-                  mag_spectrum_log_trunc_dB,
-                  mag_spectrum_smoothed,
-                  mag_minus_mean_equal_loud_dB,
-                  mag_spectrum_freqs)
+    plot_data = (mag_spectrum_log_trunc_dB,
+                 mag_spectrum_smoothed,
+                 mag_minus_mean_equal_loud_dB,
+                 mag_spectrum_freqs)
 
-    return colouration_score
+    return colouration_score, plot_data
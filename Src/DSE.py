@@ -1,8 +1,6 @@
 import numpy as np
-import Energy
+import RIRAnalysis
 import Utils
-import matplotlib.pyplot as plt
-from scipy.signal import butter, sosfilt
 from scipy import stats
 
 def showPlots(edc_dB,
@@ -10,6 +8,7 @@ def showPlots(edc_dB,
               early_gradient,
               late_gradient,
               curvature):
+    import matplotlib.pyplot as plt
     plt.plot(edc_times, edc_dB)
     plt.plot(edc_times, np.multiply(edc_times, early_gradient), 'b-')
     plt.plot(edc_times, np.multiply(edc_times, late_gradient), 'r-')
@@ -17,23 +16,24 @@ def showPlots(edc_dB,
     plt.ylim([-60, 0])
     plt.show()
 
-def getCurvature(rir, sample_rate, should_high_pass=True, show_plots=False):
+# rir: omni RIR array or RIRAnalysis
+def getCurvature(rir, sample_rate, should_high_pass=True, show_plots=False, hpf_cutoff_Hz=500.0):
+    analysis = RIRAnalysis.asAnalysis(rir, sample_rate)
+
     if should_high_pass:
-        hpf_cutoff_Hz = 500.0
-        sos = butter(4, hpf_cutoff_Hz, 'highpass', fs=sample_rate, output='sos')
-        rir = sosfilt(sos, rir)
+        high_pass = (hpf_cutoff_Hz, 4)
+    else:
+        high_pass = None
 
-    edc_dB, edc_times = Energy.getEDC(rir, sample_rate)
+    edc_dB, edc_times = analysis.getEDC(high_pass=high_pass)
 
     early_start_dB = -5.0
     early_end_dB = -10.0
     late_start_dB = -35.0
     late_end_dB = -40.0
 
-    early_start_index = Utils.findIndexOfClosest(edc_dB, early_start_dB)
-    early_end_index = Utils.findIndexOfClosest(edc_dB, early_end_dB)
-    late_start_index = Utils.findIndexOfClosest(edc_dB, late_start_dB)
-    late_end_index = Utils.findIndexOfClosest(edc_dB, late_end_dB)
+    levels_dB = [early_start_dB, early_end_dB, late_start_dB, late_end_dB]
+    early_start_index, early_end_index, late_start_index, late_end_index = Utils.findIndicesOfDecayLevels(edc_dB, levels_dB)
 
     early_gradient, _, _, _, _ = stats.linregress(edc_times[early_start_index:early_end_index], edc_dB[early_start_index:early_end_index])
     late_gradient, _, _, _, _ = stats.linregress(edc_times[late_start_index:late_end_index], edc_dB[late_start_index:late_end_index])
@@ -1,35 +1,71 @@
 import numpy as np
-from scipy.signal import savgol_filter
+import Smoothing
 import Utils
-import matplotlib.pyplot as plt
 
 def getEDC(rir, sample_rate):
-    integration_limit_samples = len(rir)
-    reversed_rir = rir[::-1]
-
-    # Calculate Schroeder decay
-    edc_dB_reversed = 10.0 * np.log10(np.cumsum(np.square(reversed_rir)) / np.sum(np.square(rir)))
+    edc_dB, time_values_seconds = getEDCs(np.asarray(rir)[:, np.newaxis], sample_rate)
+    return edc_dB[:, 0], time_values_seconds
+
+
+# Schroeder decays of several signals (e.g. octave bands or channels) at once
+# rirs: (samples x N)
+# dtype: precision of the returned decays (default: that of the integration, which follows the input)
+# Returns edc_dB (samples x N), time_values_seconds (samples)
+def getEDCs(rirs, sample_rate, dtype=None):
+    rirs = np.asarray(rirs)
+    integration_limit_samples = rirs.shape[0]
+    squared_rirs = np.square(rirs)
+
+    # Calculate Schroeder decay (each signal's total energy is summed separately, as a contiguous 1-D sum)
+    total_energies = np.array([np.sum(squared_rirs[:, signal_index]) for signal_index in range(rirs.shape[1])], dtype=squared_rirs.dtype)
+    edc_dB_reversed = 10.0 * np.log10(np.cumsum(squared_rirs[::-1], axis=0) / total_energies)
     edc_dB = edc_dB_reversed[::-1]
 
-    time_values_samples = range(integration_limit_samples)
-    time_values_seconds = [time_value / sample_rate for time_value in time_values_samples]
+    if dtype is not None:
+        edc_dB = edc_dB.astype(dtype)
+
+    time_values_seconds = np.arange(integration_limit_samples) / sample_rate
 
     return edc_dB, time_values_seconds
 
 
-def getEnergyTimeCurve(rir, sample_rate, window_duration_ms: float = 10.0):
-    rir /= np.max(np.abs(rir))
+# rir: (samples) or (samples x channels/bands), each channel normalised to its own peak (the input is not modified)
+# hop_duration_ms: spacing between window starts (default: window_duration_ms, i.e. non-overlapping windows)
+# window_shape: "rectangular" or "hann" weighting of the squared samples in each window
+# Returns energy_time_curve_dB (windows, or windows x channels), time_values (window start times in seconds)
+def getEnergyTimeCurve(rir, sample_rate, window_duration_ms: float = 10.0, hop_duration_ms: float = None, window_shape="rectangular"):
+    rir = np.asarray(rir)
     window_length_samples = int((sample_rate * window_duration_ms) / 1000)
-    num_rir_samples = len(rir)
-    energy_time_curve = np.zeros(int(num_rir_samples / window_length_samples))
-    squared_rir = np.square(rir)
-
-    for window_index, sample_index in enumerate(range(0, int(num_rir_samples - window_length_samples), window_length_samples)):
-        # # # apply windowing function here
-        mean = np.mean(squared_rir[sample_index:sample_index + window_length_samples])
-        energy_time_curve[window_index] = 10 * np.log10(mean)
-
-    time_values = [(energy_bin * window_length_samples) / sample_rate for energy_bin in range(len(energy_time_curve))]
+    hop_length_samples = window_length_samples if hop_duration_ms is None else int((sample_rate * hop_duration_ms) / 1000)
+    num_rir_samples = rir.shape[0]
+    num_windows = max(0, (num_rir_samples - window_length_samples) // hop_length_samples + 1)
+
+    # Channels first, so every operation runs along contiguous samples
+    rir_per_channel = np.ascontiguousarray(np.moveaxis(rir, 0, -1))
+    squared_rir = rir_per_channel / np.max(np.abs(rir_per_channel), axis=-1, keepdims=True)
+    np.square(squared_rir, out=squared_rir)
+
+    if window_shape == "rectangular" and hop_length_samples == window_length_samples:
+        # Non-overlapping windows are a reshape of the samples
+        windowed_squared_rir = squared_rir[..., :num_windows * window_length_samples].reshape(rir.shape[1:] + (num_windows, window_length_samples))
+        mean_energies = np.mean(windowed_squared_rir, axis=-1)
+    else:
+        if window_shape == "rectangular":
+            window = np.ones(window_length_samples)
+        elif window_shape == "hann":
+            window = np.hanning(window_length_samples)
+        else:
+            raise ValueError('"window_shape" must be one of ["rectangular", "hann"].')
+
+        # Strided view of every window (channels x windows x window samples), without copying the samples
+        windowed_squared_rir = np.lib.stride_tricks.sliding_window_view(squared_rir, window_length_samples, axis=-1)[..., ::hop_length_samples, :]
+        mean_energies = (windowed_squared_rir @ window) / np.sum(window)
+
+    # Back to windows (x channels)
+    mean_energies = np.moveaxis(mean_energies, -1, 0)
+
+    energy_time_curve = 10 * np.log10(mean_energies)
+    time_values = (np.arange(num_windows) * hop_length_samples) / sample_rate
 
     return energy_time_curve, time_values
 
@@ -44,13 +80,7 @@ def getEnergySpectrum(rir, sample_rate, fft_size, etc_window_duration_ms):
         smoothing_window_length_samples = int(np.floor(min_period / (etc_window_duration_ms / 1000)))
 
         # Mirror the start and ends of the ETC before smoothing (avoids edge effects), then clip ends after smoothing
-        # window = np.hanning(smoothing_window_length_samples)
-        etc_mirror_start = etc[smoothing_window_length_samples:0:-1]
-        etc_mirror_end = etc[-1:-smoothing_window_length_samples - 1:-1]
-        etc_mirror_padded = np.concat([etc_mirror_start, etc, etc_mirror_end])
-        # smoothed_etc_padded = np.convolve(window, etc_mirror_padded, 'same')
-        smoothed_etc_padded = savgol_filter(etc_mirror_padded, window_length=smoothing_window_length_samples, polyorder=2)
-        smoothed_etc = smoothed_etc_padded[smoothing_window_length_samples:-smoothing_window_length_samples]
+        smoothed_etc = Smoothing.smoothWithMirroredEnds(etc, smoothing_window_length_samples, polyorder=2)
 
         # Divide ETC by smoothed to remove decay shape
         etc_over_smoothed = etc / smoothed_etc
@@ -0,0 +1,274 @@
+# Trains many independent MLPRegressors at once, with their weights stacked (e.g. for different seeds, folds or
+# hyperparameters): run as a script from the repository root (python Src/EnsembleMLP.py)
+import argparse
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+from torch import nn
+from sklearn.model_selection import GroupKFold
+from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+
+import MLP
+
+ENSEMBLE_SAVE_DIRECTORY = "Src/DeepLearning/Ensemble"
+NUM_SEEDS = 4
+NUM_FOLDS = 5
+
+# ReduceLROnPlateau settings of MLP.train_model (the rest are torch's defaults)
+LR_REDUCTION_FACTOR = 0.5
+LR_REDUCTION_PATIENCE = 6
+LR_REDUCTION_THRESHOLD = 1e-4
+
+
+# Independent MLPRegressors (without stimulus embedding) evaluated together: each Linear layer's weights are stacked
+# into (members x outputs x inputs), and each member keeps its own dropout rates
+class StackedMLPRegressor(nn.Module):
+    # member_models: MLPRegressors of the same layer sizes, whose weights initialise the members
+    def __init__(self, member_models):
+        super().__init__()
+        member_layers = [[(name, layer) for name, layer in model.net.named_children() if isinstance(layer, nn.Linear)] for model in member_models]
+
+        self.num_members = len(member_models)
+        self.layer_names = [name for name, _ in member_layers[0]] # Positions of the Linear layers in MLPRegressor.net
+        self.weights = nn.ParameterList([nn.Parameter(torch.stack([layers[layer_index][1].weight.detach() for layers in member_layers]))
+                                         for layer_index in range(len(self.layer_names))])
+        self.biases = nn.ParameterList([nn.Parameter(torch.stack([layers[layer_index][1].bias.detach() for layers in member_layers]))
+                                        for layer_index in range(len(self.layer_names))])
+
+        # (members x hidden layers)
+        self.register_buffer("dropout_rates", torch.tensor([[layer.p for layer in model.net if isinstance(layer, nn.Dropout)]
+                                                            for model in member_models], dtype=torch.float32))
+
+    # features: (members x batch x inputs), or (batch x inputs) shared by every member
+    # Returns (members x batch)
+    def forward(self, features):
+        x = features.expand(self.num_members, -1, -1) if features.dim() == 2 else features
+
+        for layer_index, (weights, biases) in enumerate(zip(self.weights, self.biases)):
+            x = torch.baddbmm(biases.unsqueeze(1), x, weights.transpose(1, 2))
+
+            if layer_index < len(self.weights) - 1:
+                x = torch.relu(x)
+
+                if self.training:
+                    keep_probabilities = (1 - self.dropout_rates[:, layer_index]).view(-1, 1, 1)
+                    x = x * (torch.rand_like(x) < keep_probabilities) / keep_probabilities
+
+        return x.squeeze(2)
+
+    # Returns the member's weights as an MLPRegressor state_dict
+    def get_member_state(self, member_index):
+        member_state = {}
+        for layer_name, weights, biases in zip(self.layer_names, self.weights, self.biases):
+            member_state[f"net.{layer_name}.weight"] = weights[member_index].detach().clone()
+            member_state[f"net.{layer_name}.bias"] = biases[member_index].detach().clone()
+        return member_state
+
+
+# Members initialised as MLP.build_model would initialise them after torch.manual_seed(seed)
+# dropout_rates: one list of rates per member, or None for MLP.DROPOUTS
+def build_ensemble(n_features, seeds, dropout_rates=None):
+    member_models = []
+
+    for member_index, seed in enumerate(seeds):
+        torch.manual_seed(seed)
+        member_models.append(MLP.MLPRegressor(n_features=n_features,
+                                              hidden_sizes=MLP.HIDDEN_SIZES,
+                                              dropout_rates=MLP.DROPOUTS if dropout_rates is None else dropout_rates[member_index],
+                                              use_embedding=False))
+
+    return StackedMLPRegressor(member_models).to(MLP.DEVICE)
+
+
+# One step of Adam (as torch.optim.Adam, with L2 weight decay) on stacked parameters, with a learning rate and weight
+# decay per member (members)
+def adam_step(parameters, exp_avgs, exp_avg_sqs, step, learning_rates, weight_decays, betas=(0.9, 0.999), eps=1e-8):
+    bias_correction1 = 1 - betas[0] ** step
+    bias_correction2 = 1 - betas[1] ** step
+
+    with torch.no_grad():
+        for parameter, exp_avg, exp_avg_sq in zip(parameters, exp_avgs, exp_avg_sqs):
+            member_shape = (-1,) + (1,) * (parameter.dim() - 1)
+            grad = parameter.grad + weight_decays.view(member_shape) * parameter
+
+            exp_avg.mul_(betas[0]).add_(grad, alpha=1 - betas[0])
+            exp_avg_sq.mul_(betas[1]).addcmul_(grad, grad, value=1 - betas[1])
+
+            denom = (exp_avg_sq.sqrt() / math.sqrt(bias_correction2)).add_(eps)
+            parameter.addcdiv_(exp_avg * (learning_rates.view(member_shape) / bias_correction1), denom, value=-1)
+
+
+# Trains every member on its own rows of features with early stopping and learning rate reduction, as
+# MLP.train_model does for one model. Each member ends with the weights of its best epoch.
+# features: (ratings x inputs), targets: (ratings), as in MLP.RatingsDataset (ratings / 100)
+# train_masks, val_masks: (members x ratings) bool, the rows each member trains and early-stops on
+# learning_rates, weight_decays: (members), default MLP.LR and MLP.WEIGHT_DECAY
+# Returns the best epoch, best val MSE (members) and the training and validation loss per epoch (epochs x members)
+def train_ensemble(model, features, targets, train_masks, val_masks, learning_rates=None, weight_decays=None,
+                   batch_size=MLP.BATCH_SIZE, max_epochs=MLP.MAX_EPOCHS, patience=MLP.PATIENCE):
+    device = model.weights[0].device
+    num_members = model.num_members
+    features = torch.as_tensor(features, dtype=torch.float32, device=device)
+    targets = torch.as_tensor(targets, dtype=torch.float32, device=device).reshape(-1)
+    val_masks = torch.as_tensor(val_masks, dtype=torch.float32, device=device)
+    train_indices = [torch.nonzero(torch.as_tensor(mask)).flatten().to(device) for mask in train_masks]
+
+    learning_rates = torch.full((num_members,), MLP.LR, device=device) if learning_rates is None else torch.as_tensor(learning_rates, dtype=torch.float32, device=device)
+    weight_decays = torch.full((num_members,), MLP.WEIGHT_DECAY, device=device) if weight_decays is None else torch.as_tensor(weight_decays, dtype=torch.float32, device=device)
+
+    parameters = list(model.parameters())
+    exp_avgs = [torch.zeros_like(parameter) for parameter in parameters]
+    exp_avg_sqs = [torch.zeros_like(parameter) for parameter in parameters]
+    step = 0
+
+    steps_per_epoch = max(math.ceil(len(indices) / batch_size) for indices in train_indices)
+    best_parameters = [parameter.detach().clone() for parameter in parameters]
+    best_val_mse = torch.full((num_members,), float("inf"), device=device)
+    best_epoch = torch.zeros(num_members, dtype=torch.int64, device=device)
+    patience_counter = torch.zeros(num_members, dtype=torch.int64, device=device)
+    plateau_best = torch.full((num_members,), float("inf"), device=device)
+    plateau_counter = torch.zeros(num_members, dtype=torch.int64, device=device)
+    is_active = torch.ones(num_members, dtype=torch.bool, device=device)
+
+    training_loss = []
+    validation_loss = []
+
+    for epoch in range(1, max_epochs + 1):
+        model.train()
+
+        # Each member's rows in a new random order, repeated to fill the epoch: (members x samples this epoch)
+        epoch_indices = torch.stack([indices[torch.randperm(len(indices), device=device)].repeat(math.ceil(steps_per_epoch * batch_size / len(indices)))[:steps_per_epoch * batch_size]
+                                     for indices in train_indices])
+        running_loss = torch.zeros(num_members, device=device)
+
+        for batch_start in range(0, steps_per_epoch * batch_size, batch_size):
+            batch_indices = epoch_indices[:, batch_start:batch_start + batch_size]
+            outputs = model(features[batch_indices])
+            member_losses = torch.mean((outputs - targets[batch_indices]) ** 2, dim=1)
+
+            model.zero_grad()
+            member_losses.sum().backward() # Members share no parameters, so each gets only its own loss's gradient
+            step += 1
+            adam_step(parameters, exp_avgs, exp_avg_sqs, step, learning_rates * is_active, weight_decays)
+            running_loss += member_losses.detach()
+
+        model.eval()
+        with torch.no_grad():
+            val_errors = (model(features) - targets) ** 2
+            val_mse = torch.sum(val_errors * val_masks, dim=1) / torch.sum(val_masks, dim=1)
+
+        training_loss.append((running_loss / steps_per_epoch).cpu().numpy())
+        validation_loss.append(val_mse.cpu().numpy())
+
+        # early stopping check
+        is_improved = is_active & (val_mse < best_val_mse - 1e-6)
+        best_val_mse = torch.where(is_improved, val_mse, best_val_mse)
+        best_epoch = torch.where(is_improved, epoch, best_epoch)
+        patience_counter = torch.where(is_improved, 0, patience_counter + is_active.long())
+
+        for parameter, best_parameter in zip(parameters, best_parameters):
+            member_shape = (-1,) + (1,) * (parameter.dim() - 1)
+            best_parameter.copy_(torch.where(is_improved.view(member_shape), parameter.detach(), best_parameter))
+
+        # ReduceLROnPlateau(mode="min", factor=0.5, patience=6) per member
+        is_plateau_improved = val_mse < plateau_best * (1 - LR_REDUCTION_THRESHOLD)
+        plateau_best = torch.where(is_plateau_improved, val_mse, plateau_best)
+        plateau_counter = torch.where(is_plateau_improved, 0, plateau_counter + 1)
+        is_reduced = plateau_counter > LR_REDUCTION_PATIENCE
+        learning_rates = torch.where(is_reduced, learning_rates * LR_REDUCTION_FACTOR, learning_rates)
+        plateau_counter = torch.where(is_reduced, 0, plateau_counter)
+
+        is_active = is_active & (patience_counter < patience)
+
+        print(f"Epoch {epoch:03d} | mean train_loss: {training_loss[-1].mean():.4f} | mean val_mse: {validation_loss[-1].mean():.4f} | "
+              f"best val_mse: {best_val_mse.min().item():.4f}-{best_val_mse.max().item():.4f} | active members: {int(is_active.sum())}/{num_members}")
+
+        if not torch.any(is_active):
+            print(f"Early stopping: every member has gone {patience} epochs without improvement")
+            break
+
+    with torch.no_grad():
+        for parameter, best_parameter in zip(parameters, best_parameters):
+            parameter.copy_(best_parameter)
+
+    return best_epoch.cpu().numpy(), best_val_mse.cpu().numpy(), np.array(training_loss), np.array(validation_loss)
+
+
+# Saves each member's (best) weights as a checkpoint in the format of MLP.train_model, e.g. for NumpyMLP
+# Returns the checkpoint filepaths
+def save_member_checkpoints(model, best_epoch, best_val_mse, feature_cols, save_directory=ENSEMBLE_SAVE_DIRECTORY):
+    os.makedirs(save_directory, exist_ok=True)
+    checkpoint_paths = []
+
+    for member_index in range(model.num_members):
+        checkpoint_path = os.path.join(save_directory, f"member_{member_index}.pt")
+        torch.save({
+            "model_state": model.get_member_state(member_index),
+            "epoch": int(best_epoch[member_index]),
+            "val_mse": float(best_val_mse[member_index]),
+            "feature_cols": list(feature_cols)
+        }, checkpoint_path)
+        checkpoint_paths.append(checkpoint_path)
+
+    return checkpoint_paths
+
+
+# Returns the ensemble-averaged predictions (ratings) and each member's predictions (members x ratings)
+def predict_ensemble(model, features):
+    model.eval()
+    with torch.no_grad():
+        member_predictions = model(torch.as_tensor(features, dtype=torch.float32, device=model.weights[0].device)).cpu().numpy()
+    return member_predictions.mean(axis=0), member_predictions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train an ensemble of MLPs (seeds x grouped folds) at once and evaluate the ensemble average on the held-out test stimuli.")
+    parser.add_argument("--seeds", type=int, default=NUM_SEEDS, help="Number of initialisation seeds")
+    parser.add_argument("--folds", type=int, default=NUM_FOLDS, help="Number of grouped folds of the training stimuli, each held out for one member's early stopping")
+    parser.add_argument("--output", default=ENSEMBLE_SAVE_DIRECTORY, help="Directory for the member checkpoints")
+    args = parser.parse_args()
+
+    MLP.set_seed(MLP.RANDOM_SEED)
+
+    df = MLP.filter_prog_item(MLP.load_data_or_synth(MLP.DATA_CSV), MLP.TARGET_PROG_ITEM)
+    feature_names = MLP.get_feature_names(MLP.TARGET_PROG_ITEM)
+    feature_cols = [c for c in df.columns if c in feature_names]
+
+    # The same test stimuli as MLP.py; its train and val stimuli are split into folds instead
+    df_train, df_val, df_test = MLP.grouped_split(df, test_size=MLP.TEST_SIZE, val_size=MLP.VAL_SIZE)
+    df_train_val = pd.concat([df_train, df_val]).reset_index(drop=True)
+
+    mel_features = MLP.precompute_mel_features(MLP.RIR_DIRECTORY, MLP.load_stimulus_rir_folders())
+    train_val_ds = MLP.RatingsDataset(df_train_val, mel_features, feature_cols, pool=MLP.MEL_POOLING)
+    test_ds = MLP.RatingsDataset(df_test, mel_features, feature_cols, pool=MLP.MEL_POOLING)
+
+    fold_val_masks = np.zeros((args.folds, len(df_train_val)), dtype=bool)
+    for fold_index, (_, val_idx) in enumerate(GroupKFold(n_splits=args.folds).split(df_train_val, groups=df_train_val["stimulus_id"])):
+        fold_val_masks[fold_index, val_idx] = True
+
+    # Members: every seed with every fold
+    val_masks = np.tile(fold_val_masks, (args.seeds, 1))
+    seeds = np.repeat(MLP.RANDOM_SEED + np.arange(args.seeds), args.folds)
+
+    model = build_ensemble(train_val_ds.features.shape[1], seeds.tolist())
+    print(f"Training {model.num_members} members ({args.seeds} seeds x {args.folds} folds)")
+
+    best_epoch, best_val_mse, _, _ = train_ensemble(model, train_val_ds.features, train_val_ds.targets, ~val_masks, val_masks)
+    checkpoint_paths = save_member_checkpoints(model, best_epoch, best_val_mse, feature_cols, args.output)
+    print(f"Saved {len(checkpoint_paths)} member checkpoints to {args.output}")
+
+    ensemble_preds, member_preds = predict_ensemble(model, test_ds.features)
+    trues = test_ds.targets.numpy().ravel()
+    member_test_mse = np.mean((member_preds - trues) ** 2, axis=1)
+
+    print("\nTest set performance (ensemble average of best member weights):")
+    print(f"  MSE : {mean_squared_error(trues, ensemble_preds):.4f} (members: {member_test_mse.mean():.4f} ± {member_test_mse.std():.4f})")
+    print(f"  MAE : {mean_absolute_error(trues, ensemble_preds):.4f}")
+    print(f"  R2  : {r2_score(trues, ensemble_preds):.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import csv
+import functools
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import Colouration
+import FlutterEcho
+import SDM
+import DSE
+import HFDamping
+import RIRAnalysis
+import FeatureCache
+import RIRReader
+
+# Column names as expected by MLP.load_data_or_synth
+FEATURE_NAMES = ["colouration", "flutter_echo", "asymmetry", "curvature", "hf_damping"]
+
+FEATURE_FUNCTIONS = {
+    "colouration": Colouration.getColouration,
+    "flutter_echo": FlutterEcho.getFlutterEchoScore,
+    "asymmetry": SDM.getSpatialAsymmetryScore,
+    "curvature": DSE.getCurvature,
+    "hf_damping": HFDamping.getHFDampingScore,
+}
+
+# Keyword arguments passed to each feature function, which also form part of its feature cache key
+FEATURE_PARAMETERS = {
+    "colouration": {},
+    "flutter_echo": {"truncation_dB": -40.0},
+    "asymmetry": {},
+    "curvature": {"hpf_cutoff_Hz": 500.0},
+    "hf_damping": {},
+}
+
+# Number of leading RIR channels each feature reads (omni only, or the B-format channels)
+FEATURE_NUM_CHANNELS = {
+    "colouration": 1,
+    "flutter_echo": 4,
+    "asymmetry": 4,
+    "curvature": 1,
+    "hf_damping": 1,
+}
+
+
+# Audit columns written for each RIR when pre-truncating (see Truncation.TruncationReport)
+TRUNCATION_COLUMNS = ["original_num_samples", "truncated_num_samples", "noise_floor_dB", "last_useful_time_s"]
+
+
+# Computes every feature for a spatial RIR (at least its first four channels), sharing intermediates through one
+# RIRAnalysis.
+# feature_cache: optional FeatureCache.FeatureCache, from which previously computed results are reused
+# should_pre_truncate: trim the noise tail first (see Truncation.findTruncationPoint)
+# Returns features, truncation_report (None unless pre-truncating)
+def computeFeatures(spatial_rir, sample_rate, feature_cache=None, should_pre_truncate=False, truncation_margin_ms=200.0):
+    analysis = RIRAnalysis.RIRAnalysis(spatial_rir, sample_rate, should_pre_truncate, truncation_margin_ms)
+    features = {}
+
+    if feature_cache is not None:
+        # Keyed on the (possibly truncated) audio the features actually see, hashed once per number of channels read
+        audio_hashes = {num_channels: getAudioHash(analysis.spatial_rir, sample_rate, num_channels)
+                        for num_channels in set(FEATURE_NUM_CHANNELS.values())}
+
+    for feature_name in FEATURE_NAMES:
+        compute = functools.partial(computeFeature, analysis, sample_rate, feature_name)
+
+        if feature_cache is None:
+            features[feature_name] = compute()
+        else:
+            audio_hash = audio_hashes[FEATURE_NUM_CHANNELS[feature_name]]
+            features[feature_name] = feature_cache.getOrCompute(audio_hash, feature_name, FEATURE_PARAMETERS[feature_name], compute)
+
+    return features, analysis.truncation_report
+
+
+def computeFeature(rir, sample_rate, feature_name):
+    return float(FEATURE_FUNCTIONS[feature_name](rir, sample_rate, **FEATURE_PARAMETERS[feature_name]))
+
+
+# Hashes only the leading channels a feature reads, so its key doesn't depend on how many channels were loaded
+def getAudioHash(spatial_rir, sample_rate, num_channels):
+    spatial_rir = spatial_rir.reshape(len(spatial_rir), -1)
+    return FeatureCache.hashAudio(spatial_rir[:, :num_channels], sample_rate)
+
+
+# Returns features, truncation_report (None unless pre-truncating)
+def extractFeaturesFromFile(rir_filepath, cache_directory=None, should_pre_truncate=False, truncation_margin_ms=200.0):
+    # Only the B-format channels are needed, so the higher-order channels are never loaded
+    rir_reader = RIRReader.RIRReader(rir_filepath)
+    sample_rate = rir_reader.sample_rate
+    spatial_rir = rir_reader.readFirstChannels(max(FEATURE_NUM_CHANNELS.values()))
+
+    if cache_directory is None:
+        return computeFeatures(spatial_rir, sample_rate, None, should_pre_truncate, truncation_margin_ms)
+
+    # Each worker process opens its own connection to the shared cache
+    feature_cache = FeatureCache.FeatureCache(cache_directory)
+
+    try:
+        return computeFeatures(spatial_rir, sample_rate, feature_cache, should_pre_truncate, truncation_margin_ms)
+    finally:
+        feature_cache.close()
+
+
+# Scores every RIR across a process pool, returning (features, truncation_report) per RIR (in the same order)
+def extractFeatures(rir_filepaths, num_workers=None, cache_directory=None, should_pre_truncate=False, truncation_margin_ms=200.0):
+    extract = functools.partial(extractFeaturesFromFile,
+                                cache_directory=cache_directory,
+                                should_pre_truncate=should_pre_truncate,
+                                truncation_margin_ms=truncation_margin_ms)
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(extract, rir_filepaths))
+
+
+# input_path: a directory of WAV files (sorted naturally, so "2.wav" comes before "10.wav"), or a manifest listing
+# one RIR filename per line in stimulus ID order (as in rir_folders_ordered_by_stimulus_id.txt). Manifest entries
+# are relative to rir_directory, which defaults to the manifest's own directory.
+def getRIRFilepaths(input_path, rir_directory=None):
+    if os.path.isdir(input_path):
+        filenames = [filename for filename in os.listdir(input_path) if filename.lower().endswith(".wav")]
+        filenames.sort(key=lambda filename: [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", filename)])
+        return [os.path.join(input_path, filename) for filename in filenames]
+
+    if rir_directory is None:
+        rir_directory = os.path.dirname(input_path)
+
+    with open(input_path, "r") as file:
+        filenames = [line.strip(",\n") for line in file.readlines()]
+
+    return [os.path.join(rir_directory, filename) for filename in filenames if filename]
+
+
+# Writes one row per RIR, with stimulus IDs numbered from 1 in input order
+# results: (features, truncation_report) per RIR, as returned by extractFeatures(); truncation audit columns are
+# added when the RIRs were pre-truncated
+def writeFeatureTable(output_filepath, rir_filepaths, results):
+    has_truncation_reports = any(truncation_report is not None for _, truncation_report in results)
+
+    with open(output_filepath, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["stimulus_id", "filename"] + FEATURE_NAMES + (TRUNCATION_COLUMNS if has_truncation_reports else []))
+
+        for stimulus_index, (rir_filepath, (features, truncation_report)) in enumerate(zip(rir_filepaths, results)):
+            row = [stimulus_index + 1, os.path.basename(rir_filepath)] + [float(features[name]) for name in FEATURE_NAMES]
+
+            if has_truncation_reports:
+                row += [getattr(truncation_report, column) for column in TRUNCATION_COLUMNS]
+
+            writer.writerow(row)
+
+
+# Reads a feature table written by writeFeatureTable()
+# Returns filenames, feature_matrix (RIRs x FEATURE_NAMES)
+def readFeatureTable(feature_table_filepath):
+    with open(feature_table_filepath, "r", newline="") as file:
+        rows = list(csv.DictReader(file))
+
+    filenames = [row["filename"] for row in rows]
+    feature_matrix = np.array([[float(row[name]) for name in FEATURE_NAMES] for row in rows]).reshape(len(rows), len(FEATURE_NAMES))
+
+    return filenames, feature_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute all unpleasantness features for a corpus of 25-channel RIRs.")
+    parser.add_argument("input", help="Directory of RIR WAV files, or a manifest listing one RIR filename per line")
+    parser.add_argument("output", help="Output CSV path")
+    parser.add_argument("--rir-dir", default=None, help="Directory that manifest entries are relative to")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--cache-dir", default=None, help="Directory of a persistent feature cache to reuse results from")
+    parser.add_argument("--pre-truncate", action="store_true", help="Trim each RIR's noise tail before computing features")
+    parser.add_argument("--truncation-margin-ms", type=float, default=200.0, help="Margin kept after the last useful decay point")
+    args = parser.parse_args()
+
+    rir_filepaths = getRIRFilepaths(args.input, args.rir_dir)
+    results = extractFeatures(rir_filepaths, args.workers, args.cache_dir, args.pre_truncate, args.truncation_margin_ms)
+    writeFeatureTable(args.output, rir_filepaths, results)
+
+    print(f"Wrote features for {len(rir_filepaths)} RIRs to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
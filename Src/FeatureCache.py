@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+# Included in every key; bump this when a change to the feature code alters its outputs, so stale results are never
+# returned
+CODE_VERSION = "1"
+
+DEFAULT_MAX_SIZE_BYTES = 256 * 1024 * 1024
+
+# A hit only rewrites an entry's last access time once it is older than this, so reads rarely need a write transaction
+LAST_ACCESS_RESOLUTION_S = 60.0
+
+
+# Hash of the RIR audio and its sample rate, shared by the keys of every feature that reads the same channels
+def hashAudio(rir, sample_rate):
+    rir = np.ascontiguousarray(rir)
+    hasher = hashlib.sha256()
+    hasher.update(f"{rir.dtype.str},{rir.shape},{sample_rate};".encode())
+    hasher.update(rir.tobytes())
+    return hasher.hexdigest()
+
+
+# Persistent, content-addressed store of feature results, keyed by a hash of the RIR audio, the feature name, its
+# parameters and the code version. Entries are evicted least-recently-used first once the store grows beyond
+# max_size_bytes. Backed by a single SQLite file, so it can be shared between worker processes.
+class FeatureCache:
+    def __init__(self, cache_directory, max_size_bytes=DEFAULT_MAX_SIZE_BYTES, code_version=CODE_VERSION, last_access_resolution_s=LAST_ACCESS_RESOLUTION_S):
+        os.makedirs(cache_directory, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.last_access_resolution_s = last_access_resolution_s
+        self.code_version = code_version
+        self.connection = sqlite3.connect(os.path.join(cache_directory, "features.sqlite"), timeout=60.0)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS features ("
+                                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS features_by_last_access ON features (last_access)")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def getKey(self, audio_hash, feature_name, parameters):
+        key_description = json.dumps({"audio": audio_hash,
+                                      "feature": feature_name,
+                                      "parameters": parameters,
+                                      "code_version": self.code_version}, sort_keys=True)
+        return hashlib.sha256(key_description.encode()).hexdigest()
+
+    # Returns the cached value, or None on a miss
+    def get(self, key):
+        row = self.connection.execute("SELECT value, last_access FROM features WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        value, last_access = row
+        access_time = time.time()
+
+        if access_time - last_access > self.last_access_resolution_s:
+            self.connection.execute("UPDATE features SET last_access = ? WHERE key = ?", (access_time, key))
+            self.connection.commit()
+
+        return json.loads(value)
+
+    def put(self, key, value):
+        serialised_value = json.dumps(value)
+        size = len(key) + len(serialised_value)
+        self.connection.execute("INSERT OR REPLACE INTO features (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                                (key, serialised_value, size, time.time()))
+        self.connection.commit()
+        self.evict()
+
+    # Removes least-recently-used entries until the store fits within max_size_bytes
+    def evict(self):
+        total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM features").fetchone()[0]
+
+        if total_size <= self.max_size_bytes:
+            return
+
+        keys_to_remove = []
+
+        for key, size in self.connection.execute("SELECT key, size FROM features ORDER BY last_access"):
+            if total_size <= self.max_size_bytes:
+                break
+            keys_to_remove.append((key,))
+            total_size -= size
+
+        self.connection.executemany("DELETE FROM features WHERE key = ?", keys_to_remove)
+        self.connection.commit()
+
+    # compute: called with no arguments on a miss; its (JSON-serialisable) result is stored and returned
+    def getOrCompute(self, audio_hash, feature_name, parameters, compute):
+        key = self.getKey(audio_hash, feature_name, parameters)
+        value = self.get(key)
+
+        if value is None:
+            value = compute()
+            self.put(key, value)
+
+        return value
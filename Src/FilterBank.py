@@ -0,0 +1,62 @@
+import functools
+import numpy as np
+from scipy.signal import butter, sosfilt
+
+
+# Octave (or third-octave) band filterbank, matching the band layout of Utils.getOctaveBandsFromIR: a low-pass for
+# the lowest band, band-passes in between and a high-pass for the highest band, with centres above 70 Hz and
+# below Nyquist. The second-order sections are designed once on construction; use getFilterBank() to share them.
+class FilterBank:
+    def __init__(self, sample_rate, octave_band_resolution=1, filter_order=5):
+        if octave_band_resolution == 1:
+            octave_band_centres = 1e3 * np.logspace(-6, 5, 12, base=2)
+            centre_to_crossover_factor = 2 ** (1 / 2)
+        else:
+            octave_band_centres = 1e3 * np.logspace(-6, 5, 34, base=2)
+            centre_to_crossover_factor = 2 ** (1 / 6)
+
+        octave_band_centres = octave_band_centres[octave_band_centres > 70]
+        octave_band_centres = octave_band_centres[octave_band_centres < 0.5 * sample_rate]
+        num_bands = len(octave_band_centres)
+
+        self.sample_rate = sample_rate
+        self.octave_band_centres = octave_band_centres
+        self.num_bands = num_bands
+        self.sos_per_band = []
+
+        for freq_idx, centre_freq in enumerate(octave_band_centres):
+            bin_lower = centre_freq / centre_to_crossover_factor
+            bin_upper = centre_freq * centre_to_crossover_factor
+
+            if freq_idx == 0:
+                sos = butter(2 * filter_order, bin_upper, 'lowpass', fs=sample_rate, output='sos')
+            elif freq_idx == num_bands - 1:
+                sos = butter(2 * filter_order, bin_lower, 'highpass', fs=sample_rate, output='sos')
+            else:
+                sos = butter(filter_order, (bin_lower, bin_upper), 'bandpass', fs=sample_rate, output='sos')
+
+            self.sos_per_band.append(sos)
+
+    # signals: (samples) or (samples x channels)
+    # Returns (bands x samples) or (bands x samples x channels). Filtering always runs in double precision, so
+    # dtype=np.float32 only halves the memory of the (large) output array.
+    def filter(self, signals, dtype=np.float64):
+        signals = np.asarray(signals)
+        band_signals = np.empty((self.num_bands,) + signals.shape, dtype=dtype)
+
+        # Each band filters every channel at once along the sample axis
+        for band_index, sos in enumerate(self.sos_per_band):
+            band_signals[band_index] = sosfilt(sos, signals, axis=0)
+
+        return band_signals
+
+
+@functools.lru_cache(maxsize=None)
+def getFilterBank(sample_rate, octave_band_resolution=1, filter_order=5):
+    return FilterBank(sample_rate, octave_band_resolution, filter_order)
+
+
+# Butterworth high-pass second-order sections, designed once per (sample rate, cutoff, order)
+@functools.lru_cache(maxsize=None)
+def getHighPassFilter(sample_rate, cutoff_Hz, filter_order):
+    return butter(filter_order, cutoff_Hz, 'highpass', fs=sample_rate, output='sos')
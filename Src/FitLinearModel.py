@@ -0,0 +1,114 @@
+import argparse
+import csv
+import time
+
+import numpy as np
+
+import ExtractFeatures
+import PredictUnpleasantness
+
+# Number of k-fold coefficient sets per programme item (K_FOLDS, less the set trained on all data)
+NUM_FOLDS = len([k_fold for k_fold in PredictUnpleasantness.K_FOLDS if k_fold != -1])
+
+
+# Reads a ratings table as used to train the MLP: columns stimulus_id, prog_item, rating, ExtractFeatures.FEATURE_NAMES
+# and optionally fold (1 to NUM_FOLDS)
+# Returns stimulus_ids, prog_items, ratings, feature_matrix (ratings x features), folds (or None without a fold column)
+def readRatingsTable(ratings_table_filepath):
+    with open(ratings_table_filepath, "r", newline="") as file:
+        rows = list(csv.DictReader(file))
+
+    stimulus_ids = np.array([row["stimulus_id"] for row in rows])
+    prog_items = np.array([int(float(row["prog_item"])) for row in rows])
+    ratings = np.array([float(row["rating"]) for row in rows])
+    feature_matrix = np.array([[float(row[name]) for name in ExtractFeatures.FEATURE_NAMES] for row in rows]).reshape(len(rows), -1)
+    folds = np.array([int(float(row["fold"])) for row in rows]) if len(rows) > 0 and "fold" in rows[0] else None
+
+    return stimulus_ids, prog_items, ratings, feature_matrix, folds
+
+
+# Assigns whole stimuli to num_folds folds, as sklearn's GroupKFold does (including its order for equal-sized stimuli)
+# Returns the fold index (0 to num_folds - 1) of each rating
+def getGroupedFoldIndices(stimulus_ids, num_folds=NUM_FOLDS):
+    _, stimulus_indices, num_ratings = np.unique(stimulus_ids, return_inverse=True, return_counts=True)
+    fold_num_ratings = np.zeros(num_folds)
+    stimulus_folds = np.zeros(len(num_ratings), dtype=int)
+
+    for stimulus_index in np.argsort(num_ratings)[::-1]:
+        fold_index = np.argmin(fold_num_ratings)
+        stimulus_folds[stimulus_index] = fold_index
+        fold_num_ratings[fold_index] += num_ratings[stimulus_index]
+
+    return stimulus_folds[stimulus_indices]
+
+
+# Least squares fits of ratings to an intercept plus the features per programme item: one set per held-out fold, and
+# one on all ratings, from normal equations summed once per (programme item, fold) group
+# prog_item_indices, fold_indices: (ratings), indices into the programme items and folds
+# Returns coefficients (programme items x folds + 1 x terms), in the layout of PredictUnpleasantness.LINEAR_MODEL_COEFFICIENTS
+def fitLinearModels(feature_matrix, ratings, prog_item_indices, fold_indices, num_prog_items=len(PredictUnpleasantness.PROG_ITEMS), num_folds=NUM_FOLDS):
+    design_matrix = np.hstack([np.ones([len(feature_matrix), 1]), feature_matrix])
+    num_terms = design_matrix.shape[1]
+
+    group_grams = np.zeros([num_prog_items, num_folds, num_terms, num_terms])
+    group_moments = np.zeros([num_prog_items, num_folds, num_terms])
+
+    for prog_item_index in range(num_prog_items):
+        for fold_index in range(num_folds):
+            is_in_group = (prog_item_indices == prog_item_index) & (fold_indices == fold_index)
+            group_design = design_matrix[is_in_group]
+            group_ratings = ratings[is_in_group]
+            group_grams[prog_item_index, fold_index] = group_design.T @ group_design
+            group_moments[prog_item_index, fold_index] = group_design.T @ group_ratings
+
+    total_grams = group_grams.sum(axis=1, keepdims=True)
+    total_moments = group_moments.sum(axis=1, keepdims=True)
+    grams = np.concatenate([total_grams - group_grams, total_grams], axis=1)
+    moments = np.concatenate([total_moments - group_moments, total_moments], axis=1)
+
+    return np.linalg.solve(grams, moments[..., np.newaxis])[..., 0]
+
+
+# Fits the coefficient sets of PredictUnpleasantness (PROG_ITEMS x K_FOLDS x LINEAR_MODEL_TERMS) to a ratings table,
+# with folds from its fold column if it has one, or else from getGroupedFoldIndices
+def fitCoefficientsFromRatingsTable(ratings_table_filepath):
+    stimulus_ids, prog_items, ratings, feature_matrix, folds = readRatingsTable(ratings_table_filepath)
+
+    is_fitted = np.isin(prog_items, PredictUnpleasantness.PROG_ITEMS)
+    prog_item_indices = np.array([PredictUnpleasantness.PROG_ITEMS.index(prog_item) for prog_item in prog_items[is_fitted]], dtype=int)
+
+    if folds is None:
+        fold_indices = getGroupedFoldIndices(stimulus_ids[is_fitted])
+    else:
+        if not np.all(np.isin(folds[is_fitted], np.arange(1, NUM_FOLDS + 1))):
+            raise ValueError(f"Fold column values must be 1 to {NUM_FOLDS}")
+        fold_indices = folds[is_fitted] - 1
+
+    return fitLinearModels(feature_matrix[is_fitted], ratings[is_fitted], prog_item_indices, fold_indices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refit the linear model coefficient sets to a ratings table by stimulus-grouped k-fold least squares.")
+    parser.add_argument("ratings", help="Ratings CSV with stimulus_id, prog_item, rating, the feature columns and optionally fold")
+    parser.add_argument("output", help="Coefficient table CSV to write (load with PredictUnpleasantness --coefficients)")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    coefficients = fitCoefficientsFromRatingsTable(args.ratings)
+    fit_time_s = time.perf_counter() - start_time
+
+    PredictUnpleasantness.writeCoefficientTable(args.output, coefficients)
+
+    print(f"Fitted {coefficients.shape[0] * coefficients.shape[1]} coefficient sets in {fit_time_s * 1000:.1f} ms (including reading the table)")
+    print(f"    {'':<14}{'':<8}" + "".join(f"{term:>14}" for term in PredictUnpleasantness.LINEAR_MODEL_TERMS))
+    for prog_item_index, prog_item in enumerate(PredictUnpleasantness.PROG_ITEMS):
+        for k_fold_index, k_fold in enumerate(PredictUnpleasantness.K_FOLDS):
+            print(f"    {f'prog_item_{prog_item}':<14}{PredictUnpleasantness.getKFoldName(k_fold):<8}"
+                  + "".join(f"{coefficient:>14.3f}" for coefficient in coefficients[prog_item_index, k_fold_index]))
+
+    print(f"Max difference from the built-in coefficients: {np.max(np.abs(coefficients - PredictUnpleasantness.LINEAR_MODEL_COEFFICIENTS)):.3f}")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,19 @@
+from collections import namedtuple
+
 import Utils
 import numpy as np
-from matplotlib import pyplot as plt
-import Energy
-from scipy.signal import butter, sosfilt
+import RIRAnalysis
 
 
 def showEnergySpectrumPlots(energy_spectrum_dB, energy_spectrum_freqs, flutter_score):
+    import matplotlib.pyplot as plt
     plt.plot(energy_spectrum_freqs, energy_spectrum_dB)
     plt.title(f"|FFT(Energy Decay Fluctuations)| (flutter = {round(flutter_score, 3)})")
 
     plt.show()
 
 def showACFPlots(num_octave_bands, auto_correlations, sample_rate, octave_band_centres, flutter_score, etc_window_duration_ms):
+    import matplotlib.pyplot as plt
     fig, axes = plt.subplots(num_octave_bands)
     fig.set_size_inches(6, 8)
     fig.set_layout_engine("tight")
@@ -30,19 +32,21 @@ def showACFPlots(num_octave_bands, auto_correlations, sample_rate, octave_band_c
 
     plt.show()
 
-def getScoreSingleChannel(rir, sample_rate, should_show_plots=False):
+# rir: RIR array or RIRAnalysis, of which the given channel is scored
+def getScoreSingleChannel(rir, sample_rate, should_show_plots=False, channel=0, truncation_dB=-40.0):
+    analysis = RIRAnalysis.asAnalysis(rir, sample_rate)
+
     # High-pass RIR from 1 kHz
     filter_order = 4
     cutoff_Hz = 1000.0
-    sos = butter(2 * filter_order, cutoff_Hz, 'highpass', fs=sample_rate, output='sos')
-    rir_high_passed = sosfilt(sos, rir)
+    high_pass = (cutoff_Hz, 2 * filter_order)
 
     # Get energy time curve of the high-passed RIR
     etc_window_duration_ms = 2.0
-    etc_dB, _ = Energy.getEnergyTimeCurve(rir_high_passed, sample_rate, etc_window_duration_ms)
+    etc_dB, _ = analysis.getETC(channel, high_pass, etc_window_duration_ms)
 
-    # Truncate after -40 dB
-    etc_dB_trunc = etc_dB[:Utils.findIndexOfClosest(etc_dB, -40.0)]
+    # Truncate after -40 dB (by default)
+    etc_dB_trunc = etc_dB[:Utils.findIndexOfClosest(etc_dB, truncation_dB)]
 
     # Get energy spectrum (FFT of energy time curve in decibels)
     fft_size = 2 ** 10
@@ -67,9 +71,74 @@ def getScoreSingleChannel(rir, sample_rate, should_show_plots=False):
     return flutter_echo_score
 
 
-def getFlutterEchoScore(spatial_rir, sample_rate, should_show_plots=False):
-    # Compute flutter score for the first four spatial RIR channels
-    scores = [getScoreSingleChannel(spatial_rir[:, channel], sample_rate, should_show_plots) for channel in range(4)]
+# Per-channel results of the batched flutter echo analysis (see getFlutterEchoDiagnostics)
+# channel_scores: flutter score of each channel, before summation and scaling into score
+# truncation_times_s: where each channel's ETC was truncated (its closest window to truncation_dB)
+# peak_frequencies_Hz: energy fluctuation frequency of each channel's strongest spectral peak (above 0 Hz, up to 20 Hz)
+# energy_spectra_dB: (bins x channels) energy spectra between 0-20 Hz, at energy_spectrum_freqs
+FlutterEchoDiagnostics = namedtuple("FlutterEchoDiagnostics", ["score",
+                                                               "channel_scores",
+                                                               "truncation_times_s",
+                                                               "peak_frequencies_Hz",
+                                                               "energy_spectra_dB",
+                                                               "energy_spectrum_freqs"])
+
+
+# Scores the first num_channels channels together, as getScoreSingleChannel does each one
+# spatial_rir: B-format (or higher-order) RIR array or RIRAnalysis
+def getFlutterEchoDiagnostics(spatial_rir, sample_rate, num_channels=4, truncation_dB=-40.0):
+    analysis = RIRAnalysis.asAnalysis(spatial_rir, sample_rate)
+
+    # High-pass RIR from 1 kHz
+    filter_order = 4
+    cutoff_Hz = 1000.0
+    high_pass = (cutoff_Hz, 2 * filter_order)
+
+    # Get energy time curves of the high-passed channels (windows x channels)
+    etc_window_duration_ms = 2.0
+    etcs_dB, etc_times = analysis.getETCs(num_channels, high_pass, etc_window_duration_ms)
+
+    # Truncate each channel after -40 dB (by default), zeroing the rest of the FFT input
+    fft_size = 2 ** 10
+    truncation_indices = np.argmin(np.abs(etcs_dB - truncation_dB), axis=0)
+    num_windows = min(len(etcs_dB), fft_size)
+    is_before_truncation = np.arange(num_windows)[:, np.newaxis] < truncation_indices
+    etcs_dB_trunc = np.where(is_before_truncation, etcs_dB[:num_windows], 0.0).T
+
+    # Get energy spectra (FFT of energy time curves in decibels), as channels x bins
+    energy_spectra_dB = np.log10(np.abs(np.fft.rfft(etcs_dB_trunc, n=fft_size, axis=1)))
+
+    # Truncate energy spectra between 0-20 Hz
+    energy_spectrum_freqs = np.fft.rfftfreq(fft_size, etc_window_duration_ms / 1000.0)
+    energy_frequency_index_range = Utils.getFrequencyIndexRange(energy_spectrum_freqs,
+                                                                0.0,
+                                                                20.0,
+                                                                sample_rate=1.0 / (etc_window_duration_ms / 1000.0))
+    # (kept contiguous so the per-channel reductions below sum exactly as they would for each channel alone)
+    energy_spectra_dB = np.ascontiguousarray(energy_spectra_dB[:, energy_frequency_index_range.start:energy_frequency_index_range.stop])
+    energy_spectrum_freqs = energy_spectrum_freqs[energy_frequency_index_range]
+
+    # Find max magnitude of energy oscillations between 0-20 Hz minus the mean and standard deviation
+    channel_scores = 1.0 - (np.max(energy_spectra_dB, axis=1) - np.mean(energy_spectra_dB, axis=1) - np.std(energy_spectra_dB, axis=1))
 
     # Output summation of the channel scores
-    return (np.sum(scores) - 1.4) / 1.7
\ No newline at end of file
+    flutter_echo_score = (np.sum(channel_scores) - 1.4) / 1.7
+
+    return FlutterEchoDiagnostics(flutter_echo_score,
+                                  channel_scores,
+                                  etc_times[truncation_indices],
+                                  energy_spectrum_freqs[1 + np.argmax(energy_spectra_dB[:, 1:], axis=1)],
+                                  energy_spectra_dB.T,
+                                  energy_spectrum_freqs)
+
+
+# spatial_rir: B-format (or higher-order) RIR array or RIRAnalysis
+def getFlutterEchoScore(spatial_rir, sample_rate, should_show_plots=False, truncation_dB=-40.0):
+    # Compute flutter score for the first four spatial RIR channels
+    diagnostics = getFlutterEchoDiagnostics(spatial_rir, sample_rate, 4, truncation_dB)
+
+    if should_show_plots:
+        for channel, channel_score in enumerate(diagnostics.channel_scores):
+            showEnergySpectrumPlots(diagnostics.energy_spectra_dB[:, channel], diagnostics.energy_spectrum_freqs, channel_score)
+
+    return diagnostics.score
@@ -1,11 +1,11 @@
 import numpy as np
-import Energy
+import RIRAnalysis
 import Utils
-from scipy.signal import savgol_filter
-import matplotlib.pyplot as plt
+import Smoothing
 import RT
 
 def showPlots(early_mag_spectrum_log_smoothed, late_mag_spectrum_log_smoothed, frequencies, early_energy, late_energy, spectral_evolution_score):
+    import matplotlib.pyplot as plt
     plt.figure()
     fig, axes = plt.subplots(1)
     plt.semilogx(frequencies, early_mag_spectrum_log_smoothed, label="Early", linestyle="--")
@@ -15,12 +15,13 @@ def showPlots(early_mag_spectrum_log_smoothed, late_mag_spectrum_log_smoothed, f
     fig.suptitle(f"Early = {np.round(early_energy, 2)}, Late = {np.round(late_energy, 2)}, Spectral Evolution = {np.round(spectral_evolution_score, 2)} dB")
     plt.show()
 
+# rir: omni RIR array or RIRAnalysis
 def getEarlyAndLateRIR(rir, sample_rate, early_start_dB, early_end_dB, late_start_dB, late_end_dB):
-    edc_dB, _ = Energy.getEDC(rir, sample_rate)
-    early_start_samples = Utils.findIndexOfClosest(edc_dB, early_start_dB)
-    early_end_samples = Utils.findIndexOfClosest(edc_dB, early_end_dB)
-    late_start_samples = Utils.findIndexOfClosest(edc_dB, late_start_dB)
-    late_end_samples = Utils.findIndexOfClosest(edc_dB, late_end_dB)
+    analysis = RIRAnalysis.asAnalysis(rir, sample_rate)
+    rir = analysis.getSignal()
+    edc_dB, _ = analysis.getEDC()
+    levels_dB = [early_start_dB, early_end_dB, late_start_dB, late_end_dB]
+    early_start_samples, early_end_samples, late_start_samples, late_end_samples = Utils.findIndicesOfDecayLevels(edc_dB, levels_dB)
 
     early_rir = rir[early_start_samples:early_end_samples]
     late_rir = rir[late_start_samples:late_end_samples]
@@ -28,9 +29,13 @@ def getEarlyAndLateRIR(rir, sample_rate, early_start_dB, early_end_dB, late_star
     return early_rir, late_rir
 
 
+# rir: omni RIR array or RIRAnalysis
 def getHFDampingScore(rir, sample_rate, should_show_plots=False):
+    analysis = RIRAnalysis.asAnalysis(rir, sample_rate)
+    sample_rate = analysis.sample_rate
+
     # Split early and late regions of the RIR
-    early_rir, late_rir = getEarlyAndLateRIR(rir, sample_rate, -1, -15, -35, -40)
+    early_rir, late_rir = getEarlyAndLateRIR(analysis, sample_rate, -1, -15, -35, -40)
 
     # Zero-pad to the same length
     pad_length = np.max([len(early_rir), len(late_rir)])
@@ -38,18 +43,17 @@ def getHFDampingScore(rir, sample_rate, should_show_plots=False):
     late_rir = np.pad(late_rir, (0, pad_length - len(late_rir)), mode='constant')
 
     # Get magnitude spectrum of each
-    early_mag_spectrum = 20 * np.log10(np.abs(np.fft.rfft(early_rir)))
-    late_mag_spectrum = 20 * np.log10(np.abs(np.fft.rfft(late_rir)))
+    early_and_late_mag_spectra = 20 * np.log10(np.abs(np.fft.rfft(np.stack([early_rir, late_rir], axis=1), axis=0)))
 
-    # Convert to log frequency from cutoff to Nyquist
+    # Convert both to log frequency from cutoff to Nyquist
     cutoff = 2000
-    early_mag_spectrum_log, early_frequencies = Utils.linearToLog(early_mag_spectrum, sample_rate, cutoff, sample_rate / 2)
-    late_mag_spectrum_log, late_frequencies = Utils.linearToLog(late_mag_spectrum, sample_rate, cutoff, sample_rate / 2)
+    early_and_late_mag_spectra_log, early_frequencies = Utils.linearToLog(early_and_late_mag_spectra, sample_rate, cutoff, sample_rate / 2)
 
     # Smooth spectra
-    smoothing_window_length_samples = early_mag_spectrum_log.shape[0] // 2
-    early_mag_spectrum_log_smoothed = savgol_filter(early_mag_spectrum_log, window_length=smoothing_window_length_samples, polyorder=1)
-    late_mag_spectrum_log_smoothed = savgol_filter(late_mag_spectrum_log, window_length=smoothing_window_length_samples, polyorder=1)
+    smoothing_window_length_samples = early_and_late_mag_spectra_log.shape[0] // 2
+    early_and_late_mag_spectra_log_smoothed = Smoothing.smoothLocalRegression(early_and_late_mag_spectra_log, smoothing_window_length_samples, polyorder=1)
+    early_mag_spectrum_log_smoothed = early_and_late_mag_spectra_log_smoothed[:, 0]
+    late_mag_spectrum_log_smoothed = early_and_late_mag_spectra_log_smoothed[:, 1]
 
     # Normalise both spectra so they overlap (compensate for the overall decay in level)
     early_mag_spectrum_log_smoothed -= np.max(early_mag_spectrum_log_smoothed)
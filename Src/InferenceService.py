@@ -0,0 +1,314 @@
+import argparse
+import functools
+import json
+import os
+import queue
+import threading
+import time
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import ExtractFeatures
+import FilterBank
+import MelFeatureStore
+import NumpyMLP
+import PredictUnpleasantness
+
+
+# Collects items submitted from many threads into batches of up to max_batch_size (waiting at most max_wait_ms)
+# process_batch: called with a list of items, returns their results in order; an Exception result is raised for its item
+class MicroBatcher:
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=5.0):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Returns a Future of the item's result
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _getBatch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+
+        while len(batch) < self.max_batch_size:
+            remaining_wait_s = deadline - time.monotonic()
+
+            if remaining_wait_s <= 0:
+                break
+
+            try:
+                batch.append(self._queue.get(timeout=remaining_wait_s))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._getBatch()
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+
+            try:
+                results = self.process_batch(items)
+            except Exception as exception:
+                for future in futures:
+                    future.set_exception(exception)
+                continue
+
+            for future, result in zip(futures, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+# Runs once in each feature worker process as it starts, so its first request doesn't pay for imports, filterbank
+# design or librosa's first mel spectrogram
+def warmUpWorker(sample_rates, mel_parameters=None):
+    for sample_rate in sample_rates:
+        FilterBank.getFilterBank(sample_rate)
+
+    if mel_parameters is not None:
+        import librosa
+        librosa.feature.melspectrogram(y=np.zeros(mel_parameters["fft_size"], dtype=np.float32), sr=MelFeatureStore.MEL_SAMPLE_RATE,
+                                       n_mels=mel_parameters["num_mels"], n_fft=mel_parameters["fft_size"], hop_length=mel_parameters["hop_length"])
+
+
+# Runs in a feature worker process
+# mel_parameters: keyword arguments of MelFeatureStore.computeMelSpectrogram, or None to skip the mel spectrogram
+# Returns features, mel_spectrogram (None without mel_parameters)
+def extractModelInputsFromFile(rir_filepath, cache_directory=None, mel_parameters=None):
+    features, _ = ExtractFeatures.extractFeaturesFromFile(rir_filepath, cache_directory)
+
+    if mel_parameters is None:
+        return features, None
+
+    return features, MelFeatureStore.computeMelSpectrogram(rir_filepath, **mel_parameters)
+
+
+# Keeps the feature pipeline, linear model and MLP warm between requests. RIRs are extracted in a pool of worker
+# processes, and feature vectors (given, or extracted) are micro-batched for prediction.
+# mlp_archive_path: NumPy archive of the MLP (see NumpyMLP.exportMLP), or None; it only predicts RIR requests
+class InferenceService:
+    def __init__(self, num_workers=None, cache_directory=None, sample_rates=(32000, 48000), max_batch_size=32, max_wait_ms=5.0,
+                 coefficients=PredictUnpleasantness.LINEAR_MODEL_COEFFICIENTS, mlp_archive_path=None):
+        self.cache_directory = cache_directory
+        self.coefficients = coefficients
+        self.mlp = None
+        self.mel_parameters = None
+
+        if mlp_archive_path is not None:
+            self.mlp = NumpyMLP.getNumpyMLP(mlp_archive_path)
+
+            if self.mlp.stimulus_embeddings is not None:
+                raise ValueError(f"{mlp_archive_path} was trained with a stimulus embedding, so it can't predict new RIRs")
+
+            self.mel_parameters = {"ir_length_samples": self.mlp.mel_ir_length_samples,
+                                   "num_mels": self.mlp.num_mels,
+                                   "fft_size": self.mlp.mel_fft_size,
+                                   "hop_length": self.mlp.mel_hop_length}
+
+        num_workers = os.cpu_count() if num_workers is None else num_workers
+        self.executor = ProcessPoolExecutor(max_workers=num_workers, initializer=warmUpWorker,
+                                            initargs=(tuple(sample_rates), self.mel_parameters))
+        self.batcher = MicroBatcher(self.processBatch, max_batch_size, max_wait_ms)
+
+        # Start every worker now rather than on the first request
+        for future in [self.executor.submit(warmUpWorker, ()) for _ in range(num_workers)]:
+            future.result()
+
+    def close(self):
+        self.executor.shutdown()
+
+    # request: {"rir": RIR WAV filepath} or {"features": [five values in ExtractFeatures.FEATURE_NAMES order] or
+    # {feature name: value}}
+    # Returns {"features": {...}, "predictions": {...}}, plus "mlp_prediction" (0-100) for RIRs when serving the MLP
+    def predict(self, request):
+        return self.submit(parseRequest(request)).result()
+
+    # item: an RIR filepath (str) or a feature vector, as from parseRequest
+    # Returns a Future of the item's result (see predict)
+    def submit(self, item):
+        if not isinstance(item, str):
+            return self.batcher.submit((item, None))
+
+        future = Future()
+        extraction_future = self.executor.submit(extractModelInputsFromFile, item, self.cache_directory, self.mel_parameters)
+        extraction_future.add_done_callback(functools.partial(self.submitExtractedFeatures, future))
+        return future
+
+    # Called as each RIR's extraction finishes, to batch its model inputs for prediction
+    def submitExtractedFeatures(self, future, extraction_future):
+        try:
+            features, mel_spectrogram = extraction_future.result()
+        except Exception as exception:
+            future.set_exception(exception)
+            return
+
+        feature_vector = [features[feature_name] for feature_name in ExtractFeatures.FEATURE_NAMES]
+        self.batcher.submit((feature_vector, mel_spectrogram)).add_done_callback(functools.partial(copyFutureOutcome, future))
+
+    # items: (feature vector, mel spectrogram or None)
+    def processBatch(self, items):
+        feature_vectors = [feature_vector for feature_vector, _ in items]
+        mel_spectrograms = [mel_spectrogram for _, mel_spectrogram in items]
+        return predictBatch(feature_vectors, mel_spectrograms, self.coefficients, self.mlp)
+
+
+# Predicts every feature vector with the linear model, and those with a mel spectrogram with the MLP
+# feature_vectors: (N x features), in ExtractFeatures.FEATURE_NAMES order
+# mel_spectrograms: N mel spectrograms (see MelFeatureStore.computeMelSpectrogram) or None
+# Returns N results (see InferenceService.predict)
+def predictBatch(feature_vectors, mel_spectrograms, coefficients=PredictUnpleasantness.LINEAR_MODEL_COEFFICIENTS, mlp=None):
+    feature_matrix = np.array(feature_vectors, dtype=float).reshape(len(feature_vectors), len(ExtractFeatures.FEATURE_NAMES))
+    predictions = PredictUnpleasantness.predictUnpleasantnessFromFeatureMatrix(feature_matrix, coefficients)
+
+    results = [{"features": dict(zip(ExtractFeatures.FEATURE_NAMES, map(float, feature_vector))),
+                "predictions": PredictUnpleasantness.getPredictionsDict(item_predictions)}
+               for feature_vector, item_predictions in zip(feature_matrix, predictions)]
+
+    mlp_indices = [item_index for item_index, mel_spectrogram in enumerate(mel_spectrograms) if mel_spectrogram is not None]
+
+    if mlp is not None and len(mlp_indices) > 0:
+        scalar_feature_indices = [ExtractFeatures.FEATURE_NAMES.index(name) for name in mlp.scalar_feature_names]
+        mlp_predictions = mlp.predict(feature_matrix[np.ix_(mlp_indices, scalar_feature_indices)],
+                                      np.stack([mel_spectrograms[item_index] for item_index in mlp_indices]))
+
+        for item_index, mlp_prediction in zip(mlp_indices, mlp_predictions):
+            results[item_index]["mlp_prediction"] = float(mlp_prediction)
+
+    return results
+
+
+def copyFutureOutcome(future, source_future):
+    if source_future.exception() is not None:
+        future.set_exception(source_future.exception())
+    else:
+        future.set_result(source_future.result())
+
+
+# Returns mlp_archive_path, or by default NumpyMLP.MLP_ARCHIVE_PATH if it has been exported (else None, with a warning)
+def getMLPArchivePath(mlp_archive_path=None):
+    if mlp_archive_path is not None:
+        if not os.path.exists(mlp_archive_path):
+            raise FileNotFoundError(f"MLP archive {mlp_archive_path} not found; export it with NumpyMLP.py export, or pass --no-mlp")
+        return mlp_archive_path
+
+    if not os.path.exists(NumpyMLP.MLP_ARCHIVE_PATH):
+        warnings.warn(f"MLP archive {NumpyMLP.MLP_ARCHIVE_PATH} not found (export it with NumpyMLP.py export); predicting with the linear model only")
+        return None
+
+    return NumpyMLP.MLP_ARCHIVE_PATH
+
+
+# Returns an RIR filepath (str) or a feature vector (list of floats in ExtractFeatures.FEATURE_NAMES order)
+def parseRequest(request):
+    if not isinstance(request, dict):
+        raise ValueError('Request must be a JSON object with "rir" or "features".')
+
+    if "rir" in request:
+        if not isinstance(request["rir"], str):
+            raise ValueError('"rir" must be a filepath.')
+        return request["rir"]
+
+    if "features" in request:
+        features = request["features"]
+
+        if isinstance(features, dict):
+            missing_feature_names = [name for name in ExtractFeatures.FEATURE_NAMES if name not in features]
+            if len(missing_feature_names) > 0:
+                raise ValueError(f"Missing features: {missing_feature_names}")
+            features = [features[name] for name in ExtractFeatures.FEATURE_NAMES]
+
+        if len(features) != len(ExtractFeatures.FEATURE_NAMES):
+            raise ValueError(f'"features" must have {len(ExtractFeatures.FEATURE_NAMES)} values: {ExtractFeatures.FEATURE_NAMES}')
+
+        return [float(feature) for feature in features]
+
+    raise ValueError('Request must contain "rir" or "features".')
+
+
+# POST /predict with a JSON request (see InferenceService.predict); GET /health
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def sendJSON(self, status_code, response):
+        body = json.dumps(response).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.sendJSON(200, {"status": "ok"})
+        else:
+            self.sendJSON(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self.sendJSON(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            item = parseRequest(request)
+        except (ValueError, TypeError) as exception:
+            self.sendJSON(400, {"error": str(exception)})
+            return
+
+        try:
+            self.sendJSON(200, self.service.submit(item).result())
+        except Exception as exception:
+            self.sendJSON(500, {"error": f"{type(exception).__name__}: {exception}"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve unpleasantness predictions over localhost HTTP, keeping the pipeline warm.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (localhost only)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of feature worker processes (default: CPU count)")
+    parser.add_argument("--cache-dir", default=None, help="Directory of a persistent feature cache to reuse results from")
+    parser.add_argument("--sample-rates", type=int, nargs="+", default=[32000, 48000], help="Sample rates to prepare filters for")
+    parser.add_argument("--max-batch-size", type=int, default=32, help="Maximum number of requests per batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a batch waits for further requests")
+    parser.add_argument("--coefficients", default=None, help="Coefficient table to predict with, e.g. from FitLinearModel (default: the built-in coefficients)")
+    parser.add_argument("--mlp", default=None, help="MLP archive to predict RIRs with as well (default: the exported best model, if any)")
+    parser.add_argument("--no-mlp", action="store_true", help="Predict with the linear model only")
+    args = parser.parse_args()
+
+    try:
+        mlp_archive_path = None if args.no_mlp else getMLPArchivePath(args.mlp)
+    except FileNotFoundError as error:
+        parser.error(str(error))
+
+    coefficients = PredictUnpleasantness.LINEAR_MODEL_COEFFICIENTS if args.coefficients is None else PredictUnpleasantness.readCoefficientTable(args.coefficients)
+    InferenceRequestHandler.service = InferenceService(args.workers, args.cache_dir, args.sample_rates, args.max_batch_size, args.max_wait_ms,
+                                                       coefficients, mlp_archive_path)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), InferenceRequestHandler)
+    print(f"Serving predictions on http://127.0.0.1:{args.port}/predict")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        InferenceRequestHandler.service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import functools
+import numpy as np
+
+
+# Linear interpolation from half spectra of num_bins bins (0 Hz to Nyquist, DC excluded) onto num_output_bins
+# log-spaced frequencies between f_min and f_max: the lower and upper bin of each output frequency and their weights,
+# which are both 0 outside the spectrum
+# Returns lower_indices, upper_indices, lower_weights, upper_weights, log_freqs (read-only)
+@functools.lru_cache(maxsize=128)
+def getInterpolation(num_bins, sample_rate, f_min, f_max, num_output_bins):
+    linear_frequencies = np.linspace(0, sample_rate / 2, num_bins)[1:]
+    log_freqs = np.logspace(np.log10(f_min), np.log10(f_max), num_output_bins)
+
+    upper_indices = np.clip(np.searchsorted(linear_frequencies, log_freqs, side="right"), 1, len(linear_frequencies) - 1)
+    lower_indices = upper_indices - 1
+    upper_weights = ((log_freqs - linear_frequencies[lower_indices])
+                     / (linear_frequencies[upper_indices] - linear_frequencies[lower_indices]))
+
+    is_in_spectrum = (log_freqs >= linear_frequencies[0]) & (log_freqs <= linear_frequencies[-1])
+    lower_weights = np.where(is_in_spectrum, 1 - upper_weights, 0.0)
+    upper_weights = np.where(is_in_spectrum, upper_weights, 0.0)
+
+    interpolation = lower_indices, upper_indices, lower_weights, upper_weights, log_freqs
+    for array in interpolation:
+        array.flags.writeable = False
+
+    return interpolation
+
+
+# Resamples half spectra onto a log-frequency axis between f_min and f_max (default: Nyquist), with 0 outside the
+# spectrum (see Utils.linearToLog)
+# magnitudes: (bins) or (bins x spectra)
+# num_output_bins: default the number of input bins
+# Returns log_mags (num_output_bins (x spectra)), log_freqs
+def resample(magnitudes, sample_rate, f_min, f_max=None, num_output_bins=None):
+    magnitudes = np.asarray(magnitudes)
+    num_bins = len(magnitudes)
+    f_max = sample_rate / 2 if f_max is None else f_max
+    num_output_bins = num_bins if num_output_bins is None else num_output_bins
+
+    lower_indices, upper_indices, lower_weights, upper_weights, log_freqs = getInterpolation(num_bins, sample_rate, f_min, f_max, num_output_bins)
+
+    spectra = magnitudes[1:].reshape(num_bins - 1, -1)
+    log_mags = np.take(spectra, lower_indices, axis=0) * lower_weights[:, np.newaxis]
+    log_mags += np.take(spectra, upper_indices, axis=0) * upper_weights[:, np.newaxis]
+
+    return log_mags.reshape((num_output_bins,) + magnitudes.shape[1:]), log_freqs
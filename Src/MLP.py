@@ -1,7 +1,11 @@
-# Run from here to prep everything up to training
+# Trains the MLP on the listening test ratings: run as a script from the repository root (python Src/MLP.py).
+# Importing this module only defines the config, data helpers and model.
+import argparse
+import functools
 import os
 import random
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 
 import numpy as np
@@ -11,11 +15,10 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 
 import torch
 from torch import nn
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset
 
-import matplotlib.pyplot as plt
-
-import librosa
+import MelFeatureStore
+import NumpyMLP
 
 # ---------------------------
 # User-editable config
@@ -37,12 +40,18 @@ TEST_SIZE = 0.15
 VAL_SIZE = 0.2
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 MODEL_SAVE_PATH = "Src/DeepLearning/best_mlp_model.pt"
+MLP_ARCHIVE_PATH = NumpyMLP.MLP_ARCHIVE_PATH # Torch-free copy of the best model, for inference
+TEST_PREDICTIONS_PATH = "Src/DeepLearning/test_preds.csv"
 # Mel spectrogram params
 NUM_MELS = 32
 MEL_POOLING = "mean"
 MEL_FFT_SIZE = 2**10
 MEL_IR_LENGTH_SAMPLES = int(1.0 * 32000.0)
 MEL_HOP_LENGTH = MEL_IR_LENGTH_SAMPLES // 12
+MEL_STORE_DIRECTORY = "Src/DeepLearning/MelStore" # Persisted mel spectrograms; None to recompute every run
+
+RIR_DIRECTORY = "../AAESDatasetGenerator/Audio Data/AAES Receiver RIRs/"
+STIMULUS_RIR_FOLDERS_PATH = "../AAESUnpleasantnessModel-Evaluation/Data/rir_folders_ordered_by_stimulus_id.txt"
 
 # ---------------------------
 # Reproducibility
@@ -54,43 +63,37 @@ def set_seed(seed):
     if torch.cuda.is_available():
         torch.cuda.manual_seed_all(seed)
 
-set_seed(RANDOM_SEED)
-
 # ---------------------------
 # Load Mel spectrogram for each stimulus
 # ---------------------------
 # Your mapping: stimulus_id → wav file
 def compute_mel_spectrogram(wav_path, max_ir_length_samples=64000, n_mels=64, n_fft=1024, hop_length=512):
     """Compute a normalized Mel-spectrogram from a wav file."""
-    rir_raw, fs = librosa.load(wav_path)
+    return MelFeatureStore.computeMelSpectrogram(wav_path, max_ir_length_samples, n_mels, n_fft, hop_length)
 
-    if max_ir_length_samples < len(rir_raw):
-        rir_trunc = rir_raw[:max_ir_length_samples]
-    else:
-        rir_trunc = np.zeros(max_ir_length_samples)
-        rir_trunc[:len(rir_raw)] = rir_raw
 
-    S = librosa.feature.melspectrogram(
-        y=rir_trunc, sr=fs, n_mels=n_mels, n_fft=n_fft, hop_length=hop_length, power=2.0
-    )
-    S_db = librosa.power_to_db(S, ref=np.max)
-    # Normalize to 0–1 for stability
-    S_norm = (S_db - S_db.min()) / (S_db.max() - S_db.min() + 1e-9)
-    return S_norm.astype(np.float32)
+# Mel spectrograms are read from (or computed in parallel into) the store in store_directory; pass None to compute them
+# without storing
+def precompute_mel_features(stimulus_rir_directory, stimulus_rir_filenames, store_directory=MEL_STORE_DIRECTORY, num_workers=None):
+    rir_filepaths = [stimulus_rir_directory + filename for filename in stimulus_rir_filenames]
 
+    if store_directory is None:
+        compute = functools.partial(MelFeatureStore.computeMelSpectrogram,
+                                    ir_length_samples=MEL_IR_LENGTH_SAMPLES,
+                                    num_mels=NUM_MELS,
+                                    fft_size=MEL_FFT_SIZE,
+                                    hop_length=MEL_HOP_LENGTH)
 
-def precompute_mel_features(stimulus_rir_directory, stimulus_rir_filenames):
-    mel_features = []
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            return list(executor.map(compute, rir_filepaths))
 
-    for stimulus_index, filename in enumerate(stimulus_rir_filenames):
-        mel = compute_mel_spectrogram(stimulus_rir_directory + filename,
-                                      max_ir_length_samples=MEL_IR_LENGTH_SAMPLES,
-                                      n_mels=NUM_MELS,
-                                      n_fft=MEL_FFT_SIZE,
-                                      hop_length=MEL_HOP_LENGTH)
-        mel_features.append(mel)
+    mel_store = MelFeatureStore.MelFeatureStore(store_directory, NUM_MELS, MEL_FFT_SIZE, MEL_HOP_LENGTH, MEL_IR_LENGTH_SAMPLES)
+    return mel_store.getMelSpectrograms(rir_filepaths, num_workers)
 
-    return mel_features
+
+def load_stimulus_rir_folders(path=STIMULUS_RIR_FOLDERS_PATH):
+    with open(path, "r") as file:
+        return [filename.strip(",\n") for filename in file.readlines()]
 
 
 # ---------------------------
@@ -113,27 +116,29 @@ def load_data_or_synth(path: Optional[str]):
         warnings.warn("No CSV provided or path not found.")
         # return make_synthetic_data(total_mean_scores=5544, n_stimuli=238, n_features=5)
 
-df = load_data_or_synth(DATA_CSV)
 
 # Filter for a specific prog_item value
+def filter_prog_item(df, prog_item):
+    if "prog_item" not in df.columns:
+        raise ValueError("Expected a column named 'prog_item' in the dataset!")
 
-if "prog_item" not in df.columns:
-    raise ValueError("Expected a column named 'prog_item' in the dataset!")
+    df = df[df["prog_item"] == prog_item].reset_index(drop=True)
 
-df = df[df["prog_item"] == TARGET_PROG_ITEM].reset_index(drop=True)
+    if len(df) == 0:
+        raise ValueError(f"No rows found for prog_item == {prog_item}")
 
-if len(df) == 0:
-    raise ValueError(f"No rows found for prog_item == {TARGET_PROG_ITEM}")
+    print(f"Filtered for prog_item == {prog_item}")
+    return df
 
-print(f"Filtered for prog_item == {TARGET_PROG_ITEM}")
 
-feature_names = ["colouration", "flutter_echo", "curvature", "hf_damping"]
+def get_feature_names(prog_item):
+    feature_names = ["colouration", "flutter_echo", "curvature", "hf_damping"]
 
-# Omit spatial asymmetry feature from saxophone
-if TARGET_PROG_ITEM == 1:
-    feature_names.append("asymmetry")
+    # Omit spatial asymmetry feature from saxophone
+    if prog_item == 1:
+        feature_names.append("asymmetry")
 
-print(f"Dataset: {len(df)} ratings, {df['stimulus_id'].nunique()} unique stimuli, {len([c for c in df.columns if c in feature_names])} scalar features")
+    return feature_names
 
 # ---------------------------
 # Grouped split by stimulus
@@ -154,65 +159,83 @@ def grouped_split(df, test_size=0.15, val_size=0.15, group_col="stimulus_id", ra
     df_val = df_train.iloc[val_idx].reset_index(drop=True)
     return df_train_final, df_val, df_test
 
-df_train, df_val, df_test = grouped_split(df, test_size=TEST_SIZE, val_size=VAL_SIZE)
-print(f"Split sizes — train: {len(df_train)}, val: {len(df_val)}, test: {len(df_test)}")
-print(f"Stimuli in splits — train: {df_train['stimulus_id'].nunique()}, val: {df_val['stimulus_id'].nunique()}, test: {df_test['stimulus_id'].nunique()}")
-
 
 # ---------------------------
-# Dataset / DataLoader
+# Dataset / batches
 # ---------------------------
+# Pools each stimulus's (mels x frames) mel spectrogram into its mel inputs: averaged over time, or flattened
+# Returns (stimuli x mel inputs)
+def pool_mel_features(mel_features, pool="mean"):
+    if pool == "mean":
+        return np.stack([mel.mean(axis=1) for mel in mel_features])  # average over time → shape (n_mels,)
+    elif pool == "flatten":
+        return np.stack([np.ravel(mel) for mel in mel_features])
+    else:
+        raise ValueError(f"Unknown pool type: {pool}. Use 'mean' or 'flatten'.")
+
+
+# The model inputs (scalar features then the pooled mel features of the stimulus), targets and stimulus IDs of every
+# rating, materialised once as tensors
 class RatingsDataset(Dataset):
     def __init__(self, df: pd.DataFrame, mel_features, feature_cols, pool="mean", group_col="stimulus_id"):
-        self.scalar_features = df[feature_cols].values.astype(np.float32)
-        self.targets = (df["rating"].values.astype(np.float32).reshape(-1, 1)) / 100.0
-        self.groups = df[group_col].values.astype(np.int64)
-        self.stimulus_id = df["stimulus_id"].values.astype(np.int64)
-        self.mel_features = mel_features
-        self.pool = pool
+        scalar_features = df[feature_cols].values.astype(np.float32)
+        stimulus_mel_features = pool_mel_features(mel_features, pool)
+        stimulus_indices = df["stimulus_id"].values.astype(np.int64) - 1 # Stimulus ID 1 is at mel_features[0]
+
+        self.features = torch.from_numpy(np.concatenate([scalar_features, stimulus_mel_features[stimulus_indices]], axis=1))
+        self.targets = torch.from_numpy((df["rating"].values.astype(np.float32).reshape(-1, 1)) / 100.0)
+        self.groups = torch.from_numpy(df[group_col].values.astype(np.int64))
 
     def __len__(self):
         return len(self.targets)
 
     def __getitem__(self, idx):
-        stimulus_index = self.stimulus_id[idx] - 1
-        mel = self.mel_features[stimulus_index] # Stimulus ID 1 is at mel_features[0]
-
-        if self.pool == "mean":
-            mel_feature = mel.mean(axis=1)  # average over time → shape (n_mels,)
-        elif self.pool == "flatten":
-            mel_feature = mel.flatten()
-        else:
-            raise ValueError(f"Unknown pool type: {self.pool}. Use 'mean' or 'flatten'.")
-
         return {
-            "features": torch.from_numpy(np.concat([self.scalar_features[idx], mel_feature])),
-            "target": torch.from_numpy(self.targets[idx]),
-            "stimulus": int(self.groups[idx])
+            "features": self.features[idx],
+            "target": self.targets[idx],
+            "stimulus": self.groups[idx]
         }
 
 
-rir_directory = "../AAESDatasetGenerator/Audio Data/AAES Receiver RIRs/"
+# Batches of a RatingsDataset gathered by index from its tensors, in place of a DataLoader. Draws from the global torch
+# RNG as a DataLoader does, so a seeded run sees the same batches.
+class TensorBatchLoader:
+    def __init__(self, dataset, batch_size, shuffle=False, drop_last=False, device=DEVICE):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.features = dataset.features.to(device)
+        self.targets = dataset.targets.to(device)
+        self.groups = dataset.groups.to(device)
 
-with open("../AAESUnpleasantnessModel-Evaluation/Data/rir_folders_ordered_by_stimulus_id.txt", "r") as file:
-    stimulus_rir_folders = [filename.strip(",\n") for filename in file.readlines()]
+    def __len__(self):
+        if self.drop_last:
+            return len(self.dataset) // self.batch_size
+        return (len(self.dataset) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        num_items = len(self.dataset)
+        torch.empty((), dtype=torch.int64).random_()
 
-mel_features = precompute_mel_features(rir_directory, stimulus_rir_folders)
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(int(torch.empty((), dtype=torch.int64).random_().item()))
+            order = torch.randperm(num_items, generator=generator).to(self.features.device)
 
-feature_cols = [c for c in df.columns if c in feature_names]
-train_ds = RatingsDataset(df_train, mel_features, feature_cols, pool=MEL_POOLING)
-val_ds = RatingsDataset(df_val, mel_features, feature_cols, pool=MEL_POOLING)
-test_ds = RatingsDataset(df_test, mel_features, feature_cols, pool=MEL_POOLING)
+        for batch_index in range(len(self)):
+            batch_start = batch_index * self.batch_size
+            batch_indices = slice(batch_start, batch_start + self.batch_size)
 
-train_loader = DataLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True, drop_last=False)
-val_loader = DataLoader(val_ds, batch_size=BATCH_SIZE, shuffle=False)
-test_loader = DataLoader(test_ds, batch_size=BATCH_SIZE, shuffle=False)
+            if self.shuffle:
+                batch_indices = order[batch_indices]
 
-n_mel_frames = mel_features[0].shape[1]
-n_stimuli = int(df["stimulus_id"].nunique())
-n_features = len(feature_cols) + (NUM_MELS if MEL_POOLING == "mean" else NUM_MELS * n_mel_frames)
+            yield {
+                "features": self.features[batch_indices],
+                "target": self.targets[batch_indices],
+                "stimulus": self.groups[batch_indices]
+            }
 
-print(f"Num scalar features + mel features = {n_features}")
 
 # ---------------------------
 # Model
@@ -277,26 +300,21 @@ class MLPRegressor(nn.Module):
             x = torch.cat([x, emb], dim=1)
         return self.net(x)
 
-model = MLPRegressor(
-    n_features=n_features,
-    hidden_sizes=HIDDEN_SIZES,
-    dropout_rates=DROPOUTS,
-    use_embedding=EMBED_STIMULUS,
-    n_stimuli=n_stimuli if EMBED_STIMULUS else None,
-    embed_dim=EMBEDDING_DIM
-).to(DEVICE)
 
-print(model)
+def build_model(n_features, n_stimuli):
+    return MLPRegressor(
+        n_features=n_features,
+        hidden_sizes=HIDDEN_SIZES,
+        dropout_rates=DROPOUTS,
+        use_embedding=EMBED_STIMULUS,
+        n_stimuli=n_stimuli if EMBED_STIMULUS else None,
+        embed_dim=EMBEDDING_DIM
+    ).to(DEVICE)
 
 # ---------------------------
 # Training utilities
 # ---------------------------
-optimizer = torch.optim.Adam(model.parameters(), lr=LR, weight_decay=WEIGHT_DECAY)
-criterion = nn.MSELoss()
-scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=6)
-
-
-def eval_model(loader):
+def eval_model(model, loader):
     model.eval()
     preds = []
     trues = []
@@ -316,140 +334,239 @@ def eval_model(loader):
     return {"mse": mse, "mae": mae, "r2": r2, "preds": preds, "trues": trues}
 
 
-#%% -------------------------
+# ---------------------------
 # Training loop with early stopping
 # ---------------------------
-best_val_mse = float("inf")
-patience_counter = 0
-
-training_loss = []
-validation_loss = []
-
-for epoch in range(1, MAX_EPOCHS + 1):
-    model.train()
-    running_loss = 0.0
-    for batch in train_loader:
-        feats = batch["features"].to(DEVICE)
-        targs = batch["target"].to(DEVICE)
-        stim = batch["stimulus"].to(DEVICE)
-
-        optimizer.zero_grad()
-        outputs = model(feats, stim if EMBED_STIMULUS else None)
-        loss = criterion(outputs, targs)
-        loss.backward()
-        optimizer.step()
-        running_loss += loss.item() * feats.size(0)
-
-    train_loss = running_loss / len(train_ds)
-    val_metrics = eval_model(val_loader)
-    val_mse = val_metrics["mse"]
-
-    training_loss.append(train_loss)
-    validation_loss.append(val_mse)
-
-    scheduler.step(val_mse)
-
-    print(f"Epoch {epoch:03d} | train_loss: {train_loss:.4f} | val_mse: {val_mse:.4f} | val_mae: {val_metrics['mae']:.4f} | val_r2: {val_metrics['r2']:.4f}")
-
-    # early stopping check
-    if val_mse < best_val_mse - 1e-6:
-        best_val_mse = val_mse
-        patience_counter = 0
-        torch.save({
-            "model_state": model.state_dict(),
-            "optimizer_state": optimizer.state_dict(),
-            "epoch": epoch,
-            "val_mse": val_mse
-        }, MODEL_SAVE_PATH)
-        print(f"  --> New best model saved (val_mse={val_mse:.4f})")
-    else:
-        patience_counter += 1
-        if patience_counter >= PATIENCE:
-            print(f"Early stopping: no improvement for {PATIENCE} epochs (best val_mse={best_val_mse:.4f})")
-            break
+# Saves the model with the best validation MSE to MODEL_SAVE_PATH, with the scalar feature columns of its inputs
+# Returns training_loss, validation_loss (per epoch)
+def train_model(model, train_loader, val_loader, feature_cols):
+    optimizer = torch.optim.Adam(model.parameters(), lr=LR, weight_decay=WEIGHT_DECAY)
+    criterion = nn.MSELoss()
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=6)
+
+    best_val_mse = float("inf")
+    patience_counter = 0
+
+    training_loss = []
+    validation_loss = []
+
+    for epoch in range(1, MAX_EPOCHS + 1):
+        model.train()
+        running_loss = 0.0
+        for batch in train_loader:
+            feats = batch["features"].to(DEVICE)
+            targs = batch["target"].to(DEVICE)
+            stim = batch["stimulus"].to(DEVICE)
+
+            optimizer.zero_grad()
+            outputs = model(feats, stim if EMBED_STIMULUS else None)
+            loss = criterion(outputs, targs)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * feats.size(0)
+
+        train_loss = running_loss / len(train_loader.dataset)
+        val_metrics = eval_model(model, val_loader)
+        val_mse = val_metrics["mse"]
+
+        training_loss.append(train_loss)
+        validation_loss.append(val_mse)
+
+        scheduler.step(val_mse)
+
+        print(f"Epoch {epoch:03d} | train_loss: {train_loss:.4f} | val_mse: {val_mse:.4f} | val_mae: {val_metrics['mae']:.4f} | val_r2: {val_metrics['r2']:.4f}")
+
+        # early stopping check
+        if val_mse < best_val_mse - 1e-6:
+            best_val_mse = val_mse
+            patience_counter = 0
+            torch.save({
+                "model_state": model.state_dict(),
+                "optimizer_state": optimizer.state_dict(),
+                "epoch": epoch,
+                "val_mse": val_mse,
+                "feature_cols": list(feature_cols)
+            }, MODEL_SAVE_PATH)
+            print(f"  --> New best model saved (val_mse={val_mse:.4f})")
+        else:
+            patience_counter += 1
+            if patience_counter >= PATIENCE:
+                print(f"Early stopping: no improvement for {PATIENCE} epochs (best val_mse={best_val_mse:.4f})")
+                break
+
+    return training_loss, validation_loss
+
+
+def plot_losses(training_loss, validation_loss):
+    import matplotlib.pyplot as plt
+
+    plt.plot(range(len(training_loss)), training_loss, "-", label="Training Loss")
+    plt.plot(range(len(training_loss)), validation_loss, "--", label="Validation Loss")
+    plt.legend()
+    plt.show()
 
-plt.plot(range(len(training_loss)), training_loss, "-", label="Training Loss")
-plt.plot(range(len(training_loss)), validation_loss, "--", label="Validation Loss")
-plt.legend()
-plt.show()
 
 # ---------------------------
 # Load best model & evaluate on test
 # ---------------------------
-ckpt = torch.load(MODEL_SAVE_PATH, map_location=DEVICE)
-model.load_state_dict(ckpt["model_state"])
-test_metrics = eval_model(test_loader)
-print("\nTest set performance (using best saved model):")
-print(f"  RMSE: {test_metrics['mse']:.4f}")
-print(f"  MAE : {test_metrics['mae']:.4f}")
-print(f"  R2  : {test_metrics['r2']:.4f}")
-
-# Optional: save predictions to CSV
-out_df = pd.DataFrame({
-    "pred": test_metrics["preds"],
-    "true": test_metrics["trues"]
-})
-out_df.to_csv("Src/DeepLearning/test_preds.csv", index=False)
-print("Wrote test_preds.csv with predictions and true ratings.")
-
-#%% -------------------------
+def load_best_model(model):
+    ckpt = torch.load(MODEL_SAVE_PATH, map_location=DEVICE)
+    model.load_state_dict(ckpt["model_state"])
+
+
+# Exports the best saved model to MLP_ARCHIVE_PATH for NumpyMLP (e.g. for InferenceService)
+def export_best_model():
+    NumpyMLP.exportCheckpoint(MODEL_SAVE_PATH, MLP_ARCHIVE_PATH, None, {
+        "num_mels": NUM_MELS,
+        "mel_pooling": MEL_POOLING,
+        "mel_fft_size": MEL_FFT_SIZE,
+        "mel_ir_length_samples": MEL_IR_LENGTH_SAMPLES,
+        "mel_hop_length": MEL_HOP_LENGTH,
+    })
+    print(f"Exported best model to {MLP_ARCHIVE_PATH}")
+
+
+def evaluate_test_set(model, test_loader):
+    test_metrics = eval_model(model, test_loader)
+    print("\nTest set performance (using best saved model):")
+    print(f"  RMSE: {test_metrics['mse']:.4f}")
+    print(f"  MAE : {test_metrics['mae']:.4f}")
+    print(f"  R2  : {test_metrics['r2']:.4f}")
+
+    # Optional: save predictions to CSV
+    out_df = pd.DataFrame({
+        "pred": test_metrics["preds"],
+        "true": test_metrics["trues"]
+    })
+    out_df.to_csv(TEST_PREDICTIONS_PATH, index=False)
+    print("Wrote test_preds.csv with predictions and true ratings.")
+
+    return test_metrics
+
+
+# ---------------------------
 # Stimulus-level evaluation and plot
 # ---------------------------
-from sklearn.linear_model import LinearRegression
-import seaborn as sns
-
-print("\nEvaluating at stimulus level (mean per stimulus)...")
-
-# 1. Get predictions for all test samples
-model.eval()
-all_preds, all_trues, all_stimuli = [], [], []
-with torch.no_grad():
-    for batch in test_loader:
-        feats = batch["features"].to(DEVICE)
-        targs = batch["target"].cpu().numpy().ravel()
-        stim = batch["stimulus"].cpu().numpy().ravel()
-        preds = model(feats, batch["stimulus"].to(DEVICE) if EMBED_STIMULUS else None).cpu().numpy().ravel()
-
-        all_preds.extend(preds)
-        all_trues.extend(targs)
-        all_stimuli.extend(stim)
-
-df_pred = pd.DataFrame({
-    "stimulus_id": all_stimuli,
-    "true_rating": all_trues,
-    "pred_rating": all_preds
-})
-
-# 2. Compute mean predicted and true rating per stimulus
-df_mean = df_pred.groupby("stimulus_id", as_index=False).agg(
-    mean_true=("true_rating", "mean"),
-    mean_pred=("pred_rating", "mean")
-)
-
-# 3. Fit linear regression (predicted vs true)
-X = df_mean[["mean_true"]].values
-y = df_mean["mean_pred"].values
-reg = LinearRegression().fit(X, y)
-slope, intercept = reg.coef_[0], reg.intercept_
-r2 = reg.score(X, y)
-
-print(f"Stimulus-level regression: pred = {slope:.3f} * true + {intercept:.3f}")
-print(f"R² = {r2:.4f}")
-
-# 4. Plot
-plt.figure(figsize=(7, 6))
-sns.scatterplot(data=df_mean, x="mean_true", y="mean_pred", s=60, alpha=0.7)
-x_line = np.linspace(df_mean["mean_true"].min(), df_mean["mean_true"].max(), 100)
-y_line = reg.predict(x_line.reshape(-1, 1))
-plt.plot(x_line, y_line, color="red", lw=2, label=f"Linear fit (R²={r2:.2f})")
-
-# Add a diagonal y=x line for perfect agreement
-plt.plot(x_line, x_line, color="gray", lw=1.5, ls="--", label="Ideal (y=x)")
-
-plt.title("Stimulus-level Mean Prediction vs. True Rating")
-plt.xlabel("Mean True Rating")
-plt.ylabel("Mean Predicted Rating")
-plt.legend()
-plt.grid(True, linestyle="--", alpha=0.5)
-plt.tight_layout()
-plt.show()
+def evaluate_stimulus_level(model, test_loader, should_show_plots=True):
+    from sklearn.linear_model import LinearRegression
+
+    print("\nEvaluating at stimulus level (mean per stimulus)...")
+
+    # 1. Get predictions for all test samples
+    model.eval()
+    all_preds, all_trues, all_stimuli = [], [], []
+    with torch.no_grad():
+        for batch in test_loader:
+            feats = batch["features"].to(DEVICE)
+            targs = batch["target"].cpu().numpy().ravel()
+            stim = batch["stimulus"].cpu().numpy().ravel()
+            preds = model(feats, batch["stimulus"].to(DEVICE) if EMBED_STIMULUS else None).cpu().numpy().ravel()
+
+            all_preds.extend(preds)
+            all_trues.extend(targs)
+            all_stimuli.extend(stim)
+
+    df_pred = pd.DataFrame({
+        "stimulus_id": all_stimuli,
+        "true_rating": all_trues,
+        "pred_rating": all_preds
+    })
+
+    # 2. Compute mean predicted and true rating per stimulus
+    df_mean = df_pred.groupby("stimulus_id", as_index=False).agg(
+        mean_true=("true_rating", "mean"),
+        mean_pred=("pred_rating", "mean")
+    )
+
+    # 3. Fit linear regression (predicted vs true)
+    X = df_mean[["mean_true"]].values
+    y = df_mean["mean_pred"].values
+    reg = LinearRegression().fit(X, y)
+    slope, intercept = reg.coef_[0], reg.intercept_
+    r2 = reg.score(X, y)
+
+    print(f"Stimulus-level regression: pred = {slope:.3f} * true + {intercept:.3f}")
+    print(f"R² = {r2:.4f}")
+
+    if should_show_plots:
+        plot_stimulus_level(df_mean, reg, r2)
+
+    return df_mean
+
+
+def plot_stimulus_level(df_mean, reg, r2):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # 4. Plot
+    plt.figure(figsize=(7, 6))
+    sns.scatterplot(data=df_mean, x="mean_true", y="mean_pred", s=60, alpha=0.7)
+    x_line = np.linspace(df_mean["mean_true"].min(), df_mean["mean_true"].max(), 100)
+    y_line = reg.predict(x_line.reshape(-1, 1))
+    plt.plot(x_line, y_line, color="red", lw=2, label=f"Linear fit (R²={r2:.2f})")
+
+    # Add a diagonal y=x line for perfect agreement
+    plt.plot(x_line, x_line, color="gray", lw=1.5, ls="--", label="Ideal (y=x)")
+
+    plt.title("Stimulus-level Mean Prediction vs. True Rating")
+    plt.xlabel("Mean True Rating")
+    plt.ylabel("Mean Predicted Rating")
+    plt.legend()
+    plt.grid(True, linestyle="--", alpha=0.5)
+    plt.tight_layout()
+    plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the MLP on the listening test ratings and evaluate it on held-out stimuli.")
+    parser.add_argument("--no-plots", action="store_true", help="Run headless: skip the loss and stimulus-level plots")
+    parser.add_argument("--export", action="store_true", help=f"Export the best model to {MLP_ARCHIVE_PATH} for NumpyMLP")
+    args = parser.parse_args()
+
+    set_seed(RANDOM_SEED)
+
+    df = filter_prog_item(load_data_or_synth(DATA_CSV), TARGET_PROG_ITEM)
+    feature_names = get_feature_names(TARGET_PROG_ITEM)
+
+    print(f"Dataset: {len(df)} ratings, {df['stimulus_id'].nunique()} unique stimuli, {len([c for c in df.columns if c in feature_names])} scalar features")
+
+    df_train, df_val, df_test = grouped_split(df, test_size=TEST_SIZE, val_size=VAL_SIZE)
+    print(f"Split sizes — train: {len(df_train)}, val: {len(df_val)}, test: {len(df_test)}")
+    print(f"Stimuli in splits — train: {df_train['stimulus_id'].nunique()}, val: {df_val['stimulus_id'].nunique()}, test: {df_test['stimulus_id'].nunique()}")
+
+    mel_features = precompute_mel_features(RIR_DIRECTORY, load_stimulus_rir_folders())
+
+    feature_cols = [c for c in df.columns if c in feature_names]
+    train_ds = RatingsDataset(df_train, mel_features, feature_cols, pool=MEL_POOLING)
+    val_ds = RatingsDataset(df_val, mel_features, feature_cols, pool=MEL_POOLING)
+    test_ds = RatingsDataset(df_test, mel_features, feature_cols, pool=MEL_POOLING)
+
+    train_loader = TensorBatchLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True, drop_last=False)
+    val_loader = TensorBatchLoader(val_ds, batch_size=BATCH_SIZE, shuffle=False)
+    test_loader = TensorBatchLoader(test_ds, batch_size=BATCH_SIZE, shuffle=False)
+
+    n_mel_frames = mel_features[0].shape[1]
+    n_stimuli = int(df["stimulus_id"].nunique())
+    n_features = len(feature_cols) + (NUM_MELS if MEL_POOLING == "mean" else NUM_MELS * n_mel_frames)
+
+    print(f"Num scalar features + mel features = {n_features}")
+
+    model = build_model(n_features, n_stimuli)
+    print(model)
+
+    training_loss, validation_loss = train_model(model, train_loader, val_loader, feature_cols)
+
+    if not args.no_plots:
+        plot_losses(training_loss, validation_loss)
+
+    load_best_model(model)
+
+    if args.export:
+        export_best_model()
+
+    evaluate_test_set(model, test_loader)
+    evaluate_stimulus_level(model, test_loader, should_show_plots=not args.no_plots)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import argparse
+import functools
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import RIRReader
+
+# librosa.load's default, which the MLP was trained with
+MEL_SAMPLE_RATE = 22050
+
+# Source audio read beyond the needed duration, so resampling matches resampling the whole file
+RESAMPLING_MARGIN_S = 0.05
+
+
+# Reads the start of a WAV file as librosa.load(wav_path) would, decoding and resampling only the first num_samples
+# samples (at sample_rate) plus the resampling margin
+# channel: None to average all channels to mono (as librosa.load does), or a single channel index
+def loadMelInput(wav_path, num_samples, sample_rate=MEL_SAMPLE_RATE, channel=None):
+    import librosa
+
+    rir_reader = RIRReader.RIRReader(wav_path)
+    num_source_samples = int(np.ceil((num_samples / sample_rate + RESAMPLING_MARGIN_S) * rir_reader.sample_rate))
+
+    if channel is None:
+        # librosa averages the transposed (channels x samples) view of what it reads, so the mean is summed in the same order
+        signal = librosa.to_mono(rir_reader.read(None, 0, num_source_samples, should_normalise=True).astype(np.float32).T)
+    else:
+        signal = rir_reader.read(channel, 0, num_source_samples, should_normalise=True).astype(np.float32)
+
+    if rir_reader.sample_rate != sample_rate:
+        signal = librosa.resample(signal, orig_sr=rir_reader.sample_rate, target_sr=sample_rate)
+
+    return signal
+
+
+# Normalised (0-1) mel spectrogram in dB of the first ir_length_samples samples (at sample_rate) of a WAV file, zero
+# padded if shorter. Returns (mels x frames) float32.
+def computeMelSpectrogram(wav_path, ir_length_samples, num_mels, fft_size, hop_length, sample_rate=MEL_SAMPLE_RATE, channel=None):
+    import librosa
+
+    rir_raw = loadMelInput(wav_path, ir_length_samples, sample_rate, channel)
+
+    if ir_length_samples < len(rir_raw):
+        rir_trunc = rir_raw[:ir_length_samples]
+    else:
+        rir_trunc = np.zeros(ir_length_samples)
+        rir_trunc[:len(rir_raw)] = rir_raw
+
+    S = librosa.feature.melspectrogram(y=rir_trunc, sr=sample_rate, n_mels=num_mels, n_fft=fft_size, hop_length=hop_length, power=2.0)
+    S_db = librosa.power_to_db(S, ref=np.max)
+    # Normalize to 0–1 for stability
+    S_norm = (S_db - S_db.min()) / (S_db.max() - S_db.min() + 1e-9)
+    return S_norm.astype(np.float32)
+
+
+# Persistent store of mel spectrograms for one set of mel parameters: a memory-mapped (stimuli x mels x frames) .npy
+# array and a JSON index of each stimulus file's row. Missing or changed stimuli are computed and added.
+class MelFeatureStore:
+    def __init__(self, store_directory, num_mels, fft_size, hop_length, ir_length_samples, sample_rate=MEL_SAMPLE_RATE, channel=None):
+        os.makedirs(store_directory, exist_ok=True)
+        self.parameters = {"num_mels": num_mels,
+                           "fft_size": fft_size,
+                           "hop_length": hop_length,
+                           "ir_length_samples": ir_length_samples,
+                           "sample_rate": sample_rate,
+                           "channel": channel}
+
+        parameters_hash = hashlib.sha256(json.dumps(self.parameters, sort_keys=True).encode()).hexdigest()[:16]
+        self.array_path = os.path.join(store_directory, f"mels_{parameters_hash}.npy")
+        self.index_path = os.path.join(store_directory, f"mels_{parameters_hash}.json")
+
+    def readIndex(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.array_path):
+            return {}
+
+        with open(self.index_path, "r") as file:
+            return json.load(file)["stimuli"]
+
+    # Each file is written to a temporary file that replaces the old one, so readers never see a partial store
+    def write(self, mel_spectrograms, index):
+        temporary_array_path = self.array_path + ".tmp.npy"
+        np.save(temporary_array_path, mel_spectrograms)
+        os.replace(temporary_array_path, self.array_path)
+
+        temporary_index_path = self.index_path + ".tmp"
+        with open(temporary_index_path, "w") as file:
+            json.dump({"parameters": self.parameters, "stimuli": index}, file)
+        os.replace(temporary_index_path, self.index_path)
+
+    # Returns a list of (mels x frames) mel spectrograms in rir_filepaths order: read-only views of the memory-mapped store
+    def getMelSpectrograms(self, rir_filepaths, num_workers=None):
+        index = self.readIndex()
+        file_stats = {filepath: getFileStat(filepath) for filepath in rir_filepaths}
+        missing_filepaths = [filepath for filepath in dict.fromkeys(rir_filepaths)
+                             if filepath not in index or index[filepath]["stat"] != file_stats[filepath]]
+
+        if len(missing_filepaths) > 0:
+            compute = functools.partial(computeMelSpectrogram,
+                                        ir_length_samples=self.parameters["ir_length_samples"],
+                                        num_mels=self.parameters["num_mels"],
+                                        fft_size=self.parameters["fft_size"],
+                                        hop_length=self.parameters["hop_length"],
+                                        sample_rate=self.parameters["sample_rate"],
+                                        channel=self.parameters["channel"])
+
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                new_mel_spectrograms = list(executor.map(compute, missing_filepaths))
+
+            # Changed stimuli are overwritten in place, new ones appended
+            mel_spectrograms = list(np.load(self.array_path)) if len(index) > 0 else []
+
+            for filepath, mel_spectrogram in zip(missing_filepaths, new_mel_spectrograms):
+                if filepath in index:
+                    mel_spectrograms[index[filepath]["row"]] = mel_spectrogram
+                else:
+                    index[filepath] = {"row": len(mel_spectrograms)}
+                    mel_spectrograms.append(mel_spectrogram)
+                index[filepath]["stat"] = file_stats[filepath]
+
+            self.write(np.stack(mel_spectrograms), index)
+
+        stored_mel_spectrograms = np.load(self.array_path, mmap_mode="r")
+        return [stored_mel_spectrograms[index[filepath]["row"]] for filepath in rir_filepaths]
+
+
+# Size and modification time, to notice stimulus files that have been replaced
+def getFileStat(filepath):
+    file_stat = os.stat(filepath)
+    return [file_stat.st_size, file_stat.st_mtime_ns]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the mel spectrograms of a list of stimuli into a persistent store, in parallel.")
+    parser.add_argument("rir_list", help="File listing one stimulus RIR filename per line, in stimulus ID order")
+    parser.add_argument("store", help="Store directory")
+    parser.add_argument("--rir-dir", default="", help="Directory that the listed filenames are relative to")
+    parser.add_argument("--num-mels", type=int, default=32)
+    parser.add_argument("--fft-size", type=int, default=2**10)
+    parser.add_argument("--ir-length-samples", type=int, default=32000)
+    parser.add_argument("--hop-length", type=int, default=32000 // 12)
+    parser.add_argument("--channel", type=int, default=None, help="Channel to analyse (default: average of all channels)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    with open(args.rir_list, "r") as file:
+        rir_filepaths = [args.rir_dir + filename.strip(",\n") for filename in file.readlines()]
+
+    store = MelFeatureStore(args.store, args.num_mels, args.fft_size, args.hop_length, args.ir_length_samples, channel=args.channel)
+    mel_spectrograms = store.getMelSpectrograms(rir_filepaths, args.workers)
+
+    print(f"{len(mel_spectrograms)} mel spectrograms of shape {mel_spectrograms[0].shape} in {store.array_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import functools
+import os
+
+import numpy as np
+
+MLP_ARCHIVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DeepLearning", "best_mlp_model.npz")
+
+
+# Writes the Linear layers of a trained MLPRegressor (see MLP.py) and its input layout to a NumPy archive for NumpyMLP
+# model_state: the model's state_dict (tensors or arrays)
+# scalar_feature_names: the scalar feature columns in the order they were concatenated before the mel features
+# mel_parameters: {"num_mels", "mel_pooling", "mel_fft_size", "mel_ir_length_samples", "mel_hop_length"} as in MLP.py
+def exportMLP(model_state, archive_path, scalar_feature_names, mel_parameters):
+    model_state = {key: value.detach().cpu().numpy() if hasattr(value, "detach") else np.asarray(value)
+                   for key, value in model_state.items()}
+
+    # nn.Sequential names its Linear layers net.<index of the layer in the sequence>
+    layer_indices = sorted(int(key.split(".")[1]) for key in model_state if key.startswith("net.") and key.endswith(".weight"))
+    archive = {}
+
+    for layer_number, layer_index in enumerate(layer_indices):
+        archive[f"weights_{layer_number}"] = model_state[f"net.{layer_index}.weight"].astype(np.float32)
+        archive[f"biases_{layer_number}"] = model_state[f"net.{layer_index}.bias"].astype(np.float32)
+
+    if "embed.weight" in model_state:
+        archive["stimulus_embeddings"] = model_state["embed.weight"].astype(np.float32)
+
+    num_inputs = archive["weights_0"].shape[1] - (archive["stimulus_embeddings"].shape[1] if "stimulus_embeddings" in archive else 0)
+    num_mel_inputs = num_inputs - len(scalar_feature_names)
+
+    if num_mel_inputs % mel_parameters["num_mels"] != 0:
+        raise ValueError(f"{num_inputs} model inputs do not fit {len(scalar_feature_names)} scalar features and {mel_parameters['num_mels']} mel bands")
+
+    archive["scalar_feature_names"] = np.array(scalar_feature_names)
+    archive["num_mel_frames"] = num_mel_inputs // mel_parameters["num_mels"]
+
+    for name, value in mel_parameters.items():
+        archive[name] = np.array(value)
+
+    np.savez(archive_path, **archive)
+
+
+# Exports a checkpoint saved by MLP.py ({"model_state": ..., "feature_cols": ...}). Only this step needs torch.
+# scalar_feature_names: None to use the checkpoint's feature_cols; required for checkpoints saved without them
+def exportCheckpoint(checkpoint_path, archive_path, scalar_feature_names, mel_parameters):
+    import torch
+    checkpoint = torch.load(checkpoint_path, map_location="cpu")
+
+    if scalar_feature_names is None:
+        if "feature_cols" not in checkpoint:
+            raise ValueError(f"{checkpoint_path} doesn't record its scalar feature columns (feature_cols); give them in model "
+                             f"input order with --scalar-features")
+        scalar_feature_names = checkpoint["feature_cols"]
+
+    exportMLP(checkpoint["model_state"], archive_path, scalar_feature_names, mel_parameters)
+
+
+# NumPy forward pass of an MLPRegressor exported by exportMLP, in single precision as in torch
+class NumpyMLP:
+    def __init__(self, archive_path=MLP_ARCHIVE_PATH):
+        with np.load(archive_path) as archive:
+            num_layers = len([name for name in archive.files if name.startswith("weights_")])
+
+            # Transposed once so each layer is inputs @ weights + biases
+            self.weights = [np.ascontiguousarray(archive[f"weights_{layer_number}"].T) for layer_number in range(num_layers)]
+            self.biases = [archive[f"biases_{layer_number}"] for layer_number in range(num_layers)]
+            self.stimulus_embeddings = archive["stimulus_embeddings"] if "stimulus_embeddings" in archive.files else None
+
+            self.scalar_feature_names = [str(name) for name in archive["scalar_feature_names"]]
+            self.num_mels = int(archive["num_mels"])
+            self.num_mel_frames = int(archive["num_mel_frames"])
+            self.mel_pooling = str(archive["mel_pooling"])
+            self.mel_fft_size = int(archive["mel_fft_size"])
+            self.mel_ir_length_samples = int(archive["mel_ir_length_samples"])
+            self.mel_hop_length = int(archive["mel_hop_length"])
+
+        self.num_inputs = len(self.scalar_feature_names) + self.num_mels * self.num_mel_frames
+
+    # Builds model inputs as MLP.RatingsDataset does: scalar features followed by the pooled mel spectrogram
+    # scalar_features: (N x scalar features), in scalar_feature_names order
+    # mel_spectrograms: (N x mels x frames), normalised as by MLP.compute_mel_spectrogram
+    # Returns (N x inputs)
+    def getInputs(self, scalar_features, mel_spectrograms):
+        mel_spectrograms = np.asarray(mel_spectrograms, dtype=np.float32)
+
+        if self.mel_pooling == "mean":
+            mel_features = mel_spectrograms.mean(axis=2)
+        else:
+            mel_features = mel_spectrograms.reshape(len(mel_spectrograms), -1)
+
+        return np.concatenate([np.asarray(scalar_features, dtype=np.float32), mel_features], axis=1)
+
+    # inputs: (N x inputs) or (inputs)
+    # stimulus_ids: (N), required if the model was trained with a stimulus embedding
+    # Returns the predicted ratings (N), on the 0-1 scale of the training targets (i.e. rating / 100)
+    def forward(self, inputs, stimulus_ids=None):
+        x = np.atleast_2d(np.asarray(inputs, dtype=np.float32))
+
+        if x.shape[1] != self.num_inputs:
+            raise ValueError(f"Expected {self.num_inputs} inputs per row ({len(self.scalar_feature_names)} scalar features + "
+                             f"{self.num_mels * self.num_mel_frames} mel features), got {x.shape[1]}")
+
+        if self.stimulus_embeddings is not None:
+            if stimulus_ids is None:
+                raise ValueError("stimulus_ids required when using embedding")
+            x = np.concatenate([x, self.stimulus_embeddings[np.asarray(stimulus_ids)]], axis=1)
+
+        for layer_number, (weights, biases) in enumerate(zip(self.weights, self.biases)):
+            x = x @ weights
+            x += biases
+
+            if layer_number < len(self.weights) - 1:
+                np.maximum(x, 0, out=x)
+
+        return x[:, 0]
+
+    # Returns the predicted ratings (N), on the 0-100 scale of the listening test
+    def predict(self, scalar_features, mel_spectrograms, stimulus_ids=None):
+        return 100 * self.forward(self.getInputs(scalar_features, mel_spectrograms), stimulus_ids)
+
+
+@functools.lru_cache(maxsize=None)
+def getNumpyMLP(archive_path=MLP_ARCHIVE_PATH):
+    return NumpyMLP(archive_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the trained MLP to a NumPy archive, or score input vectors with an exported one.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write a torch checkpoint saved by MLP.py to a NumPy archive (needs torch)")
+    export_parser.add_argument("checkpoint", help="Checkpoint saved by MLP.py, e.g. Src/DeepLearning/best_mlp_model.pt")
+    export_parser.add_argument("--output", default=MLP_ARCHIVE_PATH, help="Archive to write")
+    export_parser.add_argument("--scalar-features", nargs="+", default=None,
+                               help="Scalar feature columns in model input order (default: the checkpoint's feature_cols; "
+                                    "required for checkpoints saved without them)")
+    export_parser.add_argument("--num-mels", type=int, default=32)
+    export_parser.add_argument("--mel-pooling", default="mean", choices=["mean", "flatten"])
+    export_parser.add_argument("--mel-fft-size", type=int, default=2**10)
+    export_parser.add_argument("--mel-ir-length-samples", type=int, default=32000)
+    export_parser.add_argument("--mel-hop-length", type=int, default=32000 // 12)
+
+    score_parser = subparsers.add_parser("score", help="Predict ratings for rows of model inputs (scalar features then mel features)")
+    score_parser.add_argument("inputs", help="CSV (or .npy) of input vectors, one per row")
+    score_parser.add_argument("--archive", default=MLP_ARCHIVE_PATH, help="Archive written by export")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        try:
+            exportCheckpoint(args.checkpoint, args.output, args.scalar_features, {
+                "num_mels": args.num_mels,
+                "mel_pooling": args.mel_pooling,
+                "mel_fft_size": args.mel_fft_size,
+                "mel_ir_length_samples": args.mel_ir_length_samples,
+                "mel_hop_length": args.mel_hop_length,
+            })
+        except ValueError as error:
+            parser.error(str(error))
+        print(f"Wrote {args.output}")
+    else:
+        inputs = np.load(args.inputs) if args.inputs.endswith(".npy") else np.loadtxt(args.inputs, delimiter=",", ndmin=2)
+        for prediction in 100 * getNumpyMLP(args.archive).forward(inputs):
+            print(f"{prediction:.4f}")
+
+
+if __name__ == "__main__":
+    main()
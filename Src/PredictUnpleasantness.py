@@ -1,21 +1,74 @@
+import argparse
+import csv
+import json
+import sys
+import time
 from scipy.io import wavfile
-import Colouration
-import FlutterEcho
 import numpy as np
 from scipy import stats
-import SDM
-import DSE
-import HFDamping
-from scipy import signal
-import matplotlib.pyplot as plt
 from os import listdir
 from os.path import isfile
+import functools
+import ExtractFeatures
+import RIRAnalysis
+import RIRReader
+
+# Programme items (1 = clap, 2 = saxophone) and k-fold coefficient sets (-1 = trained on all data) predicted for
+PROG_ITEMS = [1, 2]
+K_FOLDS = [1, 2, 3, -1]
+
+# Terms of the linear model: an intercept, then a gradient per feature (in ExtractFeatures.FEATURE_NAMES order)
+LINEAR_MODEL_TERMS = ["intercept", "colouration", "flutter_echo", "asymmetry", "curvature", "hf_damping"]
+
+# Linear model coefficients (PROG_ITEMS x K_FOLDS x LINEAR_MODEL_TERMS). The first three sets of each programme item
+# are from the respective k-fold, the last is trained on all data.
+LINEAR_MODEL_COEFFICIENTS = np.array([
+    # Programme item 1 (clap)
+    [[2.409,   23.598,  20.797,  11.199,  19.369,  22.526],
+     [6.424,   38.458,  6.408,   14.196,  29.723,  14.415],
+     [-5.306,  29.690,  15.051,  30.767,  21.188,  20.047],
+     [1.111,   30.553,  12.825,  22.349,  20.129,  19.702]],
+    # Programme item 2 (saxophone)
+    [[28.750,  63.305,  -5.072,  -24.737, 12.867,  -15.195],
+     [24.480,  68.913,  -13.451, -16.476, 38.217,  -23.288],
+     [17.878,  74.790,  -14.902, -3.939,  17.879,  -14.080],
+     [24.587,  72.588,  -12.654, -13.065, 18.050,  -18.369]],
+])
+
+
+# Writes coefficients (PROG_ITEMS x K_FOLDS x LINEAR_MODEL_TERMS), e.g. refitted by FitLinearModel, as a CSV table with
+# one row per coefficient set
+def writeCoefficientTable(coefficient_table_filepath, coefficients):
+    with open(coefficient_table_filepath, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["prog_item", "k_fold"] + LINEAR_MODEL_TERMS)
+
+        for prog_item_index, prog_item in enumerate(PROG_ITEMS):
+            for k_fold_index, k_fold in enumerate(K_FOLDS):
+                writer.writerow([prog_item, k_fold] + [repr(float(coefficient)) for coefficient in coefficients[prog_item_index, k_fold_index]])
+
+
+# Returns coefficients (PROG_ITEMS x K_FOLDS x LINEAR_MODEL_TERMS) from a table written by writeCoefficientTable
+def readCoefficientTable(coefficient_table_filepath):
+    with open(coefficient_table_filepath, "r", newline="") as file:
+        rows = {(int(row["prog_item"]), int(row["k_fold"])): row for row in csv.DictReader(file)}
+
+    missing_sets = [(prog_item, k_fold) for prog_item in PROG_ITEMS for k_fold in K_FOLDS if (prog_item, k_fold) not in rows]
+    if len(missing_sets) > 0:
+        raise ValueError(f"Coefficient table {coefficient_table_filepath} is missing (prog_item, k_fold) sets {missing_sets}")
+
+    return np.array([[[float(rows[(prog_item, k_fold)][term]) for term in LINEAR_MODEL_TERMS] for k_fold in K_FOLDS] for prog_item in PROG_ITEMS])
+
+
+# evaluateFeature() feature names and their column names in the feature table
+EVALUATED_FEATURE_NAMES = {"Colouration": "colouration", "Asymmetry": "asymmetry", "Flutter": "flutter_echo", "HFDamping": "hf_damping"}
 
 
 # Reads the RIR files in folder "Labelled {feature}", the names of which are ranked from 0-10
 # (e.g. "0.wav", "0_1.wav", "1.wav"), and compares these to the feature outputs for the RIRs.
-# feature = "Colouration" | "Spatial Asymmetry" | "Flutter Echo"
-def evaluateFeature(feature="Colouration", show_stimulus_ids=False):
+# feature = "Colouration" | "Asymmetry" | "Flutter" | "HFDamping"
+# feature_cache: optional FeatureCache.FeatureCache, from which previously computed feature outputs are reused
+def evaluateFeature(feature="Colouration", show_stimulus_ids=False, feature_cache=None):
     feature_rirs_dir = f"/Users/willcassidy/Development/GitHub/AAESUnpleasantnessModel/Audio/{feature}/"
     stimulus_filenames = [filename for filename in listdir(feature_rirs_dir) if isfile(feature_rirs_dir + filename) and filename.endswith("wav")]
 
@@ -46,22 +99,21 @@ def evaluateFeature(feature="Colouration", show_stimulus_ids=False):
             stimulus_index = 0
 
     feature_outputs = np.zeros_like(stimulus_filenames)
+    feature_name = EVALUATED_FEATURE_NAMES[feature]
 
     for filename in stimulus_filenames:
         filepath = feature_rirs_dir + filename
         file_index = int(filename.strip(".wav")) - 1
-        sample_rate, spatial_rir = wavfile.read(filepath)
-
-        if feature == "Colouration":
-            feature_outputs[file_index] = Colouration.getColouration(spatial_rir[:, 0], sample_rate, False)
-        elif feature == "Asymmetry":
-            feature_outputs[file_index] = SDM.getSpatialAsymmetryScore(spatial_rir, sample_rate, False)
-        elif feature == "Flutter":
-            feature_outputs[file_index] = FlutterEcho.getFlutterEchoScore(spatial_rir, sample_rate, False)
-        elif feature == "HFDamping":
-            feature_outputs[file_index] = HFDamping.getHFDampingScore(spatial_rir[:, 0], sample_rate, False)
+        rir_reader = RIRReader.RIRReader(filepath)
+        sample_rate = rir_reader.sample_rate
+        spatial_rir = rir_reader.readFirstChannels(ExtractFeatures.FEATURE_NUM_CHANNELS[feature_name])
+        compute = functools.partial(ExtractFeatures.computeFeature, spatial_rir, sample_rate, feature_name)
+
+        if feature_cache is None:
+            feature_outputs[file_index] = compute()
         else:
-            assert False
+            audio_hash = ExtractFeatures.getAudioHash(spatial_rir, sample_rate, ExtractFeatures.FEATURE_NUM_CHANNELS[feature_name])
+            feature_outputs[file_index] = feature_cache.getOrCompute(audio_hash, feature_name, ExtractFeatures.FEATURE_PARAMETERS[feature_name], compute)
 
     feature_outputs = [float(output) for output in feature_outputs]
 
@@ -74,6 +126,7 @@ def evaluateFeature(feature="Colouration", show_stimulus_ids=False):
     spearman_correlation, spearman_sig = stats.spearmanr(mean_results, feature_outputs)
     linear_regression = np.poly1d([gradient, y_intercept])
 
+    import matplotlib.pyplot as plt
     plt.rcParams.update({
         "text.usetex": True,
         "font.family": "CMU Serif",
@@ -96,52 +149,130 @@ def evaluateFeature(feature="Colouration", show_stimulus_ids=False):
     plt.show()
 
 
-def predictUnpleasantnessFromRIR(rir_filepath):
-    sample_rate, spatial_rir = wavfile.read(rir_filepath)
-
-    # Compute features
-    colouration_score = Colouration.getColouration(spatial_rir[:, 0], sample_rate, False)
-    asymmetry_score = SDM.getSpatialAsymmetryScore(spatial_rir, sample_rate, False)
-    flutter_echo_score = FlutterEcho.getFlutterEchoScore(spatial_rir[:, 0], sample_rate, False)
-
-    return predictUnpleasantnessFromFeatures(colouration_score, asymmetry_score, flutter_echo_score)
-
-
-def predictUnpleasantnessFromFeatures(colouration_score, asymmetry_score, flutter_echo_score, curvature_score, spectral_score, prog_item, k_fold=-1):
-    if k_fold == -1:
-        k_fold_index = 3
-    else:
-        k_fold_index = k_fold - 1
-
-    # First three values are from the respective k-fold, the last is trained on all data
-    if prog_item == 1:
-        y_intercept =          [2.409,  6.424,  -5.306, 1.111]
-        colouration_gradient = [23.598, 38.458, 29.690, 30.553]
-        flutter_gradient =     [20.797, 6.408,  15.051, 12.825]
-        asymmetry_gradient =   [11.199, 14.196, 30.767, 22.349]
-        curvature_gradient =   [19.369, 29.723, 21.188, 20.129]
-        hf_damping_gradient =  [22.526, 14.415, 20.047, 19.702]
-    elif prog_item == 2:
-        y_intercept =          [28.750,  24.480,  17.878,  24.587]
-        colouration_gradient = [63.305,  68.913,  74.790,  72.588]
-        flutter_gradient =     [-5.072,  -13.451, -14.902, -12.654]
-        asymmetry_gradient =   [-24.737, -16.476, -3.939,  -13.065]
-        curvature_gradient =   [12.867,  38.217,  17.879,  18.050]
-        hf_damping_gradient =  [-15.195, -23.288, -14.080, -18.369]
-    else:
-        assert False
-
-    linear_model = (y_intercept[k_fold_index]
-                    + colouration_gradient[k_fold_index] * colouration_score
-                    + asymmetry_gradient[k_fold_index] * asymmetry_score
-                    + flutter_gradient[k_fold_index] * flutter_echo_score
-                    + curvature_gradient[k_fold_index] * curvature_score
-                    + hf_damping_gradient[k_fold_index] * spectral_score)
+# Computes all five features through one shared RIRAnalysis and predicts unpleasantness with every coefficient set.
+# Shared intermediates are timed under the first feature that needs them.
+# Returns predictions (PROG_ITEMS x K_FOLDS), features (by ExtractFeatures.FEATURE_NAMES), stage_timings_s
+def predictUnpleasantnessFromRIR(rir_filepath, should_pre_truncate=False, truncation_margin_ms=200.0, coefficients=LINEAR_MODEL_COEFFICIENTS):
+    stage_timings_s = {}
+
+    stage_start_time = time.perf_counter()
+    rir_reader = RIRReader.RIRReader(rir_filepath)
+    sample_rate = rir_reader.sample_rate
+    spatial_rir = rir_reader.readFirstChannels(max(ExtractFeatures.FEATURE_NUM_CHANNELS.values()))
+    analysis = RIRAnalysis.RIRAnalysis(spatial_rir, sample_rate, should_pre_truncate, truncation_margin_ms)
+    stage_timings_s["load"] = time.perf_counter() - stage_start_time
+
+    features = {}
+
+    for feature_name in ExtractFeatures.FEATURE_NAMES:
+        stage_start_time = time.perf_counter()
+        features[feature_name] = ExtractFeatures.computeFeature(analysis, sample_rate, feature_name)
+        stage_timings_s[feature_name] = time.perf_counter() - stage_start_time
+
+    stage_start_time = time.perf_counter()
+    feature_matrix = [[features[feature_name] for feature_name in ExtractFeatures.FEATURE_NAMES]]
+    predictions = predictUnpleasantnessFromFeatureMatrix(feature_matrix, coefficients)[0]
+    stage_timings_s["predict"] = time.perf_counter() - stage_start_time
+
+    return predictions, features, stage_timings_s
+
+
+# Scores every row of an (N x 5) feature matrix (columns in ExtractFeatures.FEATURE_NAMES order) with every coefficient set
+# Returns predictions (N x PROG_ITEMS x K_FOLDS)
+def predictUnpleasantnessFromFeatureMatrix(feature_matrix, coefficients=LINEAR_MODEL_COEFFICIENTS):
+    feature_matrix = np.atleast_2d(np.asarray(feature_matrix, dtype=float))
+    num_prog_items, num_k_folds, num_terms = coefficients.shape
+
+    # Prepend a column of ones for the intercept
+    design_matrix = np.hstack([np.ones([len(feature_matrix), 1]), feature_matrix])
+    predictions = design_matrix @ coefficients.reshape(num_prog_items * num_k_folds, num_terms).T
+
+    return predictions.reshape(len(feature_matrix), num_prog_items, num_k_folds)
+
+
+# Rescores a stored feature table (see ExtractFeatures.writeFeatureTable)
+# Returns filenames, predictions (RIRs x PROG_ITEMS x K_FOLDS)
+def predictUnpleasantnessFromFeatureTable(feature_table_filepath, coefficients=LINEAR_MODEL_COEFFICIENTS):
+    filenames, feature_matrix = ExtractFeatures.readFeatureTable(feature_table_filepath)
+    return filenames, predictUnpleasantnessFromFeatureMatrix(feature_matrix, coefficients)
+
+
+def predictUnpleasantnessFromFeatures(colouration_score, asymmetry_score, flutter_echo_score, curvature_score, spectral_score, prog_item, k_fold=-1,
+                                      coefficients=LINEAR_MODEL_COEFFICIENTS):
+    assert prog_item in PROG_ITEMS
+
+    y_intercept, colouration_gradient, flutter_gradient, asymmetry_gradient, curvature_gradient, hf_damping_gradient = coefficients[PROG_ITEMS.index(prog_item), getKFoldIndex(k_fold)]
+
+    linear_model = (y_intercept
+                    + colouration_gradient * colouration_score
+                    + asymmetry_gradient * asymmetry_score
+                    + flutter_gradient * flutter_echo_score
+                    + curvature_gradient * curvature_score
+                    + hf_damping_gradient * spectral_score)
 
     return linear_model
 
 
+# k_fold: a fold number (1-3), or -1 for the set trained on all data (also selected by 4, its position in K_FOLDS)
+def getKFoldIndex(k_fold):
+    if k_fold in K_FOLDS:
+        return K_FOLDS.index(k_fold)
+    if k_fold == len(K_FOLDS):
+        return K_FOLDS.index(-1)
+    raise ValueError(f"Unknown k_fold {k_fold}; expected one of {K_FOLDS} (or {len(K_FOLDS)} for all data)")
+
+
+def getKFoldName(k_fold):
+    return "all" if k_fold == -1 else f"fold_{k_fold}"
+
+
+# predictions: (PROG_ITEMS x K_FOLDS), e.g. from predictUnpleasantnessFromRIR()
+# Returns {"prog_item_1": {"fold_1": ..., "all": ...}, ...}, e.g. for JSON output
+def getPredictionsDict(predictions):
+    return {f"prog_item_{prog_item}": {getKFoldName(k_fold): float(predictions[prog_item_index, k_fold_index])
+                                       for k_fold_index, k_fold in enumerate(K_FOLDS)}
+            for prog_item_index, prog_item in enumerate(PROG_ITEMS)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict the unpleasantness of a 25-channel RIR for both programme items.")
+    parser.add_argument("rir", help="RIR WAV file")
+    parser.add_argument("--pre-truncate", action="store_true", help="Trim the RIR's noise tail before computing features")
+    parser.add_argument("--truncation-margin-ms", type=float, default=200.0, help="Margin kept after the last useful decay point")
+    parser.add_argument("--json", action="store_true", help="Print the results as a single line of JSON")
+    parser.add_argument("--coefficients", default=None, help="Coefficient table to predict with, e.g. from FitLinearModel (default: the built-in coefficients)")
+    args = parser.parse_args()
+
+    coefficients = LINEAR_MODEL_COEFFICIENTS if args.coefficients is None else readCoefficientTable(args.coefficients)
+    predictions, features, stage_timings_s = predictUnpleasantnessFromRIR(args.rir, args.pre_truncate, args.truncation_margin_ms, coefficients)
+
+    if args.json:
+        print(json.dumps({"rir": args.rir,
+                          "features": features,
+                          "predictions": getPredictionsDict(predictions),
+                          "stage_timings_s": stage_timings_s}))
+        return
+
+    print(f"Features for {args.rir}:")
+    for feature_name, feature in features.items():
+        print(f"    {feature_name:<14}{feature:.4f}")
+
+    print("Predicted unpleasantness:")
+    print("    " + " " * 14 + "".join(f"{getKFoldName(k_fold):>10}" for k_fold in K_FOLDS))
+    for prog_item_index, prog_item in enumerate(PROG_ITEMS):
+        print(f"    {f'prog_item_{prog_item}':<14}" + "".join(f"{prediction:>10.2f}" for prediction in predictions[prog_item_index]))
+
+    print(f"Stage timings (total {sum(stage_timings_s.values()):.3f} s):")
+    for stage, stage_time_s in stage_timings_s.items():
+        print(f"    {stage:<14}{stage_time_s:.3f} s")
+
+
 if __name__ == "__main__":
+    # With an RIR argument, predict its unpleasantness; otherwise run the feature evaluations below
+    if len(sys.argv) > 1:
+        main()
+        sys.exit()
+
     # filename = "Flutter.wav" # high flutter
     # filename = "Room3.wav" # pretty high flutter, front-back though
     # filename = "PassiveRoom.wav" # fairly high flutter, late
@@ -0,0 +1,118 @@
+import numpy as np
+from scipy.signal import sosfilt
+import Energy
+import FilterBank
+import Truncation
+
+
+# Wraps a loaded spatial RIR (samples x channels) and lazily computes the intermediates shared between features
+# (EDCs, ETCs, high-passed signals, octave bands), memoizing each one so it is only computed once per RIR.
+# Cached arrays are returned read-only, so callers must copy before modifying them.
+# should_pre_truncate: trim every channel where the omni decay meets the noise floor (plus truncation_margin_ms)
+# before any analysis; the decision is kept in truncation_report
+class RIRAnalysis:
+    def __init__(self, spatial_rir, sample_rate, should_pre_truncate=False, truncation_margin_ms=200.0):
+        spatial_rir = np.asarray(spatial_rir)
+
+        # Single-channel RIRs are treated as an omni-only spatial RIR
+        if spatial_rir.ndim == 1:
+            spatial_rir = spatial_rir[:, np.newaxis]
+
+        if should_pre_truncate:
+            spatial_rir, self.truncation_report = Truncation.truncateRIR(spatial_rir, sample_rate, truncation_margin_ms)
+        else:
+            self.truncation_report = None
+
+        self.spatial_rir = spatial_rir
+        self.sample_rate = sample_rate
+        self.num_samples, self.num_channels = spatial_rir.shape
+        self._cache = {}
+
+    def _getCached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    # high_pass: None or (cutoff_Hz, filter_order) of a Butterworth high-pass applied before any other processing
+    # octave_band_index: None for broadband, or an index into the bands returned by getOctaveBands()
+    def getSignal(self, channel=0, high_pass=None, octave_band_index=None):
+        if octave_band_index is not None:
+            octave_band_signals, _ = self.getOctaveBands()
+            return octave_band_signals[octave_band_index, :, channel]
+
+        if high_pass is None:
+            return self.spatial_rir[:, channel]
+
+        def computeHighPassed():
+            sos = FilterBank.getHighPassFilter(self.sample_rate, *high_pass)
+            return _readOnly(sosfilt(sos, self.spatial_rir[:, channel]))
+
+        return self._getCached(("high_passed", channel, high_pass), computeHighPassed)
+
+    # The first num_channels channels (samples x channels), optionally high-passed together in one sosfilt call
+    def getChannels(self, num_channels=4, high_pass=None):
+        if high_pass is None:
+            return self.spatial_rir[:, :num_channels]
+
+        def computeHighPassed():
+            sos = FilterBank.getHighPassFilter(self.sample_rate, *high_pass)
+            return _readOnly(sosfilt(sos, self.spatial_rir[:, :num_channels], axis=0))
+
+        return self._getCached(("high_passed_channels", num_channels, high_pass), computeHighPassed)
+
+    # Returns (bands x samples x channels) for the first num_channels channels, and the band centre frequencies
+    def getOctaveBands(self, num_channels=4):
+        def computeOctaveBands():
+            filter_bank = FilterBank.getFilterBank(self.sample_rate)
+            octave_band_signals = filter_bank.filter(self.spatial_rir[:, :num_channels])
+            return _readOnly(octave_band_signals), filter_bank.octave_band_centres
+
+        return self._getCached(("octave_bands", num_channels), computeOctaveBands)
+
+    def getEDC(self, channel=0, high_pass=None, octave_band_index=None):
+        if octave_band_index is not None:
+            octave_band_edcs_dB, time_values_seconds = self.getOctaveBandEDCs(channel)
+            return octave_band_edcs_dB[:, octave_band_index], time_values_seconds
+
+        def computeEDC():
+            edc_dB, time_values_seconds = Energy.getEDC(self.getSignal(channel, high_pass, octave_band_index), self.sample_rate)
+            return _readOnly(edc_dB), time_values_seconds
+
+        return self._getCached(("edc", channel, high_pass, octave_band_index), computeEDC)
+
+    # EDCs of every octave band of one channel, computed in one batch
+    # Returns edc_dB (samples x bands), time_values_seconds
+    def getOctaveBandEDCs(self, channel=0):
+        def computeOctaveBandEDCs():
+            octave_band_signals, _ = self.getOctaveBands()
+            octave_band_edcs_dB, time_values_seconds = Energy.getEDCs(octave_band_signals[:, :, channel].transpose(), self.sample_rate)
+            return _readOnly(octave_band_edcs_dB), time_values_seconds
+
+        return self._getCached(("octave_band_edcs", channel), computeOctaveBandEDCs)
+
+    def getETC(self, channel=0, high_pass=None, window_duration_ms=10.0):
+        def computeETC():
+            etc_dB, time_values = Energy.getEnergyTimeCurve(self.getSignal(channel, high_pass), self.sample_rate, window_duration_ms)
+            return _readOnly(etc_dB), time_values
+
+        return self._getCached(("etc", channel, high_pass, window_duration_ms), computeETC)
+
+    # ETCs of the first num_channels channels (windows x channels), each normalised to its own peak
+    def getETCs(self, num_channels=4, high_pass=None, window_duration_ms=10.0):
+        def computeETCs():
+            etcs_dB, time_values = Energy.getEnergyTimeCurve(self.getChannels(num_channels, high_pass), self.sample_rate, window_duration_ms)
+            return _readOnly(etcs_dB), time_values
+
+        return self._getCached(("etcs", num_channels, high_pass, window_duration_ms), computeETCs)
+
+
+# Lets feature functions accept either a raw RIR array or an existing RIRAnalysis
+def asAnalysis(rir, sample_rate):
+    if isinstance(rir, RIRAnalysis):
+        return rir
+    return RIRAnalysis(rir, sample_rate)
+
+
+def _readOnly(array):
+    array.flags.writeable = False
+    return array
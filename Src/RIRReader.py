@@ -0,0 +1,48 @@
+import numpy as np
+from scipy.io import wavfile
+
+
+# Lazily reads a (spatial) RIR WAV file. The file is memory-mapped, and only the requested channels and sample range
+# are copied out (and converted to float), so e.g. reading the omni channel of a 25-channel file holds 1/25 of it.
+# Float files keep their sample format and integer PCM keeps its raw values (as float64), as with wavfile.read, so
+# features see the same values as before; integer PCM can instead be scaled to [-1, 1), as librosa.load does.
+class RIRReader:
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+        try:
+            self.sample_rate, self._samples = wavfile.read(filepath, mmap=True)
+        except ValueError:
+            # Formats that can't be memory-mapped (e.g. 24-bit PCM) are read in full
+            self.sample_rate, self._samples = wavfile.read(filepath)
+
+        if self._samples.ndim == 1:
+            self._samples = self._samples[:, np.newaxis]
+
+        self.num_samples, self.num_channels = self._samples.shape
+
+    # channels: None for all channels, an int for a 1-D signal, or a sequence/slice of channels for (samples x channels)
+    # should_normalise: scale integer PCM to [-1, 1) rather than keeping its raw values
+    def read(self, channels=None, start_index=0, end_index=None, should_normalise=False):
+        if channels is None:
+            channels = slice(None)
+        elif isinstance(channels, range):
+            channels = slice(channels.start, channels.stop, channels.step)
+
+        samples = self._samples[start_index:end_index, channels]
+
+        if np.issubdtype(samples.dtype, np.floating):
+            return np.array(samples)
+
+        if not should_normalise:
+            return samples.astype(np.float64)
+
+        if samples.dtype == np.uint8:
+            # 8-bit WAV is unsigned, centred on 128
+            return (samples.astype(np.float64) - 128.0) / 128.0
+
+        return samples.astype(np.float64) / -float(np.iinfo(samples.dtype).min)
+
+    # The first num_channels channels, e.g. 1 for the omni channel or 4 for first-order (B-format) channels
+    def readFirstChannels(self, num_channels, start_index=0, end_index=None):
+        return self.read(slice(0, num_channels), start_index, end_index)
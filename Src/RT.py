@@ -1,12 +1,19 @@
-import Energy
 import Utils
+import RIRAnalysis
 
 
+# rir: RIR array or RIRAnalysis (the omni channel's EDC is used)
 def estimateRT(rir, sample_rate, start_dB = -5, end_dB = -35):
-    edc_dB = Energy.getEDC(rir, sample_rate)
+    analysis = RIRAnalysis.asAnalysis(rir, sample_rate)
+    sample_rate = analysis.sample_rate
+    edc_dB, _ = analysis.getEDC()
 
-    start_index = Utils.findIndexOfClosest(edc_dB, start_dB)
-    end_index = Utils.findIndexOfClosest(edc_dB, end_dB)
+    return getRTFromEDC(edc_dB, sample_rate, start_dB, end_dB)
+
+
+# edc_dB: one EDC (samples), or several (samples x N) to get N decay times at once
+def getRTFromEDC(edc_dB, sample_rate, start_dB = -5, end_dB = -35):
+    start_index, end_index = Utils.findIndicesOfDecayLevels(edc_dB, [start_dB, end_dB])
 
     sampling_period = 1.0 / sample_rate
     start_time = start_index * sampling_period
@@ -15,4 +22,4 @@ def estimateRT(rir, sample_rate, start_dB = -5, end_dB = -35):
     range_dB = end_dB - start_dB
     gradient = range_dB / (end_time - start_time)
 
-    return -60 / gradient
\ No newline at end of file
+    return -60 / gradient
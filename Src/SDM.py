@@ -1,45 +1,47 @@
 import warnings
 
 import numpy as np
-from matplotlib import pyplot as plt
 import Utils
-from scipy.signal import savgol_filter
-import Energy
-from scipy.signal import butter, sosfilt
-from scipy import stats
+import RIRAnalysis
 
 
 # spatial_ir: impulse response in B-format
-def getDOAPerSample(spatial_ir, window_length_samples=5):
+# Returns the DOA of samples start_index:end_index (default: all samples). This matches slicing the full-length
+# estimate, but only smooths the samples that are needed.
+def getDOAPerSample(spatial_ir, window_length_samples=5, start_index=0, end_index=None):
     # Get each axis as the product of the omni channel and each respective bidirectional channel, smoothed with hanning
     assert (window_length_samples >= 5)
     window = np.hanning(window_length_samples) # Note: this is slightly different to the MATLAB Hanning window
-    coords_cartesian = np.zeros([spatial_ir.shape[0], 3])
+    num_samples = spatial_ir.shape[0]
+    end_index = num_samples if end_index is None else min(end_index, num_samples)
+    start_index = min(start_index, end_index)
+
+    # Extend the region by the window's reach either side (zeros beyond the IR), so a "valid" convolution of the
+    # region gives the same values as a "same" convolution of the whole IR
+    half_window_length = (window_length_samples - 1) // 2
+    padded_start_index = start_index - (window_length_samples - 1 - half_window_length)
+    padded_end_index = end_index + half_window_length
+    spatial_ir_region = spatial_ir[max(0, padded_start_index):min(num_samples, padded_end_index), :4]
+    spatial_ir_region = np.pad(spatial_ir_region, ((max(0, -padded_start_index), max(0, padded_end_index - num_samples)), (0, 0)))
+
+    coords_cartesian = np.zeros([end_index - start_index, 3])
 
     for axis in range(3):
         spherical_harmonic_index = axis + 1
-        coords_cartesian[:, axis] = np.convolve(window, spatial_ir[:, 0] * spatial_ir[:, spherical_harmonic_index], "same")
+        coords_cartesian[:, axis] = np.convolve(window, spatial_ir_region[:, 0] * spatial_ir_region[:, spherical_harmonic_index], "valid")
 
     # Normalise each direction to a radius of 1
-    euclidean_distances = np.tile(np.sqrt(np.square(coords_cartesian[:, 0])
-                                          + np.square(coords_cartesian[:, 1])
-                                          + np.square(coords_cartesian[:, 2])), (3, 1)).transpose()
+    euclidean_distances = np.sqrt(np.square(coords_cartesian[:, 0])
+                                  + np.square(coords_cartesian[:, 1])
+                                  + np.square(coords_cartesian[:, 2]))
 
-    doa_per_sample_cartesian = coords_cartesian / euclidean_distances
+    doa_per_sample_cartesian = coords_cartesian / euclidean_distances[:, np.newaxis]
 
     return doa_per_sample_cartesian
 
 
-# Returns plot_angles_rad, radii_dB
-def getSpatioTemporalMap(spatial_ir,
-                         sample_rate,
-                         start_ms=-1,
-                         duration_ms=200,
-                         start_is_relative_to_direct=True,
-                         plane="transverse",
-                         num_plot_angles=300):
-    doa_cartesian = getDOAPerSample(spatial_ir)
-
+# Returns (start_index, end_index) of a time region of the spatial IR
+def getTimeRegionIndices(spatial_ir, sample_rate, start_ms, duration_ms, start_is_relative_to_direct):
     start_samples = int(np.floor(sample_rate * start_ms / 1000))
     duration_samples = int(np.floor(sample_rate * duration_ms / 1000))
 
@@ -54,29 +56,30 @@ def getSpatioTemporalMap(spatial_ir,
         start_index = start_samples
         end_index = start_index + duration_samples
 
-    # Truncate DOAs to time region
-    doa_cartesian_trunc = doa_cartesian[start_index:end_index, :]
+    return start_index, end_index
+
 
-    # Transform cartesian coords and convert to spherical, where doa_spherical = (radii, azimuths, elevations)
-    # Note: doa_spherical[:, 0] will be ignored as radius is taken from pressure
+# Transform cartesian coords and convert to spherical, where doa_spherical = (radii, azimuths, elevations)
+# Note: doa_spherical[:, 0] will be ignored as radius is taken from pressure
+def getDOAInPlane(doa_cartesian, plane):
     if plane == "lateral":
-        doa_spherical_rad = Utils.cartesianToSpherical(doa_cartesian_trunc)
+        doa_spherical_rad = Utils.cartesianToSpherical(doa_cartesian)
     elif plane == "median":
-        transformed_doa_cartesian = np.zeros_like(doa_cartesian_trunc)
-        transformed_doa_cartesian[:, 0] = doa_cartesian_trunc[:, 0]
-        transformed_doa_cartesian[:, 1] = doa_cartesian_trunc[:, 2]
-        transformed_doa_cartesian[:, 2] = -doa_cartesian_trunc[:, 1]
+        transformed_doa_cartesian = np.zeros_like(doa_cartesian)
+        transformed_doa_cartesian[:, 0] = doa_cartesian[:, 0]
+        transformed_doa_cartesian[:, 1] = doa_cartesian[:, 2]
+        transformed_doa_cartesian[:, 2] = -doa_cartesian[:, 1]
         doa_spherical_rad = Utils.cartesianToSpherical(transformed_doa_cartesian)
     elif plane == "transverse":
-        transformed_doa_cartesian = np.zeros_like(doa_cartesian_trunc)
-        transformed_doa_cartesian[:, 0] = doa_cartesian_trunc[:, 2]
-        transformed_doa_cartesian[:, 1] = doa_cartesian_trunc[:, 1]
-        transformed_doa_cartesian[:, 2] = -doa_cartesian_trunc[:, 0]
+        transformed_doa_cartesian = np.zeros_like(doa_cartesian)
+        transformed_doa_cartesian[:, 0] = doa_cartesian[:, 2]
+        transformed_doa_cartesian[:, 1] = doa_cartesian[:, 1]
+        transformed_doa_cartesian[:, 2] = -doa_cartesian[:, 0]
         doa_spherical_rad = Utils.cartesianToSpherical(transformed_doa_cartesian)
         doa_spherical_rad[:, 1] += np.pi / 2
     else:
         warnings.warn("Plane argument not recognised (defaulting to 'lateral')")
-        doa_spherical_rad = Utils.cartesianToSpherical(doa_cartesian_trunc)
+        doa_spherical_rad = Utils.cartesianToSpherical(doa_cartesian)
 
     # Apply arbitrary offsets for alignment correction
     azimuth_offset_rad = np.pi
@@ -84,6 +87,19 @@ def getSpatioTemporalMap(spatial_ir,
     doa_spherical_rad[:, 1] += azimuth_offset_rad
     doa_spherical_rad[:, 2] += elevation_offset_rad
 
+    return doa_spherical_rad
+
+
+# Sums the energy arriving from each of num_plot_angles azimuths, weighted by |cos(elevation)|, within each time
+# region (start_index, end_index) of the given samples (default: one region covering all samples).
+# All regions are binned together as one weighted histogram, so the cost doesn't scale with num_plot_angles.
+# Returns radii (regions x angles)
+def getEnergyPerAngle(doa_spherical_rad, energy_linear, num_plot_angles, time_regions=None):
+    num_samples = doa_spherical_rad.shape[0]
+
+    if time_regions is None:
+        time_regions = [(0, num_samples)]
+
     # Map (-pi to pi) to (0 to 1), preserving values outside range (these get wrapped in the next step)
     angles_0to1 = (doa_spherical_rad[:, 1] + np.pi) / (2 * np.pi)
 
@@ -91,16 +107,85 @@ def getSpatioTemporalMap(spatial_ir,
     angles_0toN_quantised = np.round(angles_0to1 * num_plot_angles)
     angles_0toN_wrapped = angles_0toN_quantised % num_plot_angles
 
-    angles_rad = np.linspace(-np.pi, np.pi - (2 * np.pi / num_plot_angles), num_plot_angles)
-    radii = np.zeros(num_plot_angles)
+    weights = energy_linear * np.abs(np.cos(doa_spherical_rad[:, 2]))
+
+    # Gather the samples of every region, offsetting each region's bins so all regions share one histogram
+    region_bounds = np.clip(np.asarray(time_regions, dtype=int).reshape(-1, 2), 0, num_samples)
+    region_lengths = np.clip(region_bounds[:, 1] - region_bounds[:, 0], 0, None)
+    sample_indices = np.concatenate([np.arange(start_index, start_index + length) for (start_index, _), length in zip(region_bounds, region_lengths)])
+    region_indices = np.repeat(np.arange(len(region_bounds)), region_lengths)
+
+    region_angles = angles_0toN_wrapped[sample_indices]
+    region_weights = weights[sample_indices]
+
+    # Samples without a direction or with a NaN weight are left out (as with nansum)
+    is_valid = ~np.isnan(region_angles) & ~np.isnan(region_weights)
+    bin_indices = region_indices[is_valid] * num_plot_angles + region_angles[is_valid].astype(int)
+
+    radii = np.bincount(bin_indices, weights=region_weights[is_valid], minlength=len(region_bounds) * num_plot_angles)
+
+    return radii.reshape(len(region_bounds), num_plot_angles)
+
+
+# Returns plot_angles_rad, radii_dB
+# doa_cartesian: optional precomputed getDOAPerSample(spatial_ir)
+def getSpatioTemporalMap(spatial_ir,
+                         sample_rate,
+                         start_ms=-1,
+                         duration_ms=200,
+                         start_is_relative_to_direct=True,
+                         plane="transverse",
+                         num_plot_angles=300,
+                         doa_cartesian=None):
+    angles_rad, radii_dB = getSpatioTemporalMaps(spatial_ir,
+                                                 sample_rate,
+                                                 starts_ms=[start_ms],
+                                                 durations_ms=duration_ms,
+                                                 start_is_relative_to_direct=start_is_relative_to_direct,
+                                                 planes=[plane],
+                                                 num_plot_angles=num_plot_angles,
+                                                 doa_cartesian=doa_cartesian)
+
+    return angles_rad, radii_dB[0, 0, :]
+
+
+# Computes the maps for several planes and time regions from a single DOA estimate, which is only computed over the
+# span covered by the time regions (unless a full-length doa_cartesian is given).
+# durations_ms: one duration for all regions, or one per start time
+# Returns plot_angles_rad, radii_dB (planes x start times x angles)
+def getSpatioTemporalMaps(spatial_ir,
+                          sample_rate,
+                          starts_ms,
+                          durations_ms=200,
+                          start_is_relative_to_direct=True,
+                          planes=("transverse",),
+                          num_plot_angles=300,
+                          doa_cartesian=None):
+    durations_ms = np.broadcast_to(durations_ms, len(starts_ms))
+    time_regions = [getTimeRegionIndices(spatial_ir, sample_rate, start_ms, duration_ms, start_is_relative_to_direct)
+                    for start_ms, duration_ms in zip(starts_ms, durations_ms)]
+
+    # Estimate DOAs once over the span covering every time region
+    span_start_index = max(0, min(start_index for start_index, _ in time_regions))
+    span_end_index = min(spatial_ir.shape[0], max(end_index for _, end_index in time_regions))
+
+    if doa_cartesian is None:
+        doa_cartesian_span = getDOAPerSample(spatial_ir, start_index=span_start_index, end_index=span_end_index)
+    else:
+        doa_cartesian_span = doa_cartesian[span_start_index:span_end_index, :]
 
     # Get energy from the omnidirectional rir channel (this is used for the radius)
-    pressure = spatial_ir[start_index:end_index, 0]
-    energy_linear = np.square(pressure)
+    energy_linear_span = np.square(spatial_ir[span_start_index:span_end_index, 0])
 
-    for angle_index in range(num_plot_angles):
-        indices = angles_0toN_wrapped == angle_index
-        radii[angle_index] = np.nansum(energy_linear[indices] * np.abs(np.cos(doa_spherical_rad[indices, 2])))
+    # Time regions relative to the start of the span
+    time_regions_in_span = [(start_index - span_start_index, end_index - span_start_index) for start_index, end_index in time_regions]
+
+    radii = np.zeros([len(planes), len(time_regions), num_plot_angles])
+
+    for plane_index, plane in enumerate(planes):
+        doa_spherical_rad_span = getDOAInPlane(doa_cartesian_span, plane)
+
+        radii[plane_index, :, :] = getEnergyPerAngle(doa_spherical_rad_span, energy_linear_span, num_plot_angles, time_regions_in_span)
 
     # window_length = 5
     # radii_wrapped_for_start = radii[-window_length - 1:-1]
@@ -113,25 +198,29 @@ def getSpatioTemporalMap(spatial_ir,
     radii_dB = 10 * np.log10(np.clip(radii, 1e-8, None))
 
     # Mirror along the x-axis to match Treble presentation
+    angles_rad = np.linspace(-np.pi, np.pi - (2 * np.pi / num_plot_angles), num_plot_angles)
     angles_rad_corrected = np.pi - angles_rad
 
     return angles_rad_corrected, radii_dB
 
 
 def plotSpatioTemporalMap(spatial_rir, sample_rate, plane="median", num_plot_angles=200):
+    import matplotlib.pyplot as plt
     fig, axes = plt.subplots(3, 2, subplot_kw={'projection': 'polar'})
 
     starts_relative_to_direct_ms = [-1, 10, 100, 200, 400, 800]
-
-    for index, duration_ms in enumerate([3,20,20,20,20,20]):
-        angles_rad, radii_dB = getSpatioTemporalMap(spatial_rir,
-                                                    sample_rate,
-                                                    start_ms=starts_relative_to_direct_ms[index],
-                                                    duration_ms=duration_ms,
-                                                    start_is_relative_to_direct=True,
-                                                    plane=plane,
-                                                    num_plot_angles=num_plot_angles)
-
+    durations_ms = [3,20,20,20,20,20]
+
+    angles_rad, all_radii_dB = getSpatioTemporalMaps(spatial_rir,
+                                                     sample_rate,
+                                                     starts_ms=starts_relative_to_direct_ms,
+                                                     durations_ms=durations_ms,
+                                                     start_is_relative_to_direct=True,
+                                                     planes=[plane],
+                                                     num_plot_angles=num_plot_angles)
+
+    for index, duration_ms in enumerate(durations_ms):
+        radii_dB = all_radii_dB[0, index, :]
         axes[index % 3][int(index / 3)].fill(angles_rad, radii_dB, color="black", alpha=1 / (index + 1))
                  # label=f"{starts_relative_to_direct_ms[index]}-{starts_relative_to_direct_ms[index] + duration_ms}")
         axes[index % 3][int(index / 3)].set_axisbelow(True)
@@ -140,13 +229,12 @@ def plotSpatioTemporalMap(spatial_rir, sample_rate, plane="median", num_plot_ang
     plt.show()
 
 
+# spatial_rir: B-format (or higher-order) RIR array or RIRAnalysis
 def getSpatialAsymmetryScore(spatial_rir, sample_rate, show_plots=False):
+    analysis = RIRAnalysis.asAnalysis(spatial_rir, sample_rate)
+    sample_rate = analysis.sample_rate
     num_octave_bands = 7
-    spatial_rir_octave_bands = np.zeros([num_octave_bands, len(spatial_rir[:, 0]), 4])
-
-    for channel_index in range(4):
-        octave_band_signals, octave_band_centres = Utils.getOctaveBandsFromIR(spatial_rir[:, channel_index], sample_rate)
-        spatial_rir_octave_bands[:, :, channel_index] = octave_band_signals.transpose()
+    spatial_rir_octave_bands, octave_band_centres = analysis.getOctaveBands()
 
     num_plot_angles = 10
     num_times = 4
@@ -155,30 +243,35 @@ def getSpatialAsymmetryScore(spatial_rir, sample_rate, show_plots=False):
     circular_stds = np.zeros([num_octave_bands, 3, num_times])
     start_energies = [-25, -30, -35, -40] # dB
 
+    planes = ["median", "transverse", "lateral"]
+
+    # Get EDCs of omni component, and the start time of each energy bin in every band (start energies x bands)
+    octave_band_edcs_dB, edc_times = analysis.getOctaveBandEDCs()
+    all_start_times_ms = edc_times[Utils.findIndicesOfDecayLevels(octave_band_edcs_dB[:, :num_octave_bands], start_energies)] * 1000
+
     for octave_band_index in range(num_octave_bands):
         spatial_rir_octave = spatial_rir_octave_bands[octave_band_index, :, :]
+        start_times_ms = all_start_times_ms[:, octave_band_index]
 
-        # Get EDC of omni component
-        edc_dB, edc_times = Energy.getEDC(spatial_rir_octave[:, 0], sample_rate)
-        start_times_ms = [edc_times[Utils.findIndexOfClosest(edc_dB, start_energy)] * 1000 for start_energy in start_energies]
-
-        for time_index, start_ms in enumerate(start_times_ms):
-            planes = ["median", "transverse", "lateral"]
+        # All planes and start times share one DOA estimate over the span of the time regions
+        doa_angles, band_doa_radii = getSpatioTemporalMaps(spatial_rir_octave,
+                                                           sample_rate,
+                                                           starts_ms=start_times_ms,
+                                                           durations_ms=300,
+                                                           start_is_relative_to_direct=False,
+                                                           planes=planes,
+                                                           num_plot_angles=num_plot_angles)
 
-            for plane_index, plane in enumerate(planes):
-                doa_angles, doa_radii = getSpatioTemporalMap(spatial_rir_octave,
-                                                             sample_rate,
-                                                             start_ms=start_ms,
-                                                             duration_ms=300,
-                                                             start_is_relative_to_direct=False,
-                                                             plane=plane,
-                                                             num_plot_angles=num_plot_angles)
+        for time_index in range(num_times):
+            for plane_index in range(len(planes)):
+                doa_radii = band_doa_radii[plane_index, time_index, :]
 
                 all_doas[octave_band_index, plane_index, time_index, :] = doa_radii - np.max(doa_radii)
 
                 circular_stds[octave_band_index, plane_index, time_index] = Utils.circularStd(10 ** (doa_radii / 10), doa_angles)
 
     if show_plots:
+        import matplotlib.pyplot as plt
         fig = plt.figure()
         plt.rcParams.update({
             "text.usetex": True,
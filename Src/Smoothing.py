@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+
+
+# Savitzky-Golay smoothing along axis 0, as savgol_filter(x, window_length, polyorder, axis=0) for polyorder 0-2
+# x: (samples) or (samples x N), smoothed independently per column
+def smoothLocalRegression(x, window_length, polyorder=1):
+    x = np.asarray(x)
+    if x.dtype != np.float32:
+        x = x.astype(np.float64)
+
+    num_samples = x.shape[0]
+
+    if polyorder not in (0, 1, 2):
+        raise ValueError("polyorder must be 0, 1 or 2.")
+    if polyorder >= window_length:
+        raise ValueError("polyorder must be less than window_length.")
+    if window_length > num_samples:
+        raise ValueError("window_length must be less than or equal to the size of x.")
+
+    half_length = window_length // 2
+
+    if polyorder < 2:
+        # Symmetric windows make a straight line fit at the centre equal to the window mean
+        window_sums, = getWindowSums(x, window_length, 0)
+        window_fits = window_sums / window_length
+    else:
+        # Quadratic fit at the centre, from the window sums of x and offset^2 * x (the odd terms don't contribute)
+        window_sums, _, window_squared_offset_sums = getWindowSums(x, window_length, 2)
+        offsets = np.arange(window_length) - (window_length - 1) / 2
+        sum_offsets_squared = np.sum(offsets ** 2)
+        sum_offsets_fourth = np.sum(offsets ** 4)
+        window_fits = ((sum_offsets_fourth * window_sums - sum_offsets_squared * window_squared_offset_sums)
+                       / (window_length * sum_offsets_fourth - sum_offsets_squared ** 2))
+
+    smoothed = np.empty(x.shape, dtype=np.result_type(x.dtype, np.float32))
+
+    # Each sample between the edges takes the fit of the window it centres (as savgol_filter aligns even windows)
+    first_window_index = half_length - (window_length - 1) // 2
+    smoothed[half_length:num_samples - half_length] = window_fits[first_window_index:first_window_index + num_samples - 2 * half_length]
+
+    # Polynomial fits to the first and last windows for the edges (centred positions keep them well conditioned)
+    if half_length > 0:
+        edge_positions = np.arange(window_length) - (window_length - 1) / 2
+        start_coefficients = np.polyfit(edge_positions, x[:window_length].reshape(window_length, -1), polyorder)
+        end_coefficients = np.polyfit(edge_positions, x[-window_length:].reshape(window_length, -1), polyorder)
+        smoothed[:half_length] = np.polyval(start_coefficients, edge_positions[:half_length, np.newaxis]).reshape(smoothed[:half_length].shape)
+        smoothed[num_samples - half_length:] = np.polyval(end_coefficients, edge_positions[window_length - half_length:, np.newaxis]).reshape(smoothed[:half_length].shape)
+
+    return smoothed
+
+
+# For every window of window_length samples along axis 0, the sums of offset^k * x for k = 0 to max_power, where offset
+# is the sample's distance from the window centre. Cumulative sums run within chunks of window_length samples only.
+# Returns a list of (windows (x N)) sums, one per power
+def getWindowSums(x, window_length, max_power):
+    num_samples = x.shape[0]
+    num_windows = num_samples - window_length + 1
+    num_chunks = num_samples // window_length + 1
+
+    padded_x = np.zeros((num_chunks * window_length,) + x.shape[1:])
+    padded_x[:num_samples] = x
+    chunks = padded_x.reshape((num_chunks, window_length) + x.shape[1:])
+    chunk_positions = np.arange(window_length, dtype=float).reshape((1, window_length) + (1,) * (x.ndim - 1))
+
+    # Windows start part way through a chunk and end in the next one (or exactly cover one chunk)
+    window_starts = np.arange(num_windows)
+    start_positions = window_starts % window_length
+    has_prefix = start_positions > 0
+
+    boundary_sums = []
+
+    for power in range(max_power + 1):
+        # Offsets from the boundary at the end of each chunk: -window_length to -1 before it, 0 onwards after it
+        prefix_sums = np.cumsum(chunks * chunk_positions ** power, axis=1).reshape(padded_x.shape)
+        suffix_sums = np.cumsum((chunks * (chunk_positions - window_length) ** power)[:, ::-1], axis=1)[:, ::-1].reshape(padded_x.shape)
+
+        window_sums = suffix_sums[window_starts]
+        window_sums[has_prefix] += prefix_sums[window_starts[has_prefix] + window_length - 1]
+        boundary_sums.append(window_sums)
+
+    # Re-centre the offsets on each window's centre
+    window_centres = (start_positions + (window_length - 1) / 2 - window_length).reshape((-1,) + (1,) * (x.ndim - 1))
+    centred_sums = []
+
+    for power in range(max_power + 1):
+        # Binomial expansion of sum((boundary_offset - centre)^power * x)
+        centred_sums.append(sum(math.comb(power, k) * (-window_centres) ** (power - k) * boundary_sums[k] for k in range(power + 1)))
+
+    return centred_sums
+
+
+# Local regression smoothing after mirroring window_length samples at each end of x (excluding the end samples
+# themselves), which avoids edge effects; the mirrored samples are removed again afterwards
+def smoothWithMirroredEnds(x, window_length, polyorder=1):
+    x = np.asarray(x)
+    mirrored_start = x[window_length:0:-1]
+    mirrored_end = x[:-window_length - 1:-1]
+    smoothed = smoothLocalRegression(np.concatenate([mirrored_start, x, mirrored_end]), window_length, polyorder)
+    return smoothed[window_length:-window_length]
+
+
+# Smooths a spectrum sampled on a logarithmic frequency axis (e.g. from Utils.linearToLog) over a fixed fraction of an
+# octave, i.e. a fixed number of bins, with mirrored ends
+def smoothFractionalOctave(log_spectrum, log_frequencies, octave_fraction, polyorder=1):
+    num_octaves = np.log10(log_frequencies[-1] / log_frequencies[0]) / np.log10(2)
+    window_length = int((len(log_spectrum) / num_octaves) * octave_fraction)
+    return smoothWithMirroredEnds(log_spectrum, window_length, polyorder)
+
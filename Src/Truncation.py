@@ -0,0 +1,58 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Audit record of a pre-truncation decision
+# noise_floor_dB: mean level of the RIR tail relative to the loudest window
+# last_useful_time_s: end of the last window that rose above the noise floor by headroom_dB (before the margin is added)
+TruncationReport = namedtuple("TruncationReport", ["original_num_samples",
+                                                   "truncated_num_samples",
+                                                   "noise_floor_dB",
+                                                   "last_useful_time_s",
+                                                   "margin_ms"])
+
+
+# Finds where the decay of the omni channel sinks into the noise floor, and returns the sample index to truncate at
+# (that point plus margin_ms). The noise floor is the mean energy over the last tail_fraction of the RIR, measured
+# in windows of window_duration_ms. RIRs that never rise headroom_dB above their noise floor are left untruncated.
+def findTruncationPoint(rir, sample_rate, margin_ms=200.0, window_duration_ms=10.0, tail_fraction=0.1, headroom_dB=5.0):
+    num_samples = len(rir)
+    window_length_samples = max(1, int((sample_rate * window_duration_ms) / 1000))
+    num_windows = num_samples // window_length_samples
+
+    if num_windows < 2:
+        return TruncationReport(num_samples, num_samples, 0.0, num_samples / sample_rate, margin_ms)
+
+    # Mean energy of each (non-overlapping) window
+    squared_rir = np.square(np.asarray(rir[:num_windows * window_length_samples], dtype=float))
+    window_energies = np.mean(squared_rir.reshape(num_windows, window_length_samples), axis=1)
+    max_energy = np.max(window_energies)
+
+    if max_energy <= 0.0:
+        return TruncationReport(num_samples, num_samples, 0.0, num_samples / sample_rate, margin_ms)
+
+    num_tail_windows = max(1, int(num_windows * tail_fraction))
+    noise_floor_energy = np.mean(window_energies[-num_tail_windows:])
+    noise_floor_dB = 10 * np.log10(max(noise_floor_energy, 1e-30) / max_energy)
+
+    # Last window after the peak that is still clearly above the noise floor
+    peak_window_index = np.argmax(window_energies)
+    window_levels_dB = 10 * np.log10(np.clip(window_energies[peak_window_index:], 1e-30, None) / max_energy)
+    windows_above_noise = np.nonzero(window_levels_dB > noise_floor_dB + headroom_dB)[0]
+
+    if noise_floor_dB > -headroom_dB or len(windows_above_noise) == 0:
+        return TruncationReport(num_samples, num_samples, float(noise_floor_dB), num_samples / sample_rate, margin_ms)
+
+    last_useful_index = (peak_window_index + windows_above_noise[-1] + 1) * window_length_samples
+    margin_samples = int((sample_rate * margin_ms) / 1000)
+    truncated_num_samples = min(num_samples, last_useful_index + margin_samples)
+
+    return TruncationReport(num_samples, int(truncated_num_samples), float(noise_floor_dB), last_useful_index / sample_rate, margin_ms)
+
+
+# Truncates every channel of a (samples x channels) RIR at the point found from its omni channel (channel 0)
+# Returns truncated_rir, truncation_report
+def truncateRIR(spatial_rir, sample_rate, margin_ms=200.0):
+    omni_rir = spatial_rir[:, 0] if spatial_rir.ndim > 1 else spatial_rir
+    truncation_report = findTruncationPoint(omni_rir, sample_rate, margin_ms)
+    return spatial_rir[:truncation_report.truncated_num_samples], truncation_report
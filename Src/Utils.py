@@ -1,20 +1,13 @@
 import numpy as np
 from scipy.interpolate import interp1d
-from scipy.signal import butter, sosfilt
-from scipy.io import wavfile
+import Auralisation
+import FilterBank
+import LogFrequencyResampler
 
 
+# See Auralisation.auralise; the programme items are loaded and transformed once, then convolved by FFT overlap-add
 def convolveWithProgItem(spatial_rir, prog_item_id):
-    if prog_item_id == 1:
-        filepath = "/Users/willcassidy/Development/GitHub/AAUnpleasantnessModel/Audio/Programme Item Snippets/ClapShort.wav"
-    elif prog_item_id == 2:
-        filepath = "/Users/willcassidy/Development/GitHub/AAUnpleasantnessModel/Audio/Programme Item Snippets/SaxShort.wav"
-    else:
-        assert False
-
-    prog_item_snippet = wavfile.read(filepath)
-
-    return np.convolve(spatial_rir, prog_item_snippet[1])
+    return Auralisation.auralise(spatial_rir, prog_item_id)
 
 
 def findIndexOfClosest(list, target):
@@ -23,6 +16,35 @@ def findIndexOfClosest(list, target):
     return index_of_closest
 
 
+# Equivalent to findIndexOfClosest(decay_dB, level) for each level, but exploits the decay being non-increasing (as
+# EDCs are) to binary search for every level at once instead of scanning the whole curve per level.
+# decay_dB: (samples) or (samples x N) decay curves, e.g. from Energy.getEDCs()
+# levels_dB: a level or sequence of levels
+# Returns indices with shape levels_dB.shape (+ (N) for batched curves)
+def findIndicesOfDecayLevels(decay_dB, levels_dB):
+    decay_dB = np.asarray(decay_dB)
+    levels_dB = np.asarray(levels_dB, dtype=float)
+
+    if decay_dB.ndim == 1:
+        return _findIndicesOfDecayLevels1D(decay_dB, levels_dB)
+
+    return np.stack([_findIndicesOfDecayLevels1D(decay_dB[:, curve_index], levels_dB) for curve_index in range(decay_dB.shape[1])], axis=-1)
+
+
+def _findIndicesOfDecayLevels1D(decay_dB, levels_dB):
+    num_samples = len(decay_dB)
+    rising_curve = -decay_dB
+
+    # First sample at or below each level, and the sample before it, are the only candidates for the closest
+    upper_indices = np.clip(np.searchsorted(rising_curve, -levels_dB, side="left"), 0, num_samples - 1)
+    lower_indices = np.clip(upper_indices - 1, 0, num_samples - 1)
+    is_lower_closer = np.abs(decay_dB[lower_indices] - levels_dB) <= np.abs(decay_dB[upper_indices] - levels_dB)
+    closest_indices = np.where(is_lower_closer, lower_indices, upper_indices)
+
+    # Like argmin, return the first of a run of equal values
+    return np.searchsorted(rising_curve, rising_curve[closest_indices], side="left")
+
+
 def truncateSpectrum(spectrum, sample_rate, min_frequency, max_frequency):
     num_bins = len(spectrum)
     nyquist_frequency = sample_rate / 2.0
@@ -52,35 +74,17 @@ def linearToLog(magnitudes, sample_rate, f_min, f_max):
     Convert linear FFT magnitudes to logarithmic frequency space.
 
     Parameters:
-        magnitudes (array): FFT magnitudes (assumes only positive frequencies from 0 Hz to Nyquist).
+        magnitudes (array): FFT magnitudes (assumes only positive frequencies from 0 Hz to Nyquist), either one
+            spectrum or a stack of spectra (bins x spectra).
         sample_rate (float): Sampling rate in Hz.
-        num_bins (int): Number of logarithmic frequency bins.
         f_min (float): Minimum frequency for log space.
         f_max (float): Maximum frequency, default is Nyquist.
 
     Returns:
         log_mags (array): Interpolated magnitudes in log frequency space between f_min and f_max
+        log_freqs_trunc (array): The log frequencies
     """
-    num_bins = len(magnitudes)
-    nyquist = sample_rate / 2
-    if f_max is None:
-        f_max = nyquist
-
-    # Linear frequency axis (positive frequencies only)
-    lin_freqs_full = np.linspace(0, nyquist, num_bins)
-
-    # Remove DC component (0 Hz) to avoid log(0)
-    lin_freqs_full = lin_freqs_full[1:]
-    magnitudes = magnitudes[1:]
-
-    # Logarithmic frequency axis
-    log_freqs_trunc = np.logspace(np.log10(f_min), np.log10(f_max), num_bins)
-
-    # Interpolation
-    interp = interp1d(lin_freqs_full, magnitudes, kind='linear', bounds_error=False, fill_value=0.0)
-    log_mags = interp(log_freqs_trunc)
-
-    return log_mags, log_freqs_trunc
+    return LogFrequencyResampler.resample(magnitudes, sample_rate, f_min, f_max)
 
 
 def getMidpointsBetween(values):
@@ -108,41 +112,11 @@ def getMeanMagnitudeBetweenFrequencies(half_spectrum_magnitudes, sample_rate, mi
 
 
 def getOctaveBandsFromIR(rir, sample_rate, octave_band_resolution=1):
-        # Octave bands
-        if octave_band_resolution == 1:
-            octave_band_centres = 1e3 * np.logspace(-6, 5, 12, base=2)
-            centre_to_crossover_factor = 2 ** (1 / 2)
-        else:
-            octave_band_centres = 1e3 * np.logspace(-6, 5, 34, base=2)
-            centre_to_crossover_factor = 2 ** (1 / 6)
-
-        octave_band_centres = octave_band_centres[octave_band_centres > 70]
-        octave_band_centres = octave_band_centres[octave_band_centres < 0.5 * sample_rate]
-        num_bands = len(octave_band_centres)
-        filter_order = 5
-
-        band_signals = np.zeros([len(rir), num_bands])
-        for freq_idx, centre_freq in enumerate(octave_band_centres):
-            band_type = ('low' if freq_idx == 0
-                         else ('high' if freq_idx == num_bands - 1
-                               else 'band'))
-
-            bin_lower = centre_freq / centre_to_crossover_factor
-            bin_upper = centre_freq * centre_to_crossover_factor
-
-            if band_type == 'low':
-                sos = butter(2 * filter_order, bin_upper, 'lowpass', fs=sample_rate, output='sos')
-            elif band_type == 'band':
-                sos = butter(filter_order, (bin_lower, bin_upper), 'bandpass', fs=sample_rate, output='sos')
-            elif band_type == 'high':
-                sos = butter(2 * filter_order, bin_lower, 'highpass', fs=sample_rate, output='sos')
-            else:
-                raise ValueError('"band_type" must be one of ["low", "band", "high"].')
-
-            band_signals[:, freq_idx] = sosfilt(sos, rir)
-
-        # Returns (bands x samples)
-        return band_signals, octave_band_centres
+        filter_bank = FilterBank.getFilterBank(sample_rate, octave_band_resolution)
+        band_signals = filter_bank.filter(rir).transpose()
+
+        # Returns (samples x bands)
+        return band_signals, filter_bank.octave_band_centres
 
 
 # cartesian_coords: shape = [N, 3 (x, y, z)]
@@ -175,27 +149,28 @@ def getFrequencyIndexRange(frequency_indices, min_frequency, max_frequency, samp
     return frequency_index_range
 
 
-def applyEqualLoudnessContour(mag_spectrum_dB, mag_spectrum_freqs):
-    # ISO 226:2003 standard frequencies
-    equal_loudness_freqs = np.array([
-        20, 25, 31.5, 40, 50, 63, 80, 100, 125, 160,
-        200, 250, 315, 400, 500, 630, 800, 1000, 1250,
-        1600, 2000, 2500, 3150, 4000, 5000, 6300, 8000,
-        10000, 12500
-    ])
-
-    # Approximate equal-loudness corrections in dB at 60 phons
-    equal_loudness_magnitudes_dB = np.array([
-        78.5, 68.7, 59.5, 51.1, 44.0, 37.5, 31.5, 26.5, 22.1,
-        17.9, 14.4, 11.4, 8.6, 6.2, 4.4, 3.0, 2.2, 2.4, 3.5,
-        1.7, 1.3, 4.2, 6.0, 5.4, 1.5, 6.0, 12.6, 13.9, 12.3
-    ])
-
-    # Interpolate equal-loudness curve
-    equal_loudness_curve = interp1d(equal_loudness_freqs, equal_loudness_magnitudes_dB, kind="linear", bounds_error=False, fill_value="extrapolate")
+# ISO 226:2003 standard frequencies
+EQUAL_LOUDNESS_FREQS = np.array([
+    20, 25, 31.5, 40, 50, 63, 80, 100, 125, 160,
+    200, 250, 315, 400, 500, 630, 800, 1000, 1250,
+    1600, 2000, 2500, 3150, 4000, 5000, 6300, 8000,
+    10000, 12500
+])
+
+# Approximate equal-loudness corrections in dB at 60 phons
+EQUAL_LOUDNESS_MAGNITUDES_DB = np.array([
+    78.5, 68.7, 59.5, 51.1, 44.0, 37.5, 31.5, 26.5, 22.1,
+    17.9, 14.4, 11.4, 8.6, 6.2, 4.4, 3.0, 2.2, 2.4, 3.5,
+    1.7, 1.3, 4.2, 6.0, 5.4, 1.5, 6.0, 12.6, 13.9, 12.3
+])
+
+# Interpolated equal-loudness curve (built once rather than per call)
+EQUAL_LOUDNESS_CURVE = interp1d(EQUAL_LOUDNESS_FREQS, EQUAL_LOUDNESS_MAGNITUDES_DB, kind="linear", bounds_error=False, fill_value="extrapolate")
 
+
+def applyEqualLoudnessContour(mag_spectrum_dB, mag_spectrum_freqs):
     # Get correction for given frequencies
-    correction_curve = equal_loudness_curve(mag_spectrum_freqs)
+    correction_curve = EQUAL_LOUDNESS_CURVE(mag_spectrum_freqs)
 
     # Apply correction
     corrected_magnitudes_dB = mag_spectrum_dB - correction_curve
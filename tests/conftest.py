@@ -0,0 +1,41 @@
+import os
+import sys
+
+import matplotlib
+import numpy as np
+import pytest
+
+matplotlib.use("Agg")
+
+# The modules in Src import each other by name, as when run from that directory
+SOURCE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Src")
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+if SOURCE_DIRECTORY not in sys.path:
+    sys.path.insert(0, SOURCE_DIRECTORY)
+
+
+# Synthetic multichannel RIR: decaying noise after a direct sound, with flutter echo reflections every 50 ms
+def makeSyntheticRIR(seed, sample_rate=32000, duration_s=1.6, rt_s=0.8, num_channels=4):
+    rng = np.random.default_rng(seed)
+    num_samples = int(sample_rate * duration_s)
+    envelope = np.exp(-6.91 * np.arange(num_samples) / sample_rate / rt_s)
+    rir = rng.standard_normal((num_samples, num_channels)) * envelope[:, None]
+
+    direct_index = 480 + seed * 7
+    rir[:direct_index] = 1e-4 * rng.standard_normal((direct_index, num_channels))
+    rir[direct_index, 0] = 5.0
+    rir[direct_index, 1] = 3.0 * (seed % 2)
+    rir[direct_index, 2] = 2.0
+
+    for reflection_num in range(1, 25):
+        rir[direct_index + reflection_num * int(0.05 * sample_rate), :] += 2.0 * np.exp(-6.91 * reflection_num * 0.05 / rt_s)
+
+    rir[:, 1:] *= 0.7
+
+    return rir.astype(np.float32), sample_rate
+
+
+@pytest.fixture
+def synthetic_rir():
+    return makeSyntheticRIR
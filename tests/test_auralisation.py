@@ -0,0 +1,23 @@
+import numpy as np
+from scipy.io import wavfile
+
+import Auralisation
+
+
+def test_int16_inputs_render_within_full_scale(tmp_path):
+    sample_rate = 32000
+    rng = np.random.default_rng(0)
+    prog_item_snippet = rng.integers(-2**15, 2**15, size=2000, dtype=np.int16)
+    prog_item_snippet[100] = -2**15
+    spatial_rir = np.zeros([4000, 4], dtype=np.int16)
+    spatial_rir[10] = 2**14
+
+    wavfile.write(str(tmp_path / Auralisation.PROG_ITEM_FILENAMES[1]), sample_rate, prog_item_snippet)
+    wavfile.write(str(tmp_path / "rir.wav"), sample_rate, spatial_rir)
+
+    output_filepath, = Auralisation.renderStimulus(str(tmp_path / "rir.wav"), 1, [1], str(tmp_path), str(tmp_path))
+    _, auralisation = wavfile.read(output_filepath)
+
+    assert auralisation.dtype == np.float32
+    assert np.max(np.abs(auralisation)) <= 1
+    np.testing.assert_allclose(auralisation[10:2010, 0], prog_item_snippet / 2**16, rtol=0, atol=1e-6)
@@ -0,0 +1,43 @@
+import ExtractFeatures
+import FeatureCache
+
+
+def getLastAccess(feature_cache, key):
+    return feature_cache.connection.execute("SELECT last_access FROM features WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_cached_features_match_computed(synthetic_rir, tmp_path):
+    rir, sample_rate = synthetic_rir(0)
+    features, _ = ExtractFeatures.computeFeatures(rir, sample_rate)
+    feature_cache = FeatureCache.FeatureCache(str(tmp_path))
+
+    try:
+        computed_features, _ = ExtractFeatures.computeFeatures(rir, sample_rate, feature_cache)
+        cached_features, _ = ExtractFeatures.computeFeatures(rir, sample_rate, feature_cache)
+        num_entries = feature_cache.connection.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+    finally:
+        feature_cache.close()
+
+    assert computed_features == features
+    assert cached_features == features
+    assert num_entries == len(ExtractFeatures.FEATURE_NAMES)
+
+
+def test_hit_only_updates_stale_last_access(tmp_path):
+    feature_cache = FeatureCache.FeatureCache(str(tmp_path), last_access_resolution_s=60.0)
+
+    try:
+        key = feature_cache.getKey("audio", "feature", {})
+        feature_cache.put(key, 1.0)
+        last_access = getLastAccess(feature_cache, key)
+
+        assert feature_cache.get(key) == 1.0
+        assert getLastAccess(feature_cache, key) == last_access
+
+        feature_cache.connection.execute("UPDATE features SET last_access = ? WHERE key = ?", (last_access - 120.0, key))
+        feature_cache.connection.commit()
+
+        assert feature_cache.get(key) == 1.0
+        assert getLastAccess(feature_cache, key) > last_access - 120.0
+    finally:
+        feature_cache.close()
@@ -0,0 +1,42 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import Colouration
+import DSE
+import FlutterEcho
+import HFDamping
+import SDM
+from conftest import DATA_DIRECTORY
+
+# Scores of the synthetic RIRs from the feature implementations before they were vectorised
+with open(os.path.join(DATA_DIRECTORY, "baseline_feature_scores.json"), "r") as file:
+    BASELINE_FEATURE_SCORES = json.load(file)
+
+TOLERANCE = 1e-9
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_feature_scores_match_baseline(synthetic_rir, seed):
+    rir, sample_rate = synthetic_rir(seed)
+    baseline_scores = BASELINE_FEATURE_SCORES[str(seed)]
+
+    assert abs(Colouration.getColouration(rir[:, 0], sample_rate) - baseline_scores["colouration"]) < TOLERANCE
+    assert abs(FlutterEcho.getFlutterEchoScore(rir, sample_rate) - baseline_scores["flutter_echo"]) < TOLERANCE
+    assert abs(SDM.getSpatialAsymmetryScore(rir, sample_rate) - baseline_scores["asymmetry"]) < TOLERANCE
+    assert abs(DSE.getCurvature(rir[:, 0], sample_rate) - baseline_scores["curvature"]) < TOLERANCE
+    assert abs(HFDamping.getHFDampingScore(rir[:, 0], sample_rate) - baseline_scores["hf_damping"]) < TOLERANCE
+
+
+@pytest.mark.parametrize("fft_size", [2 ** 17, None])
+def test_batched_colourations_match_single(synthetic_rir, fft_size):
+    # Different reverberation times give different window lengths, and so different FFT sizes when fitted
+    rirs = np.stack([synthetic_rir(seed, rt_s=rt_s)[0][:, 0] for seed, rt_s in [(0, 0.8), (1, 0.5), (2, 1.2)]], axis=1)
+    sample_rate = synthetic_rir(0)[1]
+
+    colourations = Colouration.getColourations(rirs, sample_rate, fft_size)
+
+    for rir_index in range(rirs.shape[1]):
+        assert abs(colourations[rir_index] - Colouration.getColouration(rirs[:, rir_index], sample_rate, fft_size=fft_size)) < TOLERANCE
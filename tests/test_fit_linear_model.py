@@ -0,0 +1,99 @@
+import csv
+
+import numpy as np
+import pytest
+
+import ExtractFeatures
+import FitLinearModel
+import PredictUnpleasantness
+
+
+# Ratings of 60 stimuli per programme item, around the built-in all-data model, plus ratings of a programme item that
+# isn't fitted
+def writeRatingsTable(filepath, seed=0):
+    rng = np.random.default_rng(seed)
+    stimulus_features = rng.uniform(size=(60, len(ExtractFeatures.FEATURE_NAMES)))
+    rows = []
+
+    for prog_item in [1, 2, 3]:
+        coefficients = PredictUnpleasantness.LINEAR_MODEL_COEFFICIENTS[min(prog_item, 2) - 1, -1]
+
+        for stimulus_index, features in enumerate(stimulus_features):
+            for _ in range(rng.integers(4, 9)):
+                rating = coefficients[0] + features @ coefficients[1:] + rng.normal(0, 10)
+                rows.append([f"stimulus_{stimulus_index + 1}", prog_item, rating, *features])
+
+    with open(filepath, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["stimulus_id", "prog_item", "rating"] + ExtractFeatures.FEATURE_NAMES)
+        writer.writerows(rows)
+
+
+def test_grouped_folds_keep_stimuli_together():
+    stimulus_ids = np.repeat([f"stimulus_{index}" for index in range(20)], np.arange(20) % 5 + 1)
+
+    fold_indices = FitLinearModel.getGroupedFoldIndices(stimulus_ids)
+
+    for stimulus_id in set(stimulus_ids):
+        assert len(set(fold_indices[stimulus_ids == stimulus_id])) == 1
+    assert np.ptp(np.bincount(fold_indices)) <= 5
+
+
+# sklearn's GroupKFold fold assignment (before its shuffle option), for comparison without sklearn installed
+def getGroupKFoldIndices(groups, num_folds):
+    unique_groups, groups = np.unique(groups, return_inverse=True)
+    n_samples_per_group = np.bincount(groups)
+    indices = np.argsort(n_samples_per_group)[::-1]
+    n_samples_per_fold = np.zeros(num_folds)
+    group_to_fold = np.zeros(len(unique_groups), dtype=int)
+
+    for group_index, weight in enumerate(n_samples_per_group[indices]):
+        lightest_fold = np.argmin(n_samples_per_fold)
+        n_samples_per_fold[lightest_fold] += weight
+        group_to_fold[indices[group_index]] = lightest_fold
+
+    return group_to_fold[groups]
+
+
+# Many stimuli with equal numbers of ratings, where the order ties are broken in changes the folds
+TIED_STIMULUS_IDS = np.repeat([f"stimulus_{index:02d}" for index in range(40)], np.arange(40) % 4 + 1)
+
+
+def test_grouped_folds_break_ties_as_group_k_fold():
+    fold_indices = FitLinearModel.getGroupedFoldIndices(TIED_STIMULUS_IDS)
+
+    np.testing.assert_array_equal(fold_indices, getGroupKFoldIndices(TIED_STIMULUS_IDS, FitLinearModel.NUM_FOLDS))
+
+
+def test_grouped_folds_match_group_k_fold():
+    model_selection = pytest.importorskip("sklearn.model_selection")
+
+    fold_indices = FitLinearModel.getGroupedFoldIndices(TIED_STIMULUS_IDS)
+
+    expected_fold_indices = np.zeros(len(TIED_STIMULUS_IDS), dtype=int)
+    splits = model_selection.GroupKFold(FitLinearModel.NUM_FOLDS).split(TIED_STIMULUS_IDS, groups=TIED_STIMULUS_IDS)
+    for fold_index, (_, test_indices) in enumerate(splits):
+        expected_fold_indices[test_indices] = fold_index
+    np.testing.assert_array_equal(fold_indices, expected_fold_indices)
+
+
+def test_fit_matches_least_squares(tmp_path):
+    ratings_table_filepath = str(tmp_path / "ratings.csv")
+    writeRatingsTable(ratings_table_filepath)
+
+    coefficients = FitLinearModel.fitCoefficientsFromRatingsTable(ratings_table_filepath)
+
+    stimulus_ids, prog_items, ratings, feature_matrix, _ = FitLinearModel.readRatingsTable(ratings_table_filepath)
+    is_fitted = np.isin(prog_items, PredictUnpleasantness.PROG_ITEMS)
+    design_matrix = np.hstack([np.ones([len(feature_matrix), 1]), feature_matrix])[is_fitted]
+    ratings = ratings[is_fitted]
+    prog_items = prog_items[is_fitted]
+    fold_indices = FitLinearModel.getGroupedFoldIndices(stimulus_ids[is_fitted])
+    assert coefficients.shape == PredictUnpleasantness.LINEAR_MODEL_COEFFICIENTS.shape
+
+    for prog_item_index, prog_item in enumerate(PredictUnpleasantness.PROG_ITEMS):
+        for k_fold_index, k_fold in enumerate(PredictUnpleasantness.K_FOLDS):
+            is_trained = (prog_items == prog_item) & ((fold_indices != k_fold_index) | (k_fold == -1))
+            expected_coefficients = np.linalg.lstsq(design_matrix[is_trained], ratings[is_trained], rcond=None)[0]
+
+            np.testing.assert_allclose(coefficients[prog_item_index, k_fold_index], expected_coefficients, rtol=0, atol=1e-9)
@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+import ExtractFeatures
+import InferenceService
+import MelFeatureStore
+import NumpyMLP
+import PredictUnpleasantness
+
+
+@pytest.fixture(scope="module")
+def service():
+    inference_service = InferenceService.InferenceService(num_workers=2, sample_rates=(32000,))
+    yield inference_service
+    inference_service.close()
+
+
+@pytest.fixture
+def rir_filepath(tmp_path, synthetic_rir):
+    rir, sample_rate = synthetic_rir(0)
+    filepath = str(tmp_path / "rir.wav")
+    wavfile.write(filepath, sample_rate, rir)
+    return filepath
+
+
+def test_rir_prediction_matches_pipeline(service, rir_filepath):
+    result = service.predict({"rir": rir_filepath})
+
+    features, _ = ExtractFeatures.extractFeaturesFromFile(rir_filepath)
+    expected_predictions = PredictUnpleasantness.predictUnpleasantnessFromFeatureMatrix([features[name] for name in ExtractFeatures.FEATURE_NAMES])[0]
+
+    assert result["features"] == features
+    assert result["predictions"] == PredictUnpleasantness.getPredictionsDict(expected_predictions)
+
+
+def test_feature_vectors_do_not_wait_for_rirs(service, rir_filepath):
+    rir_future = service.submit(InferenceService.parseRequest({"rir": rir_filepath}))
+    feature_future = service.submit(InferenceService.parseRequest({"features": [0.2, 0.1, 0.3, 0.0, 0.5]}))
+
+    feature_result = feature_future.result(timeout=10)
+
+    assert not rir_future.done()
+    assert feature_result["predictions"] == PredictUnpleasantness.getPredictionsDict(
+        PredictUnpleasantness.predictUnpleasantnessFromFeatureMatrix([0.2, 0.1, 0.3, 0.0, 0.5])[0])
+    rir_future.result(timeout=60)
+
+
+def test_failed_extraction_only_fails_its_request(service, tmp_path, rir_filepath):
+    missing_future = service.submit(str(tmp_path / "missing.wav"))
+    rir_future = service.submit(rir_filepath)
+
+    with pytest.raises(FileNotFoundError):
+        missing_future.result(timeout=60)
+    assert set(rir_future.result(timeout=60)["features"]) == set(ExtractFeatures.FEATURE_NAMES)
+
+
+def test_parse_request_rejects_wrong_length():
+    with pytest.raises(ValueError):
+        InferenceService.parseRequest({"features": [0.1, 0.2]})
+
+
+# An MLP without asymmetry (as trained for programme item 2) on 4 mel bands, with random weights
+@pytest.fixture
+def mlp_archive_path(tmp_path):
+    rng = np.random.default_rng(0)
+    model_state = {"net.0.weight": rng.standard_normal((8, 8)), "net.0.bias": rng.standard_normal(8),
+                   "net.3.weight": rng.standard_normal((1, 8)), "net.3.bias": rng.standard_normal(1)}
+    archive_path = str(tmp_path / "mlp.npz")
+    NumpyMLP.exportMLP(model_state, archive_path, ["colouration", "flutter_echo", "curvature", "hf_damping"],
+                       {"num_mels": 4, "mel_pooling": "mean", "mel_fft_size": 256, "mel_ir_length_samples": 8000, "mel_hop_length": 1000})
+    return archive_path
+
+
+def test_batch_predicts_mlp_for_items_with_mel_spectrograms(mlp_archive_path):
+    mlp = NumpyMLP.getNumpyMLP(mlp_archive_path)
+    feature_vectors = [[0.2, 0.1, 0.3, 0.0, 0.5], [0.4, 0.3, 0.1, -0.1, 0.7]]
+    mel_spectrogram = np.random.default_rng(1).uniform(size=(4, 9)).astype(np.float32)
+
+    results = InferenceService.predictBatch(feature_vectors, [None, mel_spectrogram], mlp=mlp)
+
+    assert "mlp_prediction" not in results[0]
+    assert results[1]["mlp_prediction"] == pytest.approx(float(mlp.predict([[0.4, 0.3, -0.1, 0.7]], [mel_spectrogram])[0]), rel=1e-6)
+    assert results[1]["predictions"] == PredictUnpleasantness.getPredictionsDict(
+        PredictUnpleasantness.predictUnpleasantnessFromFeatureMatrix(feature_vectors)[1])
+
+
+def test_rir_prediction_includes_mlp(mlp_archive_path, rir_filepath):
+    pytest.importorskip("librosa")
+    inference_service = InferenceService.InferenceService(num_workers=1, sample_rates=(32000,), mlp_archive_path=mlp_archive_path)
+
+    try:
+        result = inference_service.predict({"rir": rir_filepath})
+    finally:
+        inference_service.close()
+
+    mlp = NumpyMLP.getNumpyMLP(mlp_archive_path)
+    mel_spectrogram = MelFeatureStore.computeMelSpectrogram(rir_filepath, 8000, 4, 256, 1000)
+    scalar_features = [[result["features"][name] for name in mlp.scalar_feature_names]]
+
+    assert result["mlp_prediction"] == pytest.approx(float(mlp.predict(scalar_features, [mel_spectrogram])[0]), rel=1e-6)
+
+
+def test_missing_default_mlp_archive_falls_back_to_linear_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(NumpyMLP, "MLP_ARCHIVE_PATH", str(tmp_path / "missing.npz"))
+
+    with pytest.warns(UserWarning):
+        assert InferenceService.getMLPArchivePath() is None
+    with pytest.raises(FileNotFoundError):
+        InferenceService.getMLPArchivePath(str(tmp_path / "missing.npz"))
+
+
+def test_default_mlp_archive_is_found_from_any_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert os.path.isabs(NumpyMLP.MLP_ARCHIVE_PATH)
+    assert os.path.dirname(os.path.dirname(NumpyMLP.MLP_ARCHIVE_PATH)) == os.path.dirname(os.path.abspath(NumpyMLP.__file__))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import PredictUnpleasantness
+
+
+# PredictUnpleasantness.predictUnpleasantnessFromFeatures before the coefficients were moved into a table
+def baselinePredictUnpleasantnessFromFeatures(colouration_score, asymmetry_score, flutter_echo_score, curvature_score, spectral_score, prog_item, k_fold=-1):
+    if k_fold == -1:
+        k_fold_index = 3
+    else:
+        k_fold_index = k_fold - 1
+
+    if prog_item == 1:
+        y_intercept =          [2.409,  6.424,  -5.306, 1.111]
+        colouration_gradient = [23.598, 38.458, 29.690, 30.553]
+        flutter_gradient =     [20.797, 6.408,  15.051, 12.825]
+        asymmetry_gradient =   [11.199, 14.196, 30.767, 22.349]
+        curvature_gradient =   [19.369, 29.723, 21.188, 20.129]
+        hf_damping_gradient =  [22.526, 14.415, 20.047, 19.702]
+    elif prog_item == 2:
+        y_intercept =          [28.750,  24.480,  17.878,  24.587]
+        colouration_gradient = [63.305,  68.913,  74.790,  72.588]
+        flutter_gradient =     [-5.072,  -13.451, -14.902, -12.654]
+        asymmetry_gradient =   [-24.737, -16.476, -3.939,  -13.065]
+        curvature_gradient =   [12.867,  38.217,  17.879,  18.050]
+        hf_damping_gradient =  [-15.195, -23.288, -14.080, -18.369]
+    else:
+        assert False
+
+    return (y_intercept[k_fold_index]
+            + colouration_gradient[k_fold_index] * colouration_score
+            + asymmetry_gradient[k_fold_index] * asymmetry_score
+            + flutter_gradient[k_fold_index] * flutter_echo_score
+            + curvature_gradient[k_fold_index] * curvature_score
+            + hf_damping_gradient[k_fold_index] * spectral_score)
+
+
+# Rows of colouration, flutter_echo, asymmetry, curvature, hf_damping (ExtractFeatures.FEATURE_NAMES order)
+FEATURE_MATRIX = np.random.default_rng(0).uniform(-0.2, 1.2, size=(20, 5))
+
+
+@pytest.mark.parametrize("prog_item", PredictUnpleasantness.PROG_ITEMS)
+@pytest.mark.parametrize("k_fold", [1, 2, 3, -1, 4])
+def test_predictions_match_baseline(prog_item, k_fold):
+    for colouration, flutter_echo, asymmetry, curvature, hf_damping in FEATURE_MATRIX:
+        prediction = PredictUnpleasantness.predictUnpleasantnessFromFeatures(colouration, asymmetry, flutter_echo, curvature, hf_damping, prog_item, k_fold)
+        expected_prediction = baselinePredictUnpleasantnessFromFeatures(colouration, asymmetry, flutter_echo, curvature, hf_damping, prog_item, k_fold)
+
+        assert abs(prediction - expected_prediction) < 1e-12
+
+
+@pytest.mark.parametrize("k_fold", [0, 5, -2])
+def test_unknown_k_fold_raises(k_fold):
+    with pytest.raises(ValueError):
+        PredictUnpleasantness.predictUnpleasantnessFromFeatures(0.2, 0.1, 0.3, 0.0, 0.5, 1, k_fold)
+
+
+def test_feature_matrix_predictions_match_baseline():
+    predictions = PredictUnpleasantness.predictUnpleasantnessFromFeatureMatrix(FEATURE_MATRIX)
+
+    for prog_item_index, prog_item in enumerate(PredictUnpleasantness.PROG_ITEMS):
+        for k_fold_index, k_fold in enumerate(PredictUnpleasantness.K_FOLDS):
+            expected_predictions = [baselinePredictUnpleasantnessFromFeatures(colouration, asymmetry, flutter_echo, curvature, hf_damping, prog_item, k_fold)
+                                    for colouration, flutter_echo, asymmetry, curvature, hf_damping in FEATURE_MATRIX]
+
+            np.testing.assert_allclose(predictions[:, prog_item_index, k_fold_index], expected_predictions, rtol=0, atol=1e-12)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from scipy.interpolate import interp1d
+
+import LogFrequencyResampler
+import Utils
+
+
+# Utils.linearToLog before the resampler was added
+def linearToLogWithInterp1d(magnitudes, sample_rate, f_min, f_max):
+    num_bins = len(magnitudes)
+    lin_freqs = np.linspace(0, sample_rate / 2, num_bins)[1:]
+    log_freqs = np.logspace(np.log10(f_min), np.log10(f_max), num_bins)
+    interp = interp1d(lin_freqs, magnitudes[1:], kind='linear', bounds_error=False, axis=0, fill_value=0.0)
+    return interp(log_freqs), log_freqs
+
+
+@pytest.mark.parametrize("f_min, f_max", [(25.3, 8000.0), (2000.0, 16000.0), (5.0, 20000.0)])
+def test_matches_interp1d(f_min, f_max):
+    magnitudes = np.abs(np.fft.rfft(np.random.default_rng(0).standard_normal(4096)))
+
+    log_mags, log_freqs = Utils.linearToLog(magnitudes, 32000, f_min, f_max)
+    expected_log_mags, expected_log_freqs = linearToLogWithInterp1d(magnitudes, 32000, f_min, f_max)
+
+    np.testing.assert_array_equal(log_freqs, expected_log_freqs)
+    np.testing.assert_allclose(log_mags, expected_log_mags, rtol=1e-12, atol=0)
+
+
+def test_batched_single_precision_matches_interp1d():
+    spectra = 20 * np.log10(np.abs(np.fft.rfft(np.random.default_rng(1).standard_normal([4096, 2]).astype(np.float32), axis=0)))
+
+    log_mags, _ = Utils.linearToLog(spectra, 32000, 2000, 16000)
+    expected_log_mags, _ = linearToLogWithInterp1d(spectra, 32000, 2000, 16000)
+
+    assert log_mags.shape == spectra.shape
+    np.testing.assert_allclose(log_mags, expected_log_mags, rtol=1e-6, atol=1e-9)
+
+
+def test_interpolation_is_reused_for_the_same_range():
+    spectra = np.random.default_rng(2).uniform(size=(2049, 2))
+    LogFrequencyResampler.getInterpolation.cache_clear()
+
+    for _ in range(3):
+        Utils.linearToLog(spectra, 32000, 2000, 16000)
+
+    assert LogFrequencyResampler.getInterpolation.cache_info().hits == 2
+
+
+def test_output_bins_match_interp_per_spectrum():
+    spectra = np.random.default_rng(3).uniform(size=(1025, 3))
+    lin_freqs = np.linspace(0, 24000, 1025)[1:]
+
+    log_mags, log_freqs = LogFrequencyResampler.resample(spectra, 48000, 100, num_output_bins=300)
+
+    assert log_mags.shape == (300, 3)
+    assert log_freqs[-1] == pytest.approx(24000)
+    for spectrum_index in range(3):
+        np.testing.assert_allclose(log_mags[:, spectrum_index], np.interp(log_freqs, lin_freqs, spectra[1:, spectrum_index], left=0, right=0),
+                                   rtol=1e-12, atol=1e-15)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+import MelFeatureStore
+
+# On the 0-1 scale of the normalised spectrograms. The store resamples only the start of each file (plus a margin), so
+# it can differ from resampling the whole file by the resampler's rounding.
+TOLERANCE = 1e-4
+
+NUM_MELS = 32
+FFT_SIZE = 2 ** 10
+IR_LENGTH_SAMPLES = 32000
+HOP_LENGTH = 32000 // 12
+
+
+# MLP.compute_mel_spectrogram before it was moved to MelFeatureStore: decodes and resamples the whole file
+def computeMelSpectrogramFromWholeFile(wav_path, max_ir_length_samples, n_mels, n_fft, hop_length):
+    import librosa
+    rir_raw, fs = librosa.load(wav_path)
+
+    if max_ir_length_samples < len(rir_raw):
+        rir_trunc = rir_raw[:max_ir_length_samples]
+    else:
+        rir_trunc = np.zeros(max_ir_length_samples)
+        rir_trunc[:len(rir_raw)] = rir_raw
+
+    S = librosa.feature.melspectrogram(y=rir_trunc, sr=fs, n_mels=n_mels, n_fft=n_fft, hop_length=hop_length, power=2.0)
+    S_db = librosa.power_to_db(S, ref=np.max)
+    S_norm = (S_db - S_db.min()) / (S_db.max() - S_db.min() + 1e-9)
+    return S_norm.astype(np.float32)
+
+
+# A 4-channel file longer than the analysed duration (as the stimuli are) and a mono one shorter than it (zero padded)
+@pytest.fixture
+def rir_filepaths(tmp_path, synthetic_rir):
+    rir, sample_rate = synthetic_rir(0, duration_s=2.0)
+    long_filepath = str(tmp_path / "long.wav")
+    short_filepath = str(tmp_path / "short.wav")
+    wavfile.write(long_filepath, sample_rate, (rir / np.max(np.abs(rir)) * 32767).astype(np.int16))
+    wavfile.write(short_filepath, sample_rate, rir[:sample_rate // 2, 0])
+    return [long_filepath, short_filepath]
+
+
+def test_store_matches_whole_file_mel_spectrograms(tmp_path, rir_filepaths):
+    pytest.importorskip("librosa")
+    store = MelFeatureStore.MelFeatureStore(str(tmp_path / "store"), NUM_MELS, FFT_SIZE, HOP_LENGTH, IR_LENGTH_SAMPLES)
+
+    mel_spectrograms = store.getMelSpectrograms(rir_filepaths, num_workers=1)
+
+    for rir_filepath, mel_spectrogram in zip(rir_filepaths, mel_spectrograms):
+        expected_mel_spectrogram = computeMelSpectrogramFromWholeFile(rir_filepath, IR_LENGTH_SAMPLES, NUM_MELS, FFT_SIZE, HOP_LENGTH)
+
+        assert mel_spectrogram.shape == expected_mel_spectrogram.shape
+        assert np.max(np.abs(mel_spectrogram - expected_mel_spectrogram)) < TOLERANCE
+
+
+def test_store_reuses_stored_mel_spectrograms(tmp_path, rir_filepaths, monkeypatch):
+    pytest.importorskip("librosa")
+    store = MelFeatureStore.MelFeatureStore(str(tmp_path / "store"), NUM_MELS, FFT_SIZE, HOP_LENGTH, IR_LENGTH_SAMPLES)
+    mel_spectrograms = [np.array(mel_spectrogram) for mel_spectrogram in store.getMelSpectrograms(rir_filepaths, num_workers=1)]
+
+    # Any recomputation would now fail
+    monkeypatch.setattr(MelFeatureStore, "ProcessPoolExecutor", None)
+    stored_mel_spectrograms = store.getMelSpectrograms(rir_filepaths[::-1])
+
+    np.testing.assert_array_equal(stored_mel_spectrograms[0], mel_spectrograms[1])
+    np.testing.assert_array_equal(stored_mel_spectrograms[1], mel_spectrograms[0])
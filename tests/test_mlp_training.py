@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+
+import EnsembleMLP
+import MLP
+
+FEATURE_COLS = ["colouration", "flutter_echo", "curvature", "hf_damping"]
+
+
+# 50 ratings of 10 stimuli, each stimulus with a (4 mels x 3 frames) mel spectrogram
+def getRatingsDataset(seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.uniform(size=(50, len(FEATURE_COLS))), columns=FEATURE_COLS)
+    df["stimulus_id"] = np.repeat(np.arange(1, 11), 5)
+    df["rating"] = rng.uniform(0, 100, size=50)
+    mel_features = list(rng.uniform(size=(10, 4, 3)).astype(np.float32))
+    return MLP.RatingsDataset(df, mel_features, FEATURE_COLS)
+
+
+@pytest.mark.parametrize("shuffle, drop_last", [(True, False), (True, True), (False, False)])
+def test_batches_match_data_loader(shuffle, drop_last):
+    dataset = getRatingsDataset()
+
+    torch.manual_seed(0)
+    data_loader = torch.utils.data.DataLoader(dataset, batch_size=8, shuffle=shuffle, drop_last=drop_last)
+    expected_batches = [batch for _ in range(3) for batch in data_loader]
+    expected_next_random = torch.rand(1)
+
+    torch.manual_seed(0)
+    batch_loader = MLP.TensorBatchLoader(dataset, batch_size=8, shuffle=shuffle, drop_last=drop_last, device="cpu")
+    batches = [batch for _ in range(3) for batch in batch_loader]
+
+    assert len(batch_loader) == len(data_loader)
+    assert len(batches) == len(expected_batches)
+    for batch, expected_batch in zip(batches, expected_batches):
+        for key in ["features", "target", "stimulus"]:
+            assert torch.equal(batch[key], expected_batch[key])
+
+    # The loader leaves the global RNG where the DataLoader would, so later draws (e.g. dropout) match too
+    assert torch.equal(torch.rand(1), expected_next_random)
+
+
+# One MLPRegressor trained as MLP.train_model does (stock Adam, ReduceLROnPlateau and early stopping on validation
+# MSE), but without dropout and with every training row in one batch
+# Returns the best model's state_dict and best epoch
+def trainSingleModel(n_features, seed, features, targets, train_rows, val_rows, num_epochs):
+    torch.manual_seed(seed)
+    model = MLP.MLPRegressor(n_features, MLP.HIDDEN_SIZES, [0.0, 0.0, 0.0], use_embedding=False)
+    optimizer = torch.optim.Adam(model.parameters(), lr=MLP.LR, weight_decay=MLP.WEIGHT_DECAY)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode="min", factor=EnsembleMLP.LR_REDUCTION_FACTOR,
+                                                           patience=EnsembleMLP.LR_REDUCTION_PATIENCE)
+    criterion = torch.nn.MSELoss()
+    best_val_mse = float("inf")
+
+    for epoch in range(1, num_epochs + 1):
+        model.train()
+        optimizer.zero_grad()
+        loss = criterion(model(features[train_rows]), targets[train_rows].reshape(-1, 1))
+        loss.backward()
+        optimizer.step()
+
+        model.eval()
+        with torch.no_grad():
+            val_mse = criterion(model(features[val_rows]), targets[val_rows].reshape(-1, 1)).item()
+
+        scheduler.step(val_mse)
+
+        if val_mse < best_val_mse - 1e-6:
+            best_val_mse = val_mse
+            best_epoch = epoch
+            best_state = {key: value.clone() for key, value in model.state_dict().items()}
+
+    return best_state, best_epoch
+
+
+def test_ensemble_member_matches_single_model():
+    dataset = getRatingsDataset()
+    features = dataset.features
+    n_features = features.shape[1]
+    # Validation targets unrelated to the training ones, so validation stalls and the learning rate is reduced
+    targets = dataset.targets.reshape(-1).clone()
+    targets[40:] = torch.from_numpy(np.random.default_rng(1).uniform(size=10).astype(np.float32))
+    train_rows = torch.arange(40)
+    val_rows = torch.arange(40, 50)
+    num_epochs = 40
+
+    expected_state, expected_best_epoch = trainSingleModel(n_features, 7, features, targets, train_rows, val_rows, num_epochs)
+
+    model = EnsembleMLP.build_ensemble(n_features, seeds=[7], dropout_rates=[[0.0, 0.0, 0.0]]).to("cpu")
+    train_masks = np.zeros((1, 50), dtype=bool)
+    train_masks[0, :40] = True
+    best_epoch, _, _, _ = EnsembleMLP.train_ensemble(model, features, targets, train_masks, ~train_masks,
+                                                     batch_size=40, max_epochs=num_epochs, patience=num_epochs)
+    member_state = model.get_member_state(0)
+
+    assert best_epoch[0] == expected_best_epoch
+    for key, value in expected_state.items():
+        torch.testing.assert_close(member_state[key], value, rtol=1e-4, atol=1e-5)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+import NumpyMLP
+
+MEL_PARAMETERS = {"num_mels": 4, "mel_pooling": "mean", "mel_fft_size": 256, "mel_ir_length_samples": 8000, "mel_hop_length": 1000}
+
+# Scalar feature columns as trained for programme item 2, without asymmetry
+FEATURE_COLS = ["colouration", "flutter_echo", "curvature", "hf_damping"]
+
+
+def getModelState(seed=0):
+    rng = np.random.default_rng(seed)
+    return {"net.0.weight": rng.standard_normal((8, 8)), "net.0.bias": rng.standard_normal(8),
+            "net.3.weight": rng.standard_normal((8, 8)), "net.3.bias": rng.standard_normal(8),
+            "net.6.weight": rng.standard_normal((1, 8)), "net.6.bias": rng.standard_normal(1)}
+
+
+def test_forward_matches_layers(tmp_path):
+    model_state = getModelState()
+    archive_path = str(tmp_path / "mlp.npz")
+    NumpyMLP.exportMLP(model_state, archive_path, FEATURE_COLS, MEL_PARAMETERS)
+    inputs = np.random.default_rng(1).uniform(size=(5, 8))
+
+    outputs = NumpyMLP.NumpyMLP(archive_path).forward(inputs)
+
+    expected_outputs = inputs
+    for layer_index in [0, 3, 6]:
+        expected_outputs = expected_outputs @ model_state[f"net.{layer_index}.weight"].T + model_state[f"net.{layer_index}.bias"]
+        if layer_index < 6:
+            expected_outputs = np.maximum(expected_outputs, 0)
+
+    np.testing.assert_allclose(outputs, expected_outputs[:, 0], rtol=1e-5, atol=1e-5)
+
+
+def test_export_checkpoint_uses_saved_feature_cols(tmp_path):
+    torch = pytest.importorskip("torch")
+    model_state = {key: torch.from_numpy(value).float() for key, value in getModelState().items()}
+    checkpoint_path = str(tmp_path / "model.pt")
+    archive_path = str(tmp_path / "mlp.npz")
+    torch.save({"model_state": model_state, "feature_cols": FEATURE_COLS}, checkpoint_path)
+
+    NumpyMLP.exportCheckpoint(checkpoint_path, archive_path, None, MEL_PARAMETERS)
+
+    assert NumpyMLP.NumpyMLP(archive_path).scalar_feature_names == FEATURE_COLS
+
+
+def test_export_checkpoint_requires_feature_cols(tmp_path):
+    torch = pytest.importorskip("torch")
+    model_state = {key: torch.from_numpy(value).float() for key, value in getModelState().items()}
+    checkpoint_path = str(tmp_path / "model.pt")
+    torch.save({"model_state": model_state}, checkpoint_path)
+
+    with pytest.raises(ValueError):
+        NumpyMLP.exportCheckpoint(checkpoint_path, str(tmp_path / "mlp.npz"), None, MEL_PARAMETERS)
+
+
+@pytest.mark.parametrize("use_embedding", [False, True])
+def test_forward_matches_torch_model(tmp_path, use_embedding):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("pandas")
+    pytest.importorskip("sklearn")
+    import MLP
+
+    torch.manual_seed(0)
+    num_inputs = len(FEATURE_COLS) + MEL_PARAMETERS["num_mels"]
+    model = MLP.MLPRegressor(num_inputs, [16, 12, 8], [0.3, 0.3, 0.3], use_embedding=use_embedding, n_stimuli=10)
+    model.eval()
+    archive_path = str(tmp_path / "mlp.npz")
+    NumpyMLP.exportMLP(model.state_dict(), archive_path, FEATURE_COLS, MEL_PARAMETERS)
+
+    features = torch.rand(20, num_inputs)
+    stimulus_ids = torch.randint(0, 10, (20,))
+    with torch.no_grad():
+        expected_outputs = model(features, stimulus_ids if use_embedding else None)[:, 0].numpy()
+
+    outputs = NumpyMLP.NumpyMLP(archive_path).forward(features.numpy(), stimulus_ids.numpy() if use_embedding else None)
+
+    np.testing.assert_allclose(outputs, expected_outputs, rtol=1e-5, atol=1e-5)
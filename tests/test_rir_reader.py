@@ -0,0 +1,37 @@
+import numpy as np
+from scipy.io import wavfile
+
+import RIRReader
+
+
+def writeTestWAV(tmp_path, samples, sample_rate=32000):
+    filepath = str(tmp_path / "rir.wav")
+    wavfile.write(filepath, sample_rate, samples)
+    return filepath
+
+
+def test_integer_pcm_keeps_raw_values(tmp_path):
+    samples = np.random.default_rng(0).integers(-2**15, 2**15, size=(1000, 6), dtype=np.int16)
+    rir_reader = RIRReader.RIRReader(writeTestWAV(tmp_path, samples))
+
+    spatial_rir = rir_reader.readFirstChannels(4)
+
+    assert spatial_rir.dtype == np.float64
+    np.testing.assert_array_equal(spatial_rir, samples[:, :4])
+    np.testing.assert_array_equal(rir_reader.read(0, 10, 20), samples[10:20, 0])
+
+
+def test_integer_pcm_can_be_normalised(tmp_path):
+    samples = np.random.default_rng(0).integers(-2**15, 2**15, size=(1000, 2), dtype=np.int16)
+    rir_reader = RIRReader.RIRReader(writeTestWAV(tmp_path, samples))
+
+    np.testing.assert_array_equal(rir_reader.read(should_normalise=True), samples / 2**15)
+
+
+def test_float_keeps_sample_format(tmp_path, synthetic_rir):
+    rir, sample_rate = synthetic_rir(0)
+    rir_reader = RIRReader.RIRReader(writeTestWAV(tmp_path, rir, sample_rate))
+
+    assert rir_reader.sample_rate == sample_rate
+    assert rir_reader.read().dtype == np.float32
+    np.testing.assert_array_equal(rir_reader.read(), rir)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from scipy.signal import savgol_filter
+
+import Smoothing
+
+RELATIVE_TOLERANCE = 1e-10
+
+
+def getRandomWalk(num_samples, seed=0):
+    return np.cumsum(np.random.default_rng(seed).standard_normal(num_samples)) - 60.0
+
+
+# Least squares polynomial fit to each window, evaluated at its centre
+def fitWindowCentres(x, window_length, polyorder, window_starts):
+    offsets = np.arange(window_length) - (window_length - 1) / 2
+    vandermonde = np.vander(offsets / window_length, polyorder + 1)
+    return np.array([np.linalg.lstsq(vandermonde, x[start:start + window_length], rcond=None)[0][-1] for start in window_starts])
+
+
+# Odd and even windows, up to the whole signal
+SAVGOL_CASES = [(num_samples, window_length, polyorder)
+                for num_samples in [9, 100, 1001]
+                for window_length in [3, 4, 5, 8, 31, 50, 100, 1001]
+                for polyorder in [0, 1, 2]
+                if window_length <= num_samples]
+
+
+@pytest.mark.parametrize("num_samples, window_length, polyorder", SAVGOL_CASES)
+def test_matches_savgol_filter(num_samples, window_length, polyorder):
+    signal = getRandomWalk(num_samples)
+    reference = savgol_filter(signal, window_length, polyorder)
+
+    smoothed = Smoothing.smoothLocalRegression(signal, window_length, polyorder)
+
+    assert np.max(np.abs(smoothed - reference)) < RELATIVE_TOLERANCE * np.max(np.abs(reference))
+
+
+# savgol_filter itself loses accuracy for very long windows (a relative error of 1e-8 here, from its convolution), so
+# the window centres are checked against direct fits instead
+@pytest.mark.parametrize("polyorder", [0, 1, 2])
+def test_long_windows_match_direct_fits(polyorder):
+    signal = getRandomWalk(65536)
+    window_length = 32768
+    # From the second window, since the first window's centre is an edge sample for even windows
+    window_starts = np.arange(1, len(signal) - window_length + 1, 2048)
+
+    smoothed = Smoothing.smoothLocalRegression(signal, window_length, polyorder)
+    reference = fitWindowCentres(signal, window_length, polyorder, window_starts)
+
+    assert np.max(np.abs(smoothed[window_starts + (window_length - 1) // 2] - reference)) < RELATIVE_TOLERANCE * np.max(np.abs(reference))
+
+
+def test_columns_smoothed_independently():
+    signals = np.random.default_rng(0).standard_normal((1000, 3))
+
+    smoothed = Smoothing.smoothLocalRegression(signals, 101, 2)
+
+    np.testing.assert_allclose(smoothed, savgol_filter(signals, 101, 2, axis=0), rtol=0, atol=1e-12)